@@ -1,50 +1,75 @@
-import dns.resolver
-import socket
 import logging
-from typing import List
-from ipaddress import ip_network
+from typing import Dict, List
+from ipaddress import ip_address, ip_network
+from .resolver import BulkResolver, domain_for
 
-def get_cidr_ranges_local(org: str) -> List[str]:
-    """Resolve domain to IPs locally using dns.resolver."""
+def _host_cidr(ip: str) -> str:
+    return f"{ip}/{ip_address(ip).max_prefixlen}"
+
+def get_cidr_ranges_local(org: str, resolver: BulkResolver = None) -> List[str]:
+    """Resolve domain to IPs (A and AAAA records) locally."""
     logging.debug(f"Resolving domain for {org} locally")
-    try:
-        domain = org if '.' in org else f"{org}.com"
-        # Use dns.resolver to get all A records
-        resolver = dns.resolver.Resolver()
-        answers = resolver.resolve(domain, 'A')
-        ips = list(set([answer.to_text() for answer in answers]))
-        logging.info(f"Resolved {len(ips)} IPs for {domain}: {ips}")
-        if not ips:
-            logging.error(f"No IPs resolved for {domain}")
-            return []
-        return [f"{ip}/32" for ip in ips]
-    except dns.resolver.NXDOMAIN:
-        logging.error(f"Domain {domain} does not exist")
-        return []
-    except dns.resolver.NoAnswer:
-        logging.error(f"No A records found for {domain}")
-        return []
-    except dns.resolver.LifetimeTimeout:
-        logging.error(f"DNS query for {domain} timed out")
-        return []
-    except Exception as e:
-        logging.error(f"Unexpected error while resolving {domain}: {e}")
+    domain = domain_for(org)
+    resolver = resolver or BulkResolver()
+    ips = resolver.resolve([domain])[domain]
+    if not ips:
+        logging.error(f"No IPs resolved for {domain}")
         return []
+    logging.info(f"Resolved {len(ips)} IPs for {domain}: {ips}")
+    return [_host_cidr(ip) for ip in ips]
+
+def read_targets_file(path: str) -> List[str]:
+    """Read one org, domain or CIDR range per line, skipping blank lines and # comments."""
+    targets = []
+    with open(path, "r") as f:
+        for line in f:
+            target = line.split("#", 1)[0].strip()
+            if target:
+                targets.append(target)
+    return targets
 
-def get_cidr_ranges(org: str, api_token: str = None, cidr: str = None) -> List[str]:
+def get_cidr_ranges_bulk(targets: List[str], resolver: BulkResolver = None) -> List[str]:
+    """Resolve many orgs/domains at once; targets that are already CIDR ranges or IPs are used as is."""
+    cidr_ranges: Dict[str, None] = {}
+    domains = []
+    for target in targets:
+        try:
+            cidr_ranges[str(ip_network(target, strict=False))] = None
+        except ValueError:
+            domains.append(domain_for(target))
+
+    if domains:
+        resolver = resolver or BulkResolver()
+        unresolved = 0
+        for domain, ips in resolver.resolve(domains).items():
+            if not ips:
+                logging.debug(f"No IPs resolved for {domain}")
+                unresolved += 1
+            for ip in ips:
+                cidr_ranges[_host_cidr(ip)] = None
+        if unresolved:
+            logging.warning(f"{unresolved} of {len(set(domains))} domains did not resolve")
+
+    logging.info(f"Using {len(cidr_ranges)} CIDR ranges from {len(targets)} targets")
+    return list(cidr_ranges)
+
+def get_cidr_ranges(org: str, api_token: str = None, cidr: str = None, resolver: BulkResolver = None) -> List[str]:
     """Resolve CIDR ranges or IPs for the given organization."""
     logging.debug(f"Processing CIDR ranges for {org}")
 
-    # If the user provided a CIDR range, use it directly
+    # If the user provided CIDR ranges, use them directly
     if cidr:
-        try:
-            # Validate and expand the CIDR range
-            network = ip_network(cidr, strict=False)
-            logging.info(f"Using user-provided CIDR: {cidr} (total IPs: {network.num_addresses})")
-            return [str(network)]
-        except ValueError as e:
-            logging.error(f"Invalid CIDR range {cidr}: {e}")
-            return []
+        cidr_ranges = []
+        for text in cidr.split(","):
+            try:
+                # Validate and expand the CIDR range
+                network = ip_network(text.strip(), strict=False)
+            except ValueError as e:
+                logging.error(f"Invalid CIDR range {text}: {e}")
+                return []
+            logging.info(f"Using user-provided CIDR: {network} (total IPs: {network.num_addresses})")
+            cidr_ranges.append(str(network))
+        return cidr_ranges
 
     # Otherwise, resolve the domain to IPs
-    return get_cidr_ranges_local(org)
\ No newline at end of file
+    return get_cidr_ranges_local(org, resolver)
@@ -0,0 +1,288 @@
+import asyncio
+import collections
+import errno
+import itertools
+import logging
+import socket
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+from .network import CLOSED, ERROR, FILTERED, OPEN, StageProgress, address_family
+from .checkpoint import ScanPlan
+from .discovery import Discovery
+from .metrics import ScanMetrics
+from .ratelimit import RateLimiter
+from .report import ResultSink
+from .results import ScanResults
+from . import sockets
+from .timing import TimeoutPolicy
+
+DEFAULT_CONCURRENCY = 1000
+
+def _resolve(future: asyncio.Future, value: bool):
+    if not future.done():
+        future.set_result(value)
+
+async def _probe(ip: str, port: int, timeout: float, limiter: RateLimiter = None,
+                 metrics: ScanMetrics = None) -> Tuple[str, float]:
+    """Attempt a non-blocking TCP connect and return (state, seconds taken), as network.probe_port() does.
+
+    Uses the socket's writability plus SO_ERROR directly instead of
+    loop.sock_connect()/wait_for(), which would cost an extra task and timer
+    wrapper per probe. Running out of file descriptors or ephemeral ports is
+    retried with back-off, as in probe_port().
+    """
+    if limiter is not None:
+        await limiter.acquire_async()
+    if metrics is not None:
+        metrics.probe_started()
+    try:
+        state, elapsed = await sockets.retry_async(lambda: _attempt(ip, port, timeout), metrics)
+    except OSError:
+        state, elapsed = ERROR, 0.0
+    if limiter is not None:
+        limiter.release(state in (FILTERED, ERROR))
+    if metrics is not None:
+        metrics.probe_finished(state, elapsed)
+    return state, elapsed
+
+async def _attempt(ip: str, port: int, timeout: float) -> Tuple[str, float]:
+    """Make one connect attempt; raises OSError if a local resource ran out."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        sock = sockets.probe_socket(address_family(ip))
+    except OSError as e:
+        if e.errno in sockets.RESOURCE_ERRORS:
+            raise
+        logging.debug(f"Could not create socket for {ip}:{port}: {e}")
+        return ERROR, 0.0
+    try:
+        sock.setblocking(False)
+        err = sock.connect_ex((ip, port))
+        if err in (errno.EINPROGRESS, errno.EAGAIN):
+            fd = sock.fileno()
+            ready = loop.create_future()
+            loop.add_writer(fd, _resolve, ready, True)
+            timer = loop.call_later(timeout, _resolve, ready, False)
+            try:
+                if not await ready:
+                    return FILTERED, loop.time() - start
+            finally:
+                loop.remove_writer(fd)
+                timer.cancel()
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+    except OSError as e:
+        err = e.errno
+    finally:
+        sock.close()
+    sockets.check_resources(err)
+    if err == 0:
+        return OPEN, loop.time() - start
+    if err == errno.ECONNREFUSED:
+        return CLOSED, loop.time() - start
+    return ERROR, loop.time() - start
+
+async def _connect(ip: str, port: int, timeout: float) -> bool:
+    """Attempt a non-blocking TCP connect and report whether it succeeded."""
+    state, _ = await _probe(ip, port, timeout)
+    return state == OPEN
+
+async def _race_host(ip: str, timeout: float, discovery: Discovery, limiter: RateLimiter = None,
+                     metrics: ScanMetrics = None) -> Tuple[bool, float]:
+    """Async counterpart of network.race_host()."""
+    if discovery.skip:
+        return True, 0.0
+    probes = discovery.probe_count(ip)
+    if limiter is not None:
+        for _ in range(probes):
+            await limiter.acquire_async()
+    if metrics is not None:
+        metrics.probe_started()
+    alive, elapsed = await discovery.probe_async(ip, timeout, metrics)
+    if limiter is not None:
+        for _ in range(probes):
+            limiter.release(not alive)
+    if metrics is not None:
+        metrics.probe_finished(OPEN if alive else FILTERED, elapsed if alive else None)
+    return alive, elapsed
+
+async def _check_host(ip: str, timeout: float, policy: TimeoutPolicy = None, limiter: RateLimiter = None,
+                      metrics: ScanMetrics = None, discovery: Discovery = None) -> bool:
+    """Async counterpart of network.check_host()."""
+    if discovery is not None:
+        alive, rtt = await _race_host(ip, timeout, discovery, limiter, metrics)
+        if policy is not None and alive and not discovery.skip:
+            policy.observe(ip, rtt)
+        return alive
+    state, rtt = await _probe(ip, 80, timeout, limiter, metrics)
+    if policy is not None and state in (OPEN, CLOSED):
+        policy.observe(ip, rtt)
+    return state == OPEN
+
+async def _check_port(ip: str, port: int, timeout: float, policy: TimeoutPolicy = None,
+                      limiter: RateLimiter = None, metrics: ScanMetrics = None) -> bool:
+    """Async counterpart of network.check_port()."""
+    retries = policy.retries if policy is not None else 0
+    for attempt in range(retries + 1):
+        attempt_timeout = policy.timeout_for(ip, attempt) if policy is not None else timeout
+        state, rtt = await _probe(ip, port, attempt_timeout, limiter, metrics)
+        if state != FILTERED:
+            if policy is not None and state in (OPEN, CLOSED):
+                policy.observe(ip, rtt)
+            return state == OPEN
+        if policy is not None:
+            policy.record_timeout(attempt_timeout, retrying=attempt < retries)
+    return False
+
+async def _run_probes(tasks: Iterable[Tuple[str, int]], probe: Callable[[str, int], Awaitable[bool]],
+                      concurrency: int, on_result: Callable[[str, int, bool], None]):
+    """Drain an iterable of (ip, port) probes with at most `concurrency` in flight.
+
+    Workers share a single iterator, so probes are created lazily and memory
+    stays bounded by the concurrency ceiling rather than the task count.
+    """
+    task_iter = iter(tasks)
+
+    async def worker():
+        for ip, port in task_iter:
+            on_result(ip, port, await probe(ip, port))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+async def _scan(ips: Iterable[str], ports: List[int], timeout: float, concurrency: int, sink: ResultSink,
+                policy: TimeoutPolicy, limiter: RateLimiter, plan: ScanPlan,
+                metrics: ScanMetrics, discovery: Discovery) -> ScanResults:
+    results = ScanResults()
+
+    # Step 1: Find live hosts (the probes of `discovery`, or the port 80 check of is_host_alive)
+    discovery_stage = StageProgress("Discovery", "live", limiter=limiter, metrics=metrics)
+
+    def on_host(ip: str, port: int, alive: bool):
+        plan.host_done(ip, alive)
+        discovery_stage.advance(alive)
+        if alive:
+            results.add_live_host(ip)
+            sink.add_live_host(ip)
+
+    probe = lambda ip, _: _check_host(ip, timeout, policy, limiter, metrics, discovery)  # noqa: E731
+    await _run_probes(((ip, 80) for ip in ips), probe, concurrency, on_host)
+    discovery_stage.log(final=True)
+
+    if not results.live_host_count:
+        logging.info("No live hosts found")
+        return results
+
+    # Step 2: Scan ports on live hosts
+    live_host_count = results.live_host_count
+    total_ports = len(ports) * live_host_count
+    logging.info(f"Scanning {len(ports)} ports on {live_host_count} live hosts ({total_ports} total scans)")
+    port_stage = StageProgress("Port scan", "open", limiter=limiter, metrics=metrics, total=total_ports)
+
+    def on_port(ip: str, port: int, is_open: bool):
+        plan.port_done(ip, port, is_open)
+        if is_open:
+            results.add_open_port(ip, port)
+            sink.add_open_port(ip, port)
+        port_stage.advance(is_open)
+
+    tasks = plan.port_tasks(results)
+    probe = lambda ip, port: _check_port(ip, port, timeout, policy, limiter, metrics)  # noqa: E731
+    await _run_probes(tasks, probe, concurrency, on_port)
+    port_stage.log(final=True)
+
+    return results
+
+async def _scan_pipelined(ips: Iterable[str], ports: List[int], timeout: float, concurrency: int, sink: ResultSink,
+                          queue_size: int, policy: TimeoutPolicy, limiter: RateLimiter, plan: ScanPlan,
+                          metrics: ScanMetrics, discovery: Discovery) -> ScanResults:
+    """Port-scan each host as soon as discovery confirms it.
+
+    A quarter of the concurrency budget goes to discovery and the rest to
+    port probes. Every port worker takes probes from the oldest host still
+    being scanned, so even a single live host gets all of them; at most
+    `queue_size` live hosts wait between the stages.
+    """
+    results = ScanResults()
+    discovery_stage = StageProgress("Discovery", "live", limiter=limiter, metrics=metrics)
+    port_stage = StageProgress("Port scan", "open", limiter=limiter, metrics=metrics)
+    discovery_workers = max(1, concurrency // 4)
+    port_workers = max(1, concurrency - discovery_workers)
+    ip_iter = iter(ips)
+    # Port iterators of hosts being scanned; every worker drains the oldest first
+    active = collections.deque()
+    # Signalled when a host is added, a host's ports run out, or discovery ends
+    work = asyncio.Condition()
+    discovery_done = False
+
+    async def discover():
+        nonlocal discovery_done
+
+        async def worker():
+            for ip in ip_iter:
+                alive = await _check_host(ip, timeout, policy, limiter, metrics, discovery)
+                plan.host_done(ip, alive)
+                discovery_stage.advance(alive)
+                if alive:
+                    results.add_live_host(ip)
+                    sink.add_live_host(ip)
+                    host_ports = plan.host_ports(ip)
+                    async with work:
+                        await work.wait_for(lambda: len(active) < queue_size)
+                        port_stage.expect_more(len(host_ports))
+                        # zip binds this host now; a generator expression would see the loop's next `ip`
+                        active.append(zip(itertools.repeat(ip), host_ports))
+                        work.notify_all()
+
+        await asyncio.gather(*(worker() for _ in range(discovery_workers)))
+        discovery_stage.log(final=True)
+        async with work:
+            discovery_done = True
+            work.notify_all()
+
+    async def next_task() -> Optional[Tuple[str, int]]:
+        """The next (ip, port) probe; waits for discovery while there is none, None once all are done."""
+        async with work:
+            while True:
+                while active:
+                    task = next(active[0], None)
+                    if task is not None:
+                        return task
+                    active.popleft()
+                    # Room for another live host
+                    work.notify_all()
+                if discovery_done:
+                    return None
+                await work.wait()
+
+    async def port_worker():
+        while True:
+            task = await next_task()
+            if task is None:
+                return
+            ip, port = task
+            is_open = await _check_port(ip, port, timeout, policy, limiter, metrics)
+            plan.port_done(ip, port, is_open)
+            if is_open:
+                results.add_open_port(ip, port)
+                sink.add_open_port(ip, port)
+            port_stage.advance(is_open, len(active))
+
+    await asyncio.gather(discover(), *(port_worker() for _ in range(port_workers)))
+    port_stage.log(final=True)
+    return results
+
+def scan_network_async(ips: Iterable[str], ports: List[int], timeout: float,
+                       concurrency: int = DEFAULT_CONCURRENCY, sink: ResultSink = None,
+                       pipeline: bool = False, queue_size: int = 1000,
+                       policy: TimeoutPolicy = None, limiter: RateLimiter = None,
+                       plan: ScanPlan = None, metrics: ScanMetrics = None,
+                       discovery: Discovery = None) -> ScanResults:
+    """Scan a list of IPs for live hosts and open ports using an asyncio event loop."""
+    sink = sink or ResultSink()
+    plan = plan or ScanPlan(ports)
+    if pipeline:
+        logging.info(f"Scanning IPs for live hosts and {len(ports)} ports per live host "
+                     f"(async engine, pipelined, concurrency {concurrency})")
+        return asyncio.run(_scan_pipelined(ips, ports, timeout, concurrency, sink, queue_size, policy, limiter,
+                                           plan, metrics, discovery))
+    logging.info(f"Scanning IPs for live hosts (async engine, concurrency {concurrency})")
+    return asyncio.run(_scan(ips, ports, timeout, concurrency, sink, policy, limiter, plan, metrics, discovery))
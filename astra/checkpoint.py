@@ -0,0 +1,294 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from ipaddress import ip_address, ip_network
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .permutation import Permutation
+from .report import ResultSink, StreamSink
+from .results import ScanResults
+
+DEFAULT_BLOCK_SIZE = 256
+
+class ScanPlan:
+    """Which targets and ports a scan probes, in what order, plus hooks called as probes finish.
+
+    The base plan probes every target and every port in order. Hosts in
+    `first_hosts` are probed before all other targets, and `first_ports`
+    maps a host to ports probed before the rest of its ports (incremental
+    scans use these for previously live hosts and open ports). With a
+    `seed`, phased engines probe the ports of all live hosts in one
+    pseudo-random order (see port_tasks). Pipelined engines scan each host
+    as soon as it is found, so with a seed they shuffle each host's ports
+    on their own instead (see host_ports); hosts still follow the seeded
+    target order.
+    """
+
+    def __init__(self, ports: List[int], first_hosts: List[str] = None, first_ports: Dict[str, List[int]] = None,
+                 seed: int = None):
+        self.ports = ports
+        self.first_hosts = first_hosts or []
+        self.first_ports = first_ports or {}
+        self.seed = seed
+        self._skip = set(self.first_hosts)
+
+    def stripe(self, index: int, parts: int) -> "ScanPlan":
+        """Return the plan for worker `index` of `parts`, each taking an interleaved share of first_hosts."""
+        plan = copy.copy(self)
+        # Every worker still skips all of first_hosts in its share of the other targets
+        plan.first_hosts = self.first_hosts[index::parts]
+        return plan
+
+    def targets(self, ips: Iterable[str]) -> Iterator[str]:
+        """Yield the targets to probe: first_hosts, then the remaining IPs."""
+        yield from self.first_hosts
+        for ip in ips:
+            if ip not in self._skip:
+                yield ip
+
+    def ports_for(self, ip: str) -> List[int]:
+        """Return the ports to probe on a live host, in probe order."""
+        first = self.first_ports.get(ip)
+        if not first:
+            return self.ports
+        wanted = set(self.ports)
+        first = [port for port in first if port in wanted]
+        seen = set(first)
+        return first + [port for port in self.ports if port not in seen]
+
+    def host_ports(self, ip: str) -> List[int]:
+        """Return ports_for(ip) in the order a pipelined engine probes them.
+
+        With a seed, the ports after any first_ports are shuffled by a
+        Permutation keyed on the seed and the address, so every host (and
+        every process or node) gets its own reproducible order.
+        """
+        ports = self.ports_for(ip)
+        if self.seed is None:
+            return ports
+        first = set(self.first_ports.get(ip, ()))
+        leading = 0
+        while leading < len(ports) and ports[leading] in first:
+            leading += 1
+        rest = ports[leading:]
+        if len(rest) < 2:
+            return ports
+        return ports[:leading] + [rest[i] for i in Permutation(len(rest), self.seed ^ int(ip_address(ip)))]
+
+    def port_tasks(self, live: ScanResults) -> Iterator[Tuple[str, int]]:
+        """Yield (ip, port) for every port to probe on the live hosts of a phased scan.
+
+        Without a seed, host by host in ports_for() order. With one, the
+        (host, position in ports_for()) pairs are visited in a Permutation,
+        so consecutive probes are spread across hosts and subnets.
+        """
+        if self.seed is None:
+            for ip in live.live_hosts():
+                for port in self.ports_for(ip):
+                    yield ip, port
+            return
+        hosts = live.live_host_count
+        # Hosts with their own port order (incremental or resumed) keep it here rather than rebuilding it per probe
+        custom: Dict[str, List[int]] = {}
+        for value in Permutation(hosts * len(self.ports), self.seed):
+            ip = live.live_host_at(value % hosts)
+            ports = custom.get(ip)
+            if ports is None:
+                ports = self.ports_for(ip)
+                if ports is not self.ports:
+                    custom[ip] = ports
+            position = value // hosts
+            if position < len(ports):
+                yield ip, ports[position]
+
+    def host_done(self, ip: str, alive: bool):
+        """Called once discovery of a host has finished."""
+
+    def port_done(self, ip: str, port: int, is_open: bool):
+        """Called once a port probe has finished, retries included."""
+
+    def write(self, record: Dict):
+        """Persist a progress record (no-op unless checkpointing)."""
+
+class _StateLog(StreamSink):
+    def record(self, record: Dict):
+        self._write(json.dumps(record, separators=(",", ":")) + "\n")
+
+def _ports_digest(ports: List[int], block_size: int) -> str:
+    return hashlib.sha1(f"{block_size}:{','.join(map(str, ports))}".encode()).hexdigest()
+
+class Checkpoint(ScanPlan):
+    """A ScanPlan that records finished work to an append-only log so an interrupted scan can resume.
+
+    Units of work are the discovery probe of each IP and, for live hosts,
+    blocks of `block_size` consecutive entries of the port list. A block is
+    logged (with its open ports) once every port in it has been probed. On
+    resume, dead hosts and finished blocks are skipped; a live host with
+    blocks left is probed again from discovery, then only on those blocks.
+    """
+
+    def __init__(self, path: str, ports: List[int], block_size: int = DEFAULT_BLOCK_SIZE, resume: bool = False,
+                 first_hosts: List[str] = None, first_ports: Dict[str, List[int]] = None, seed: int = None):
+        super().__init__(ports, first_hosts, first_ports, seed)
+        self.path = path
+        self.block_size = block_size
+        self.blocks = (len(ports) + block_size - 1) // block_size
+        self._block_of = {port: i // block_size for i, port in enumerate(ports)}
+        # ip -> alive, for every host whose discovery finished
+        self.discovered: Dict[str, bool] = {}
+        # live ip -> {finished block: open ports in it}
+        self.finished: Dict[str, Dict[int, List[int]]] = {}
+        # (ip, block) -> [ports left, open ports so far]
+        self._pending: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+        # (sink, results) of replay(), for hosts whose finished blocks wait on rediscovery
+        self._replay: Optional[Tuple[ResultSink, ScanResults]] = None
+        digest = _ports_digest(ports, block_size)
+        resumed = resume and os.path.exists(path)
+        if resumed:
+            self._load(digest)
+        elif resume:
+            logging.warning(f"No checkpoint found at {path}; starting from the beginning")
+        self._log = _StateLog(path, append=resumed)
+        if not resumed:
+            self.write({"type": "scan", "ports": digest})
+
+    def __getstate__(self):
+        # Worker processes get the loaded state but forward records to the parent's log
+        state = self.__dict__.copy()
+        for key in ("_log", "_lock", "_pending", "_replay"):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._log = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._replay = None
+
+    def _load(self, digest: str):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a partially written final line
+                    continue
+                kind = record.get("type")
+                if kind == "scan" and record["ports"] != digest:
+                    raise ValueError(f"Checkpoint {self.path} was written for a different port list")
+                if kind == "host":
+                    self.discovered[record["ip"]] = record["alive"]
+                elif kind == "block":
+                    self.finished.setdefault(record["ip"], {})[record["block"]] = record["open"]
+        done = sum(1 for ip in self.discovered if not self._needs_scan(ip))
+        logging.info(f"Resuming from {self.path}: {len(self.discovered)} hosts discovered, {done} fully scanned")
+
+    def _needs_scan(self, ip: str) -> bool:
+        alive = self.discovered.get(ip)
+        if alive is None:
+            return True
+        return alive and len(self.finished.get(ip, ())) < self.blocks
+
+    def write(self, record: Dict):
+        self._log.record(record)
+        if self._replay is not None and record["type"] == "host" and record["alive"] \
+                and record["ip"] in self.finished:
+            with self._lock:
+                self._replay_ports(record["ip"], *self._replay)
+
+    def targets(self, ips: Iterable[str]) -> Iterator[str]:
+        return (ip for ip in super().targets(ips) if self._needs_scan(ip))
+
+    def ports_for(self, ip: str) -> List[int]:
+        ports = super().ports_for(ip)
+        finished = self.finished.get(ip)
+        if not finished:
+            return ports
+        return [port for port in ports if self._block_of[port] not in finished]
+
+    def host_done(self, ip: str, alive: bool):
+        self.write({"type": "host", "ip": ip, "alive": alive})
+
+    def port_done(self, ip: str, port: int, is_open: bool):
+        block = self._block_of[port]
+        with self._lock:
+            entry = self._pending.get((ip, block))
+            if entry is None:
+                size = min(self.block_size, len(self.ports) - block * self.block_size)
+                entry = self._pending[ip, block] = [size, []]
+            entry[0] -= 1
+            if is_open:
+                entry[1].append(port)
+            if entry[0]:
+                return
+            del self._pending[ip, block]
+        self.write({"type": "block", "ip": ip, "block": block, "open": sorted(entry[1])})
+
+    def replay(self, sink: ResultSink) -> ScanResults:
+        """Pass the results of finished work to `sink` and return them.
+
+        Live hosts that still have blocks left are not included: the resumed
+        scan probes them again and reports them if they are still up. The open
+        ports of their finished blocks follow, into `sink` and the returned
+        results, once write() sees that host rediscovered as live.
+        """
+        results = ScanResults()
+        for ip, alive in self.discovered.items():
+            if alive and not self._needs_scan(ip):
+                results.add_live_host(ip)
+                sink.add_live_host(ip)
+                self._replay_ports(ip, sink, results)
+        self._replay = (sink, results)
+        return results
+
+    def _replay_ports(self, ip: str, sink: ResultSink, results: ScanResults):
+        blocks = self.finished.get(ip, {})
+        for block in sorted(blocks):
+            for port in blocks[block]:
+                results.add_open_port(ip, port)
+                sink.add_open_port(ip, port)
+
+    def close(self, remove: bool = False):
+        """Flush the log; remove it if the scan finished and it is no longer needed."""
+        self._log.close()
+        if remove:
+            os.remove(self.path)
+
+def plan_incremental(previous: Dict,
+                     cidr_ranges: List[str]) -> Tuple[List[str], List[str], Dict[str, List[int]]]:
+    """Order the scan around an earlier result: (cidr_ranges, first_hosts, first_ports).
+
+    Ranges that the previous scan did not cover come first, previously live
+    hosts inside the current ranges are probed before any other target, and
+    their previously open ports before their other ports.
+    """
+    old_ranges = set(previous.get("cidr_ranges") or [])
+    cidr_ranges = [c for c in cidr_ranges if c not in old_ranges] + [c for c in cidr_ranges if c in old_ranges]
+    networks = [ip_network(cidr, strict=False) for cidr in cidr_ranges]
+    first_hosts = [ip for ip in previous.get("live_hosts", [])
+                   if any(ip_address(ip) in network for network in networks)]
+    in_scope = set(first_hosts)
+    first_ports: Dict[str, List[int]] = {}
+    for entry in previous.get("open_ports", []):
+        if entry["ip"] in in_scope:
+            first_ports.setdefault(entry["ip"], []).append(entry["port"])
+    return cidr_ranges, first_hosts, first_ports
+
+def diff_results(previous: Dict, first_hosts: List[str], ports: List[int],
+                 results: ScanResults) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """Compare open ports with an earlier scan: (newly opened, newly closed).
+
+    A previously open port counts as closed only if this scan covered it,
+    i.e. its host was in `first_hosts` and the port in `ports`.
+    """
+    before = ScanResults.from_document(previous)
+    opened = list((results - before).open_ports())
+    covered_hosts = set(first_hosts)
+    covered_ports = set(ports)
+    closed = [(ip, port) for ip, port in (before - results).open_ports()
+              if ip in covered_hosts and port in covered_ports]
+    return opened, closed
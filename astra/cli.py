@@ -3,9 +3,34 @@ import logging
 import sys
 from typing import List, Tuple
 from .config import load_config
-from .api import get_cidr_ranges
-from .network import extract_ips, scan_network
-from .report import save_results
+from .daemon import DEFAULT_MAX_JOBS, DEFAULT_SOCKET_PATH, run_daemon
+from .discovery import DEFAULT_DISCOVERY_PORTS, METHODS, Discovery
+from .api import get_cidr_ranges, get_cidr_ranges_bulk, read_targets_file
+from .checkpoint import Checkpoint, ScanPlan, diff_results, plan_incremental
+from .metrics import DEFAULT_STATS_INTERVAL, MetricsServer, ScanMetrics, StatsWriter
+from .network import count_ips, filter_shard, iter_ips, scan_network
+from .parallel import WorkerFailed, scan_network_multiprocess
+from .ratelimit import DEFAULT_MIN_RATE, DEFAULT_RATE, RateLimiter
+from .permutation import parse_shard
+from .report import convert_results, log_diff, log_results, merge_results, open_sink, read_results, save_diff
+from .resolver import DEFAULT_CACHE_PATH, DEFAULT_DNS_CONCURRENCY, DEFAULT_DNS_TIMEOUT, BulkResolver, DNSCache
+from .scanner import DEFAULT_WORKERS, Scanner
+from .syn import raw_sockets_available
+from .targets import TargetSet
+from .timing import DEFAULT_MIN_TIMEOUT, DEFAULT_RETRIES, TimeoutPolicy
+
+def _shard_arg(text: str):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _methods_arg(text: str) -> List[str]:
+    methods = [method.strip() for method in text.split(",") if method.strip()]
+    unknown = [method for method in methods if method not in METHODS]
+    if unknown or not methods:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated list of {', '.join(METHODS)}")
+    return methods
 
 def parse_args() -> argparse.Namespace:
     """Parse command-line arguments."""
@@ -26,22 +51,76 @@ def parse_args() -> argparse.Namespace:
     cidr_limit_group.add_argument("--first-2-per-cidr", action="store_true", help="Scan only the first 2 IPs per CIDR range")
     cidr_limit_group.add_argument("--first-10-per-cidr", action="store_true", help="Scan only the first 10 IPs per CIDR range")
 
+    parser.add_argument("--discovery", type=_methods_arg, metavar="METHODS", help=f"Race these host discovery probes, comma-separated: {', '.join(METHODS)} (tcp: --discovery-ports, where a reset also counts as up; icmp: where ping sockets are allowed; arp: on-link IPv4 subnets). Finds more live hosts than the default check, which counts a host as up only if port 80 accepts a connection")
+    parser.add_argument("--discovery-ports", metavar="PORTS", help=f"TCP ports raced by --discovery (default: {','.join(map(str, DEFAULT_DISCOVERY_PORTS))})")
+    parser.add_argument("--skip-discovery", action="store_true", help="Treat every target as live and port-scan it without discovery probes")
     parser.add_argument("--timeout", type=float, help="Timeout for host/port scans in seconds (default: 1.0 from config)")
+    parser.add_argument("--adaptive-timeout", action="store_true", help="Derive each host's port timeout from its measured RTT, capped at --timeout")
+    parser.add_argument("--min-timeout", type=float, help="Lower bound for adaptive timeouts in seconds (default: 0.1 from config)")
+    parser.add_argument("--retries", type=int, help="Retries for ports that do not answer (default: 1 with --adaptive-timeout, else 0)")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread", help="Scan engine: thread pools or asyncio non-blocking connects (default: thread)")
+    parser.add_argument("--syn", action="store_true", help="Use raw-socket SYN (half-open) scanning; Linux only, needs root or CAP_NET_RAW")
+    parser.add_argument("--concurrency", type=int, help="Maximum probes in flight for the async engine (default: 1000) or SYN scan (default: 4096)")
+    parser.add_argument("--rate", type=float, help="Maximum probes per second across the whole scan (default: unlimited)")
+    parser.add_argument("--adaptive-rate", action="store_true", help="Adjust the probe rate with AIMD: halve it when timeouts/errors spike, grow it otherwise (starts at --rate, default 1000)")
+    parser.add_argument("--max-rate", type=float, help="Upper bound for --adaptive-rate in probes per second (default: 10x the starting rate)")
+    parser.add_argument("--pipeline", action="store_true", help="Port-scan each host as soon as discovery finds it instead of after discovery completes")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes to split targets across (default: 1)")
+    parser.add_argument("--seed", type=int, help="Probe targets, and the ports of live hosts, in a pseudo-random order derived from SEED (with --pipeline, live hosts are port-scanned one after another, each in its own shuffled port order)")
+    parser.add_argument("--shard", type=_shard_arg, metavar="I/N", help="Scan only shard I of N (e.g. 2/4); every node needs the same --seed and targets")
     parser.add_argument("--max-ips", type=int, help="Maximum total number of IPs to scan (global limit)")
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output with detailed logs")
     parser.add_argument("--output", help="File to save results (e.g., results.json)")
-    parser.add_argument("--output-format", choices=["json", "csv"], help="Output format (json, csv)")
+    parser.add_argument("--output-format", choices=["json", "ndjson", "csv", "bin"], help="Output format (json, ndjson, csv, bin); results are streamed to disk as they are found, except bin (compact binary, written at the end)")
+    parser.add_argument("--convert", metavar="RESULTS", help="Convert a results file (bin, json or ndjson) to --output in --output-format, then exit")
+    parser.add_argument("--merge", nargs="+", metavar="RESULTS", help="Merge results files (e.g. one per --shard) into --output in --output-format, then exit")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted scan from the checkpoint kept next to --output")
+    parser.add_argument("--incremental", metavar="PREVIOUS", help="Re-scan against an earlier results file: previously open ports and new ranges first, then report opened/closed ports")
+    parser.add_argument("--stats-file", metavar="PATH", help="Rewrite live scan statistics (phase progress, probes/sec, ETA, outcomes, latency) as JSON to PATH during the scan")
+    parser.add_argument("--stats-interval", type=float, default=DEFAULT_STATS_INTERVAL, help=f"Seconds between --stats-file updates (default: {DEFAULT_STATS_INTERVAL:.0f})")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT", help="Serve live scan metrics in Prometheus text format at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--daemon", action="store_true", help="Run as a long-lived scan daemon taking jobs over --socket and/or --http-port instead of scanning once")
+    parser.add_argument("--socket", metavar="PATH", help=f"Unix socket the daemon accepts jobs on (default: {DEFAULT_SOCKET_PATH} unless --http-port is given)")
+    parser.add_argument("--http-port", type=int, metavar="PORT", help="Also accept daemon jobs over HTTP on 127.0.0.1:PORT (POST /scans)")
+    parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS, help=f"Daemon jobs run at once; the rest wait in arrival order (default: {DEFAULT_MAX_JOBS})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"Probe threads the daemon shares between running jobs (default: {DEFAULT_WORKERS})")
     parser.add_argument("--config", help="Path to config file (default: ~/.astra/config.json)")
     parser.add_argument("--cidr", help="Comma-separated CIDR ranges to scan (e.g., 192.168.1.0/24), skips domain resolution; org is optional when used")
+    parser.add_argument("--exclude", metavar="CIDRS", help="Comma-separated CIDR ranges or IPs never to scan")
+    parser.add_argument("--exclude-file", metavar="PATH", help="File with CIDR ranges or IPs never to scan, one per line (# comments allowed)")
+    parser.add_argument("--targets-file", help="File with one org, domain or CIDR range per line to resolve and scan; org is optional when used")
+    parser.add_argument("--dns-concurrency", type=int, default=DEFAULT_DNS_CONCURRENCY, help=f"Maximum DNS queries in flight (default: {DEFAULT_DNS_CONCURRENCY})")
+    parser.add_argument("--no-dns-cache", action="store_true", help="Do not read or update the DNS cache (~/.astra/dns_cache.json)")
     args = parser.parse_args()
 
     # Validate that org is provided if --cidr is not used
-    if not args.cidr and not args.org:
-        parser.error("the following arguments are required: org (unless --cidr is provided)")
+    if args.convert and not args.output:
+        parser.error("--convert requires --output")
+    if args.merge and not args.output:
+        parser.error("--merge requires --output")
+    if args.syn:
+        args.engine = "syn"
+    if args.discovery_ports and not args.discovery:
+        parser.error("--discovery-ports requires --discovery")
+    if args.discovery and args.skip_discovery:
+        parser.error("--discovery and --skip-discovery are mutually exclusive")
+    if (args.socket or args.http_port is not None) and not args.daemon:
+        parser.error("--socket and --http-port require --daemon")
+    if args.daemon and args.engine == "syn":
+        parser.error("--daemon does not support --syn")
+    if not args.cidr and not args.org and not args.targets_file and not args.convert and not args.merge \
+            and not args.daemon:
+        parser.error("the following arguments are required: org (unless --cidr or --targets-file is provided)")
     
     # If org is not provided, use a placeholder for logging purposes
     if not args.org:
-        args.org = "CIDR-only scan"
+        args.org = f"targets from {args.targets_file}" if args.targets_file else "CIDR-only scan"
+
+    if args.shard and args.seed is None:
+        parser.error("--shard requires --seed, so that every node visits targets in the same order")
+
+    if args.resume and not args.output:
+        parser.error("--resume requires --output (the checkpoint is kept next to the output file)")
 
     # Determine max_ips_per_cidr based on flags
     if args.first_1_per_cidr:
@@ -81,11 +160,29 @@ def main():
         format="%(asctime)s [%(levelname)s] %(message)s",
     )
 
+    # Convert an earlier results file instead of scanning
+    if args.convert:
+        try:
+            convert_results(args.convert, args.output, args.output_format or "json")
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not convert {args.convert}: {e}")
+            sys.exit(1)
+        return
+    if args.merge:
+        try:
+            merge_results(args.merge, args.output, args.output_format or "json")
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not merge results: {e}")
+            sys.exit(1)
+        return
+
     # Load configuration
     config = load_config(args.config)
     api_token = args.api_token or config.get("api_token")
     default_ports = config.get("default_ports", "22,80,443,8080,8443")
     default_timeout = config.get("default_timeout", 1.0)
+    default_min_timeout = config.get("min_timeout", DEFAULT_MIN_TIMEOUT)
+    default_retries = config.get("retries", DEFAULT_RETRIES)
 
     # Determine ports to scan
     if args.first_1000:
@@ -102,34 +199,206 @@ def main():
     max_ips = args.max_ips
     max_ips_per_cidr = args.max_ips_per_cidr
 
+    # Per-host adaptive timeouts and/or retries of silent ports
+    policy = None
+    if args.adaptive_timeout:
+        min_timeout = args.min_timeout if args.min_timeout is not None else default_min_timeout
+        retries = args.retries if args.retries is not None else default_retries
+        policy = TimeoutPolicy(timeout, True, min_timeout, retries)
+    elif args.retries:
+        policy = TimeoutPolicy(timeout, False, retries=args.retries)
+
+    # Host discovery: a connect to port 80 unless --discovery races other probes per host
+    discovery = None
+    if args.skip_discovery:
+        discovery = Discovery(skip=True)
+    elif args.discovery:
+        try:
+            discovery_ports = [int(p) for p in args.discovery_ports.split(",")] if args.discovery_ports \
+                else DEFAULT_DISCOVERY_PORTS
+        except ValueError:
+            logging.error(f"Invalid --discovery-ports: {args.discovery_ports}")
+            sys.exit(1)
+        discovery = Discovery(discovery_ports, args.discovery)
+    logging.info(f"Host discovery: {discovery.describe() if discovery else 'connect to port 80'}")
+
+    # Global probe rate limit, optionally AIMD-controlled
+    limiter = None
+    if args.rate or args.adaptive_rate:
+        limiter = RateLimiter(args.rate or DEFAULT_RATE, args.adaptive_rate,
+                              config.get("min_rate", DEFAULT_MIN_RATE), args.max_rate)
+
+    # DNS resolution is concurrent and cached on disk across runs; --cidr scans need none
+    resolver = None
+    if not args.cidr or args.daemon:
+        cache = None if args.no_dns_cache else DNSCache(config.get("dns_cache", DEFAULT_CACHE_PATH))
+        resolver = BulkResolver(args.dns_concurrency, config.get("dns_timeout", DEFAULT_DNS_TIMEOUT), cache,
+                                config.get("nameservers"))
+
+    # Serve scan jobs from one warm process instead of scanning once
+    if args.daemon:
+        scanner = Scanner(args.workers, timeout, args.engine, args.concurrency, limiter, resolver, discovery)
+        socket_path = args.socket or (DEFAULT_SOCKET_PATH if args.http_port is None else None)
+        try:
+            run_daemon(scanner, socket_path, args.http_port, args.max_jobs)
+        except OSError as e:
+            logging.error(f"Could not start daemon: {e}")
+            sys.exit(1)
+        return
+
     # Get CIDR ranges
     logging.info(f"Starting scan for {args.org}")
-    cidr_ranges = get_cidr_ranges(args.org, api_token, args.cidr)
+    if args.targets_file:
+        try:
+            targets = read_targets_file(args.targets_file)
+        except OSError as e:
+            logging.error(f"Could not read targets file {args.targets_file}: {e}")
+            sys.exit(1)
+        cidr_ranges = get_cidr_ranges_bulk(targets, resolver)
+    else:
+        cidr_ranges = get_cidr_ranges(args.org, api_token, args.cidr, resolver)
     if not cidr_ranges:
         logging.error("No CIDR ranges found. Exiting.")
         sys.exit(1)
 
-    # Extract IPs from CIDR ranges
-    all_ips = extract_ips(cidr_ranges, max_ips, max_ips_per_cidr)
-    if not all_ips:
+    if args.engine == "syn":
+        if not raw_sockets_available():
+            logging.error("SYN scan needs Linux and root or CAP_NET_RAW. Exiting.")
+            sys.exit(1)
+        ipv6_ranges = [cidr for cidr in cidr_ranges if ":" in cidr]
+        if ipv6_ranges:
+            logging.warning(f"SYN scan is IPv4 only; skipping {len(ipv6_ranges)} IPv6 ranges")
+            cidr_ranges = [cidr for cidr in cidr_ranges if ":" not in cidr]
+
+    # Incremental scans probe what changed most likely first: new ranges, then previously open ports
+    previous = None
+    first_hosts = first_ports = None
+    if args.incremental:
+        try:
+            previous = read_results(args.incremental)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read previous results {args.incremental}: {e}")
+            sys.exit(1)
+        cidr_ranges, first_hosts, first_ports = plan_incremental(previous, cidr_ranges)
+        logging.info(f"Incremental scan against {args.incremental}: re-checking {len(first_hosts)} previously live hosts first")
+
+    # Merge overlapping ranges and drop excluded addresses once, as sorted intervals
+    exclude = args.exclude.split(",") if args.exclude else []
+    if args.exclude_file:
+        try:
+            exclude += read_targets_file(args.exclude_file)
+        except OSError as e:
+            logging.error(f"Could not read exclude file {args.exclude_file}: {e}")
+            sys.exit(1)
+    try:
+        target_set = TargetSet(cidr_ranges, exclude, max_ips_per_cidr)
+    except ValueError as e:
+        logging.error(f"Cannot apply exclusions: {e}. Exiting.")
+        sys.exit(1)
+    logging.info(f"Targets: {target_set.summary()}")
+    if first_hosts:
+        first_hosts = [ip for ip in first_hosts if ip in target_set]
+        first_ports = {ip: first_ports[ip] for ip in first_hosts if ip in first_ports}
+
+    # Count targets up front; IPs themselves are generated lazily during the scan
+    shard = args.shard or (0, 1)
+    if args.shard and first_hosts:
+        # Each shard re-checks only the previously live hosts it owns
+        first_hosts = filter_shard(first_hosts, target_set, max_ips, None, args.seed, shard)
+        first_ports = {ip: first_ports[ip] for ip in first_hosts if ip in first_ports}
+    total_ips = count_ips(target_set, max_ips, None, shard)
+    if not total_ips:
         logging.error("No IPs extracted. Exiting.")
         sys.exit(1)
-    logging.info(f"Extracted {len(all_ips)} IPs")
+    if args.shard:
+        logging.info(f"Extracted {total_ips} IPs for shard {shard[0] + 1}/{shard[1]} (seed {args.seed})")
+    else:
+        logging.info(f"Extracted {total_ips} IPs")
+
+    # Checkpoint finished work next to the output file so an interrupted scan can be resumed
+    plan = None
+    if args.output:
+        try:
+            plan = Checkpoint(f"{args.output}.state", ports, resume=args.resume, first_hosts=first_hosts,
+                              first_ports=first_ports, seed=args.seed)
+        except ValueError as e:
+            logging.error(f"Cannot resume: {e}. Exiting.")
+            sys.exit(1)
+    elif previous is not None or args.seed is not None:
+        plan = ScanPlan(ports, first_hosts, first_ports, args.seed)
+
+    # Stream results to the output file as they are found
+    output_format = args.output_format or "json"
+    sink = open_sink(args.output, output_format) if args.output else None
+    resumed = None
+    if sink:
+        sink.start(args.org, cidr_ranges)
+        resumed = plan.replay(sink)
+
+    # Live metrics for watching long scans
+    metrics = None
+    reporters = []
+    if args.stats_file or args.metrics_port is not None:
+        metrics = ScanMetrics()
+        metrics.expect("Discovery", total_ips)
+        if args.stats_file:
+            reporters.append(StatsWriter(metrics, args.stats_file, args.stats_interval))
+        if args.metrics_port is not None:
+            try:
+                reporters.append(MetricsServer(metrics, args.metrics_port))
+            except OSError as e:
+                logging.error(f"Could not serve metrics on port {args.metrics_port}: {e}")
+                sys.exit(1)
 
     # Scan the network
-    live_hosts, open_ports = scan_network(all_ips, ports, timeout)
+    try:
+        if args.processes > 1:
+            results = scan_network_multiprocess(
+                target_set, ports, timeout, args.processes, max_ips, None, sink, args.seed, shard,
+                engine=args.engine, concurrency=args.concurrency, pipeline=args.pipeline,
+                policy=policy, limiter=limiter, plan=plan, metrics=metrics, discovery=discovery)
+        else:
+            targets = iter_ips(target_set, max_ips, None, args.seed, shard)
+            results = scan_network(targets, ports, timeout, args.engine, args.concurrency, sink, args.pipeline,
+                                   policy=policy, limiter=limiter, plan=plan, metrics=metrics,
+                                   discovery=discovery)
+    except KeyboardInterrupt:
+        logging.warning("Scan interrupted")
+        if sink:
+            sink.close()
+            plan.close()
+            logging.info(f"Partial results saved as {output_format.upper()} to {args.output}; "
+                         f"rerun with --resume to continue")
+        sys.exit(130)
+    except WorkerFailed as e:
+        logging.error(f"Scan failed: {e}")
+        if sink:
+            # Keep the checkpoint: the failed workers' targets still need scanning
+            sink.close()
+            plan.close()
+            logging.info(f"Partial results saved as {output_format.upper()} to {args.output}; "
+                         f"rerun with --resume to continue")
+        sys.exit(1)
+    finally:
+        for reporter in reporters:
+            reporter.close()
+    if resumed is not None:
+        results = results.merge(resumed)
 
     # Save results
-    output_format = args.output_format or "json"
-    if args.output:
-        save_results(args.org, cidr_ranges, live_hosts, open_ports, args.output, output_format)
+    if sink:
+        sink.close()
+        # The scan is complete, so the checkpoint is no longer needed
+        plan.close(remove=True)
+        logging.info(f"Results saved as {output_format.upper()} to {args.output}")
     else:
-        logging.info(f"Found {len(live_hosts)} live hosts")
-        for host in live_hosts:
-            logging.info(f"  - {host}")
-        logging.info(f"Found {len(open_ports)} open ports")
-        for ip, port in open_ports:
-            logging.info(f"  - {ip}:{port}")
+        log_results(*results)
+
+    if previous is not None:
+        opened, closed = diff_results(previous, first_hosts, ports, results)
+        log_diff(opened, closed)
+        if args.output:
+            save_diff(args.incremental, opened, closed, f"{args.output}.diff.json")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
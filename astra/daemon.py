@@ -0,0 +1,316 @@
+import collections
+import errno
+import itertools
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List
+from .report import ResultSink
+from .scanner import ScanCancelled, Scanner
+from .targets import TargetSet
+
+DEFAULT_SOCKET_PATH = "~/.astra/astrad.sock"
+DEFAULT_MAX_JOBS = 4
+# Job fields passed on to Scanner.scan(), with their types
+JOB_OPTIONS = {"timeout": (int, float), "max_ips": int, "max_ips_per_cidr": int, "seed": int, "pipeline": bool}
+
+def parse_job(job: Dict) -> Dict:
+    """Validate a job request and return the keyword arguments for Scanner.scan().
+
+    A job is a JSON object with "targets" (CIDR ranges, IPs or domains),
+    "ports" (a list or a comma-separated string) and optionally the keys
+    of JOB_OPTIONS, and "exclude" (CIDR ranges or IPs never to probe, a
+    list or a comma-separated string). Raises ValueError if it is malformed.
+    """
+    if not isinstance(job, dict):
+        raise ValueError("job must be a JSON object")
+    targets = job.get("targets")
+    if isinstance(targets, str):
+        targets = targets.split(",")
+    if not targets or not all(isinstance(target, str) for target in targets):
+        raise ValueError("job needs \"targets\": a list of CIDR ranges, IPs or domains")
+    ports = job.get("ports")
+    try:
+        if isinstance(ports, str):
+            ports = [int(port) for port in ports.split(",")]
+        if not ports or not all(isinstance(port, int) and 0 <= port <= 65535 for port in ports):
+            raise ValueError
+    except ValueError:
+        raise ValueError("job needs \"ports\": a list of ports or a comma-separated string") from None
+    options = {"targets": [target.strip() for target in targets], "ports": ports}
+    exclude = job.get("exclude", [])
+    if isinstance(exclude, str):
+        exclude = exclude.split(",")
+    if not isinstance(exclude, list) or not all(isinstance(entry, str) for entry in exclude):
+        raise ValueError("\"exclude\" must be a list of CIDR ranges or IPs")
+    if exclude:
+        # Reject a bad exclude list here rather than after the job was queued
+        TargetSet([], exclude)
+        options["exclude"] = exclude
+    for key, value in job.items():
+        if key in ("targets", "ports", "exclude"):
+            continue
+        if key not in JOB_OPTIONS:
+            raise ValueError(f"unknown job option {key!r}")
+        if not isinstance(value, JOB_OPTIONS[key]) or (isinstance(value, bool) and JOB_OPTIONS[key] is not bool):
+            raise ValueError(f"invalid value for {key!r}: {value!r}")
+        options[key] = value
+    return options
+
+class _EmitSink(ResultSink):
+    """Send each result to the job's caller; a caller that went away cancels the job."""
+
+    def __init__(self, emit: Callable[[Dict], None], cancel: threading.Event):
+        self.emit = emit
+        self.cancel = cancel
+        self.live_hosts = 0
+        self.open_ports = 0
+
+    def _send(self, record: Dict):
+        try:
+            self.emit(record)
+        except OSError:
+            self.cancel.set()
+            raise ScanCancelled()
+
+    def add_live_host(self, ip: str):
+        self.live_hosts += 1
+        self._send({"type": "host", "ip": ip})
+
+    def add_open_port(self, ip: str, port: int):
+        self.open_ports += 1
+        self._send({"type": "port", "ip": ip, "port": port})
+
+def _remove_stale_socket(path: str):
+    """Remove a Unix socket left behind by a daemon that has exited.
+
+    Raises OSError, leaving `path` alone, if a daemon is still listening on
+    it or it is not a socket.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except ConnectionRefusedError:
+            os.unlink(path)
+            return
+    raise OSError(errno.EADDRINUSE, f"a daemon is already running on {path}")
+
+class ScanDaemon:
+    """Run scan jobs from many callers on one Scanner, streaming each job's results back to its caller.
+
+    At most `max_jobs` jobs run at once and further jobs wait their turn in
+    arrival order. Running jobs share the scanner's FairExecutor, which
+    serves their probes round-robin, so a small job finishes promptly even
+    next to a large sweep. Jobs arrive over a Unix socket (serve_unix) or
+    HTTP (serve_http); both speak newline-delimited JSON.
+    """
+
+    def __init__(self, scanner: Scanner, max_jobs: int = DEFAULT_MAX_JOBS):
+        self.scanner = scanner
+        self.max_jobs = max_jobs
+        self.jobs: Dict[int, Dict] = {}
+        self._ids = itertools.count(1)
+        self._slots = threading.Condition()
+        self._waiting = collections.deque()
+        self._running = 0
+        self._servers = []
+
+    def status(self) -> List[Dict]:
+        with self._slots:
+            return [dict(job) for job in self.jobs.values()]
+
+    def _wait_for_slot(self, job_id: int):
+        with self._slots:
+            self._waiting.append(job_id)
+            while self._waiting[0] != job_id or self._running >= self.max_jobs:
+                self._slots.wait()
+            self._waiting.popleft()
+            self._running += 1
+            self.jobs[job_id]["state"] = "running"
+            # The next job in line may fit too
+            self._slots.notify_all()
+
+    def _finish(self, job_id: int):
+        with self._slots:
+            self._running -= 1
+            del self.jobs[job_id]
+            self._slots.notify_all()
+
+    def run_job(self, options: Dict, emit: Callable[[Dict], None]):
+        """Queue and run one job (as returned by parse_job), passing every record for its caller to `emit`.
+
+        Records are {"type": "job"} when the job is accepted (with the number
+        of jobs queued ahead of it), "host" and "port" records as results are
+        found, then {"type": "done"} with totals or {"type": "error"}. A
+        caller that disconnects cancels its job.
+        """
+        job_id = next(self._ids)
+        with self._slots:
+            self.jobs[job_id] = {"id": job_id, "state": "queued", "targets": options["targets"]}
+            ahead = len(self._waiting)
+        cancel = threading.Event()
+        sink = _EmitSink(emit, cancel)
+        try:
+            emit({"type": "job", "id": job_id, "ahead": ahead})
+        except OSError:
+            with self._slots:
+                del self.jobs[job_id]
+            return
+        self._wait_for_slot(job_id)
+        logging.info(f"Job {job_id}: scanning {len(options['ports'])} ports on {', '.join(options['targets'])}")
+        start = time.monotonic()
+        state, record = "failed", None
+        try:
+            self.scanner.scan(sink=sink, cancel=cancel, **options)
+            state = "done"
+            record = {"type": "done", "id": job_id, "live_hosts": sink.live_hosts, "open_ports": sink.open_ports,
+                      "elapsed": round(time.monotonic() - start, 3)}
+        except ScanCancelled:
+            state = "cancelled"
+        except Exception as e:
+            logging.exception(f"Job {job_id} failed")
+            record = {"type": "error", "id": job_id, "error": str(e)}
+        finally:
+            self._finish(job_id)
+        logging.info(f"Job {job_id}: {state} in {time.monotonic() - start:.1f}s")
+        if record is not None:
+            try:
+                emit(record)
+            except OSError:
+                pass
+
+    def serve_unix(self, path: str = DEFAULT_SOCKET_PATH):
+        """Accept jobs on a Unix socket: send one JSON job per connection, read records until it closes."""
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        _remove_stale_socket(path)
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                lock = threading.Lock()
+
+                def emit(record: Dict):
+                    with lock:
+                        self.wfile.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+                try:
+                    request = json.loads(self.rfile.readline())
+                    if isinstance(request, dict) and request.get("command") == "status":
+                        emit({"type": "status", "jobs": daemon.status()})
+                        return
+                    options = parse_job(request)
+                except ValueError as e:
+                    emit({"type": "error", "error": str(e)})
+                    return
+                daemon.run_job(options, emit)
+
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        server.daemon_threads = True
+        self._start(server)
+        logging.info(f"Accepting scan jobs on {path}")
+        return server
+
+    def serve_http(self, port: int, host: str = "127.0.0.1"):
+        """Accept jobs over HTTP: POST a JSON job to /scans and read NDJSON records; GET /jobs lists jobs."""
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send_json(self, status: int, document):
+                data = json.dumps(document).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.split("?", 1)[0] == "/jobs":
+                    self._send_json(200, daemon.status())
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                if self.path.split("?", 1)[0] != "/scans":
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    options = parse_job(json.loads(self.rfile.read(length)))
+                except ValueError as e:
+                    self._send_json(400, {"type": "error", "error": str(e)})
+                    return
+                # No Content-Length: records stream until the connection closes (HTTP/1.0)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                lock = threading.Lock()
+
+                def emit(record: Dict):
+                    with lock:
+                        self.wfile.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+                        self.wfile.flush()
+
+                daemon.run_job(options, emit)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Daemon request: {format % args}")
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        self._start(server)
+        logging.info(f"Accepting scan jobs on http://{host}:{server.server_address[1]}/scans")
+        return server
+
+    def _start(self, server: socketserver.BaseServer):
+        self._servers.append(server)
+        threading.Thread(target=server.serve_forever, name="astra-daemon", daemon=True).start()
+
+    def close(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+            if server.address_family == socket.AF_UNIX:
+                os.unlink(server.server_address)
+        self._servers = []
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+def run_daemon(scanner: Scanner, socket_path: str = None, http_port: int = None, max_jobs: int = DEFAULT_MAX_JOBS):
+    """Serve scan jobs on a Unix socket and/or HTTP port until interrupted (Ctrl-C or SIGTERM)."""
+    daemon = ScanDaemon(scanner, max_jobs)
+    signal.signal(signal.SIGTERM, _stop)
+    try:
+        if socket_path:
+            daemon.serve_unix(socket_path)
+        if http_port is not None:
+            daemon.serve_http(http_port)
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        logging.info("Daemon stopping")
+    finally:
+        daemon.close()
+        scanner.close()
+
+def submit(job: Dict, path: str = DEFAULT_SOCKET_PATH) -> Iterator[Dict]:
+    """Send a job to a daemon's Unix socket and yield its records as they arrive."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(os.path.expanduser(path))
+        sock.sendall(json.dumps(job).encode() + b"\n")
+        with sock.makefile("rb") as stream:
+            for line in stream:
+                yield json.loads(line)
@@ -0,0 +1,342 @@
+import asyncio
+import errno
+import logging
+import selectors
+import socket
+import struct
+import threading
+import time
+from ipaddress import IPv4Network, ip_address
+from typing import Dict, Iterable, List, Optional, Tuple
+from . import sockets
+from .metrics import ScanMetrics
+
+DEFAULT_DISCOVERY_PORTS = [80, 443, 22]
+METHODS = ("tcp", "icmp", "arp")
+# UDP discard port: the datagram only exists to make the kernel resolve the neighbour
+ARP_PORT = 9
+# How often a pending ARP probe re-checks the neighbour table
+ARP_POLL_INTERVAL = 0.01
+ICMP_PROTO = {socket.AF_INET: socket.IPPROTO_ICMP, socket.AF_INET6: socket.IPPROTO_ICMPV6}
+ICMP_ECHO_REQUEST = {socket.AF_INET: 8, socket.AF_INET6: 128}
+ICMP_ECHO_REPLY = {socket.AF_INET: 0, socket.AF_INET6: 129}
+
+_icmp_available: Dict[int, bool] = {}
+
+def icmp_available(family: int = socket.AF_INET) -> bool:
+    """Check whether this process may open unprivileged datagram ICMP ("ping") sockets.
+
+    Linux allows them for the groups in net.ipv4.ping_group_range; macOS
+    allows them to everyone. The kernel fills in the echo identifier and
+    checksum and only delivers replies to our own requests.
+    """
+    if family not in _icmp_available:
+        try:
+            socket.socket(family, socket.SOCK_DGRAM, ICMP_PROTO[family]).close()
+            _icmp_available[family] = True
+        except OSError:
+            _icmp_available[family] = False
+    return _icmp_available[family]
+
+def on_link_networks(path: str = "/proc/net/route") -> List[IPv4Network]:
+    """Return the directly attached IPv4 subnets (routes without a gateway) from the Linux routing table."""
+    networks = []
+    try:
+        with open(path) as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                destination, gateway, flags, mask = (int(fields[i], 16) for i in (1, 2, 3, 7))
+                # RTF_UP, no gateway, and not a default route
+                if flags & 0x1 and not gateway and mask:
+                    # /proc/net/route prints addresses in host (little-endian) byte order
+                    networks.append(IPv4Network(f"{socket.inet_ntoa(struct.pack('<I', destination))}/"
+                                                f"{socket.inet_ntoa(struct.pack('<I', mask))}"))
+    except (OSError, ValueError, IndexError, StopIteration):
+        return []
+    return networks
+
+class NeighbourTable:
+    """The kernel's IPv4 neighbour (ARP) table from /proc/net/arp, re-read at most every `max_age` seconds."""
+
+    def __init__(self, path: str = "/proc/net/arp", max_age: float = ARP_POLL_INTERVAL):
+        self.path = path
+        self.max_age = max_age
+        self._resolved = frozenset()
+        self._read_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks cannot be pickled; worker processes get their own
+        return {"path": self.path, "max_age": self.max_age}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def resolved(self, ip: str) -> bool:
+        """Whether the kernel holds a complete hardware address for `ip`."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._read_at >= self.max_age:
+                self._read_at = now
+                self._resolved = self._read()
+            return ip in self._resolved
+
+    def _read(self) -> frozenset:
+        resolved = set()
+        try:
+            with open(self.path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    # ATF_COM: the entry is complete
+                    if len(fields) >= 4 and int(fields[2], 16) & 0x2:
+                        resolved.add(fields[0])
+        except (OSError, ValueError, StopIteration):
+            pass
+        return frozenset(resolved)
+
+class Discovery:
+    """Decide whether hosts are up by racing several probes per host; the first answer wins.
+
+    - tcp: non-blocking connects to each of `ports`. A completed handshake
+      and an RST (connection refused) both show the host is up. The sockets
+      close with an RST too (sockets.probe_socket()).
+    - icmp: an echo request over an unprivileged datagram ICMP socket,
+      where the system allows them (see icmp_available()).
+    - arp: for IPv4 targets on a directly attached subnet, a UDP datagram
+      makes the kernel ARP for the address; a completed neighbour entry,
+      or an ICMP port unreachable for the datagram, shows the host is up.
+
+    Once one probe answers, the others are closed unanswered. A host is
+    down when every probe has failed or `timeout` has passed. With `skip`,
+    nothing is sent and every target counts as live (--skip-discovery).
+    """
+
+    def __init__(self, ports: Iterable[int] = DEFAULT_DISCOVERY_PORTS, methods: Iterable[str] = METHODS,
+                 skip: bool = False):
+        methods = set(methods)
+        self.skip = skip
+        self.ports = list(ports) if "tcp" in methods else []
+        self.icmp = "icmp" in methods and (icmp_available(socket.AF_INET) or icmp_available(socket.AF_INET6))
+        self.on_link = on_link_networks() if "arp" in methods else []
+        self._neighbours = NeighbourTable() if self.on_link else None
+
+    def describe(self) -> str:
+        """Summarize the probes in use, for the scan log."""
+        if self.skip:
+            return "skipped; every target is treated as live"
+        probes = []
+        if self.ports:
+            probes.append(f"TCP {','.join(map(str, self.ports))}")
+        if self.icmp:
+            probes.append("ICMP echo")
+        if self.on_link:
+            probes.append(f"ARP on {', '.join(map(str, self.on_link))}")
+        return " + ".join(probes) or "no probes available"
+
+    def _arp_applies(self, ip: str) -> bool:
+        if not self.on_link or ":" in ip:
+            return False
+        address = ip_address(ip)
+        return any(address in network for network in self.on_link)
+
+    def probe_count(self, ip: str) -> int:
+        """Number of probes raced for `ip` (for rate limiting)."""
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        return len(self.ports) + (self.icmp and icmp_available(family)) + self._arp_applies(ip)
+
+    def _open(self, ip: str) -> Tuple[List[Tuple[socket.socket, str]], bool, Optional[bool]]:
+        """Send every probe for `ip`; return (pending sockets, ARP pending, verdict if already known).
+
+        Raises OSError, with nothing left open, if a local resource ran out.
+        """
+        family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+        pending = []
+        try:
+            for port in self.ports:
+                try:
+                    sock = sockets.probe_socket(family)
+                except OSError as e:
+                    if e.errno in sockets.RESOURCE_ERRORS:
+                        raise
+                    logging.debug(f"Could not create socket for {ip}:{port}: {e}")
+                    continue
+                sock.setblocking(False)
+                err = sock.connect_ex((ip, port))
+                if err in (0, errno.ECONNREFUSED):
+                    sock.close()
+                    for other, _ in pending:
+                        other.close()
+                    return [], False, True
+                if err in (errno.EINPROGRESS, errno.EAGAIN):
+                    pending.append((sock, "tcp"))
+                else:
+                    sock.close()
+                    sockets.check_resources(err)
+            if self.icmp and icmp_available(family):
+                # Identifier and checksum are filled in by the kernel
+                echo = struct.pack("!BBHHH", ICMP_ECHO_REQUEST[family], 0, 0, 0, 1)
+                sock = self._datagram(family, ICMP_PROTO[family], (ip, 0), echo)
+                if sock is not None:
+                    pending.append((sock, "icmp"))
+            arp = False
+            if self._arp_applies(ip):
+                sock = self._datagram(socket.AF_INET, 0, (ip, ARP_PORT), b"")
+                if sock is not None:
+                    pending.append((sock, "udp"))
+                    arp = True
+        except OSError:
+            for sock, _ in pending:
+                sock.close()
+            raise
+        return pending, arp, None if pending else False
+
+    @staticmethod
+    def _datagram(family: int, proto: int, address: Tuple[str, int], payload: bytes) -> Optional[socket.socket]:
+        try:
+            sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+        except OSError as e:
+            if e.errno in sockets.RESOURCE_ERRORS:
+                raise
+            logging.debug(f"Could not create discovery socket for {address[0]}: {e}")
+            return None
+        try:
+            sock.setblocking(False)
+            sock.connect(address)
+            sock.send(payload)
+        except OSError as e:
+            sock.close()
+            if e.errno in sockets.RESOURCE_ERRORS:
+                raise
+            logging.debug(f"Could not send discovery probe to {address[0]}: {e}")
+            return None
+        return sock
+
+    @staticmethod
+    def _answer(sock: socket.socket, kind: str) -> Optional[bool]:
+        """Interpret a ready socket: True (host is up), False (this probe failed) or None (keep waiting)."""
+        if kind == "tcp":
+            return sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) in (0, errno.ECONNREFUSED)
+        try:
+            data = sock.recv(64)
+        except ConnectionRefusedError:
+            # ICMP port unreachable for the UDP datagram: someone is there
+            return True
+        except OSError:
+            return False
+        if kind == "icmp" and sock.family == socket.AF_INET and data and data[0] >> 4 == 4:
+            # macOS delivers IPv4 replies with their IP header; Linux strips it
+            data = data[(data[0] & 0x0F) * 4:]
+        if kind == "icmp" and data and data[0] in ICMP_ECHO_REPLY.values():
+            return True
+        return None
+
+    @staticmethod
+    def _events(kind: str) -> int:
+        return selectors.EVENT_WRITE if kind == "tcp" else selectors.EVENT_READ
+
+    def probe(self, ip: str, timeout: float, metrics: ScanMetrics = None) -> Tuple[bool, float]:
+        """Race the probes for `ip` and return (is up, seconds until the verdict).
+
+        Resource errors while sending are retried and counted in `metrics` (see sockets.retry()).
+        """
+        start = time.monotonic()
+        if self.skip:
+            return True, 0.0
+        try:
+            pending, arp, verdict = sockets.retry(lambda: self._open(ip), metrics)
+        except OSError:
+            return False, time.monotonic() - start
+        try:
+            if verdict is not None:
+                return verdict, time.monotonic() - start
+            deadline = start + timeout
+            with selectors.DefaultSelector() as selector:
+                for sock, kind in pending:
+                    selector.register(sock, self._events(kind), kind)
+                left = len(pending)
+                while left or arp:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    for key, _ in selector.select(min(remaining, ARP_POLL_INTERVAL) if arp else remaining):
+                        answer = self._answer(key.fileobj, key.data)
+                        if answer:
+                            return True, time.monotonic() - start
+                        if answer is False:
+                            selector.unregister(key.fileobj)
+                            left -= 1
+                    if arp and self._neighbours.resolved(ip):
+                        return True, time.monotonic() - start
+            return False, time.monotonic() - start
+        finally:
+            for sock, _ in pending:
+                sock.close()
+
+    async def probe_async(self, ip: str, timeout: float, metrics: ScanMetrics = None) -> Tuple[bool, float]:
+        """Event-loop counterpart of probe()."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        if self.skip:
+            return True, 0.0
+
+        async def attempt():
+            return self._open(ip)
+
+        try:
+            pending, arp, verdict = await sockets.retry_async(attempt, metrics)
+        except OSError:
+            return False, loop.time() - start
+        if verdict is not None:
+            for sock, _ in pending:
+                sock.close()
+            return verdict, loop.time() - start
+        done = loop.create_future()
+        waiting = {sock.fileno(): kind for sock, kind in pending}
+
+        def finish(answer: bool):
+            if not done.done():
+                done.set_result(answer)
+
+        def remove(fd: int, kind: str):
+            if kind == "tcp":
+                loop.remove_writer(fd)
+            else:
+                loop.remove_reader(fd)
+
+        def ready(sock: socket.socket, kind: str):
+            answer = self._answer(sock, kind)
+            if answer:
+                finish(True)
+            elif answer is False:
+                fd = sock.fileno()
+                remove(fd, kind)
+                del waiting[fd]
+                if not waiting and not arp:
+                    finish(False)
+
+        def poll_arp():
+            nonlocal arp_timer
+            if self._neighbours.resolved(ip):
+                finish(True)
+            else:
+                arp_timer = loop.call_later(ARP_POLL_INTERVAL, poll_arp)
+
+        for sock, kind in pending:
+            if kind == "tcp":
+                loop.add_writer(sock.fileno(), ready, sock, kind)
+            else:
+                loop.add_reader(sock.fileno(), ready, sock, kind)
+        arp_timer = loop.call_later(ARP_POLL_INTERVAL, poll_arp) if arp else None
+        timer = loop.call_later(timeout, finish, False)
+        try:
+            return await done, loop.time() - start
+        finally:
+            timer.cancel()
+            if arp_timer is not None:
+                arp_timer.cancel()
+            for fd, kind in waiting.items():
+                remove(fd, kind)
+            for sock, _ in pending:
+                sock.close()
@@ -0,0 +1,323 @@
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+DEFAULT_STATS_INTERVAL = 5.0
+# Upper bounds (seconds) of the connect-latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+OUTCOMES = ("open", "closed", "filtered", "error")
+RATE_WINDOW = 10.0
+
+def phase_key(stage: str) -> str:
+    return stage.lower().replace(" ", "_")
+
+def _new_phase() -> Dict:
+    return {"expected": None, "probed": 0, "hits": 0, "started": None, "finished": None}
+
+class ScanMetrics:
+    """Thread-safe scan counters: per-phase progress, probe outcomes, connect latency and probes in flight.
+
+    Engines report phases through StageProgress and individual probes
+    through probe_started()/probe_finished(). snapshot() derives durations,
+    probes/sec over the last RATE_WINDOW seconds and an ETA for the running
+    phase; prometheus() renders the same data in the Prometheus text format.
+    With --processes, each worker keeps its own ScanMetrics and sends its
+    state() to the parent, which adds it in with merge_worker().
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started = clock()
+        self.phases: Dict[str, Dict] = {}
+        self.in_flight = 0
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.resource_retries = 0
+        self._workers: Dict[int, Dict] = {}
+        self._expected: Dict[str, int] = {}
+        self._samples = collections.deque()
+
+    # Reporting
+
+    def expect(self, stage: str, total: int):
+        """Set the number of probes a phase will make (e.g. the target count), for its ETA."""
+        with self._lock:
+            self._expected[phase_key(stage)] = total
+
+    def start_phase(self, stage: str, expected: int = None):
+        with self._lock:
+            phase = self.phases.setdefault(phase_key(stage), _new_phase())
+            # Raw clock readings: time.monotonic() is system-wide, so worker processes' phases line up
+            phase["started"] = self._clock()
+            if expected is not None:
+                phase["expected"] = expected
+
+    def expect_more(self, stage: str, count: int):
+        """Grow a phase's expected probes, e.g. as pipelined discovery finds hosts."""
+        with self._lock:
+            phase = self.phases.setdefault(phase_key(stage), _new_phase())
+            phase["expected"] = (phase["expected"] or 0) + count
+
+    def phase_advance(self, stage: str, hit: bool):
+        with self._lock:
+            phase = self.phases[phase_key(stage)]
+            phase["probed"] += 1
+            if hit:
+                phase["hits"] += 1
+
+    def end_phase(self, stage: str):
+        with self._lock:
+            self.phases[phase_key(stage)]["finished"] = self._clock()
+
+    def probe_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def probe_finished(self, outcome: str, latency: float = None):
+        """Count a finished probe; `latency` goes into the histogram for answered (open/closed) probes."""
+        with self._lock:
+            self.in_flight -= 1
+            self.outcomes[outcome] += 1
+            if latency is not None and outcome in ("open", "closed"):
+                self.latency_sum += latency
+                self.latency_count += 1
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if latency <= bound:
+                        self.latency_buckets[i] += 1
+                        break
+
+    def resource_retry(self):
+        """Count a probe retried because a local resource (fds, ephemeral ports) ran out."""
+        with self._lock:
+            self.resource_retries += 1
+
+    # Aggregation across processes
+
+    def state(self) -> Dict:
+        """Return the raw counters as plain data (picklable, JSON-serializable)."""
+        with self._lock:
+            return {"phases": {key: dict(phase) for key, phase in self.phases.items()},
+                    "in_flight": self.in_flight, "outcomes": dict(self.outcomes),
+                    "latency_buckets": list(self.latency_buckets), "latency_sum": self.latency_sum,
+                    "latency_count": self.latency_count, "resource_retries": self.resource_retries}
+
+    def merge_worker(self, index: int, state: Dict):
+        """Record the latest state() of worker process `index`."""
+        with self._lock:
+            self._workers[index] = state
+
+    def _combined(self) -> Dict:
+        total = self.state()
+        with self._lock:
+            workers = list(self._workers.values())
+            expected = dict(self._expected)
+        for state in workers:
+            total["in_flight"] += state["in_flight"]
+            total["latency_sum"] += state["latency_sum"]
+            total["latency_count"] += state["latency_count"]
+            total["resource_retries"] += state["resource_retries"]
+            for outcome, count in state["outcomes"].items():
+                total["outcomes"][outcome] += count
+            total["latency_buckets"] = [a + b for a, b in zip(total["latency_buckets"], state["latency_buckets"])]
+            for key, phase in state["phases"].items():
+                merged = total["phases"].get(key)
+                if merged is None:
+                    total["phases"][key] = dict(phase, workers=1)
+                    continue
+                merged["workers"] = merged.get("workers", 1) + 1
+                merged["probed"] += phase["probed"]
+                merged["hits"] += phase["hits"]
+                if phase["expected"] is not None:
+                    merged["expected"] = (merged["expected"] or 0) + phase["expected"]
+                merged["started"] = min(t for t in (merged["started"], phase["started"]) if t is not None)
+                if merged["finished"] is None or phase["finished"] is None:
+                    merged["finished"] = None
+                else:
+                    merged["finished"] = max(merged["finished"], phase["finished"])
+        if workers:
+            # A phase is finished only once every worker has finished it
+            for phase in total["phases"].values():
+                if phase.pop("workers", 1) < len(workers):
+                    phase["finished"] = None
+        for key, count in expected.items():
+            total["phases"].setdefault(key, _new_phase())["expected"] = count
+        return total
+
+    # Views
+
+    def snapshot(self) -> Dict:
+        """Return the current metrics as a JSON-serializable dict."""
+        now = self._clock()
+        elapsed = now - self.started
+        state = self._combined()
+        probed = sum(phase["probed"] for phase in state["phases"].values())
+        with self._lock:
+            self._samples.append((now, probed))
+            while len(self._samples) > 2 and now - self._samples[1][0] >= RATE_WINDOW:
+                self._samples.popleft()
+            since, probed_then = self._samples[0]
+        if now > since:
+            rate = (probed - probed_then) / (now - since)
+        else:
+            # First sample: fall back to the average since the scan started
+            rate = probed / elapsed if elapsed > 0 else 0.0
+
+        phases = {}
+        running = None
+        for key, phase in state["phases"].items():
+            if phase["started"] is None:
+                continue
+            end = phase["finished"] if phase["finished"] is not None else now
+            duration = end - phase["started"]
+            phases[key] = {"probed": phase["probed"], "hits": phase["hits"], "expected": phase["expected"],
+                           "duration": round(duration, 3),
+                           "probes_per_sec": round(phase["probed"] / duration, 1) if duration > 0 else 0.0,
+                           "finished": phase["finished"] is not None}
+            if phase["finished"] is None:
+                running = key
+        eta = None
+        if running is not None and phases[running]["expected"] and rate > 0:
+            eta = round(max(0, phases[running]["expected"] - phases[running]["probed"]) / rate, 1)
+        return {
+            "elapsed": round(elapsed, 3),
+            "phase": running,
+            "phases": phases,
+            "probes_per_sec": round(rate, 1),
+            "in_flight": state["in_flight"],
+            "eta_seconds": eta,
+            "outcomes": state["outcomes"],
+            "resource_retries": state["resource_retries"],
+            "connect_latency": {
+                "buckets": dict(zip((str(bound) for bound in LATENCY_BUCKETS), state["latency_buckets"])),
+                "sum": round(state["latency_sum"], 6),
+                "count": state["latency_count"],
+            },
+        }
+
+    def prometheus(self) -> str:
+        """Render the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP astra_{name} {help_text}")
+            lines.append(f"# TYPE astra_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"astra_{name}{{{label_text}}} {value}" if label_text else f"astra_{name} {value}")
+
+        phases = snapshot["phases"]
+        metric("probes_total", "counter", "Probes finished per scan phase.",
+               [({"phase": key}, phase["probed"]) for key, phase in phases.items()])
+        metric("hits_total", "counter", "Live hosts (discovery) or open ports (port scan) found per phase.",
+               [({"phase": key}, phase["hits"]) for key, phase in phases.items()])
+        metric("phase_expected_probes", "gauge", "Probes a phase is expected to make, where known.",
+               [({"phase": key}, phase["expected"]) for key, phase in phases.items() if phase["expected"] is not None])
+        metric("phase_duration_seconds", "gauge", "Time spent in each phase so far.",
+               [({"phase": key}, phase["duration"]) for key, phase in phases.items()])
+        metric("probe_rate", "gauge", f"Probes per second over the last {RATE_WINDOW:.0f} seconds.",
+               [({}, snapshot["probes_per_sec"])])
+        metric("probes_in_flight", "gauge", "Probes sent and not yet answered or timed out.",
+               [({}, snapshot["in_flight"])])
+        if snapshot["eta_seconds"] is not None:
+            metric("eta_seconds", "gauge", "Estimated time left in the running phase.",
+                   [({"phase": snapshot["phase"]}, snapshot["eta_seconds"])])
+        metric("probe_outcomes_total", "counter", "Probe attempts by outcome (filtered = timed out).",
+               [({"outcome": outcome}, count) for outcome, count in snapshot["outcomes"].items()])
+        metric("resource_retries_total", "counter",
+               "Probes retried because file descriptors or ephemeral ports ran out.",
+               [({}, snapshot["resource_retries"])])
+
+        latency = snapshot["connect_latency"]
+        lines.append("# HELP astra_connect_latency_seconds Connect latency of answered probes.")
+        lines.append("# TYPE astra_connect_latency_seconds histogram")
+        cumulative = 0
+        for bound, count in latency["buckets"].items():
+            cumulative += count
+            lines.append(f'astra_connect_latency_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'astra_connect_latency_seconds_bucket{{le="+Inf"}} {latency["count"]}')
+        lines.append(f"astra_connect_latency_seconds_sum {latency['sum']}")
+        lines.append(f"astra_connect_latency_seconds_count {latency['count']}")
+        return "\n".join(lines) + "\n"
+
+class StatsWriter:
+    """Rewrite a JSON stats file from ScanMetrics every `interval` seconds, and once more on close."""
+
+    def __init__(self, metrics: ScanMetrics, path: str, interval: float = DEFAULT_STATS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="astra-stats", daemon=True)
+        self._thread.start()
+
+    def _loop(self, interval: float):
+        while not self._closed.wait(interval):
+            self.write()
+
+    def write(self):
+        # Written to a temporary file and renamed, so readers never see a partial file
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(self.metrics.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Could not write stats to {self.path}: {e}")
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join()
+        self.write()
+
+class MetricsServer:
+    """Serve ScanMetrics over HTTP: /metrics in Prometheus text format, /stats as JSON."""
+
+    def __init__(self, metrics: ScanMetrics, port: int, host: str = "127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body, content_type = metrics.prometheus(), "text/plain; version=0.0.4"
+                elif path in ("/", "/stats"):
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logging.debug(f"Metrics request: {format % args}")
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port: int = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="astra-metrics", daemon=True)
+        self._thread.start()
+        logging.info(f"Serving metrics on http://{host}:{self.port}/metrics")
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
@@ -1,101 +1,581 @@
+import bisect
+import contextlib
 import socket
 import logging
-from typing import List, Tuple
-from ipaddress import ip_network
+import itertools
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+from ipaddress import ip_address
 import concurrent.futures
+from .checkpoint import ScanPlan
+from .discovery import Discovery
+from .metrics import ScanMetrics, format_eta
+from .permutation import Permutation
+from .report import ResultSink
+from .results import ScanResults
+from .targets import TargetSet
+from .ratelimit import RateLimiter
+from . import sockets
+from .timing import TimeoutPolicy
 
-def extract_ips(cidr_ranges: List[str], max_ips: int = None, max_ips_per_cidr: int = None) -> List[str]:
-    """Extract IPs from CIDR ranges, applying global and per-CIDR limits."""
-    all_ips = []
-    for cidr in cidr_ranges:
-        try:
-            network = ip_network(cidr, strict=False)
-            total_ips_in_cidr = network.num_addresses
-            logging.debug(f"Processing CIDR {cidr} with {total_ips_in_cidr} total IPs")
+# CIDR ranges/IPs as strings, or an already built TargetSet
+Targets = Union[List[str], TargetSet]
 
-            # Convert CIDR to list of IPs
-            ip_list = [str(ip) for ip in network]
+def _plan_ranges(cidr_ranges: Targets, max_ips: int = None, max_ips_per_cidr: int = None,
+                 log: bool = True) -> Iterator[Tuple[int, int, int]]:
+    """Yield (first address as int, address count, IP version) per target range after applying limits.
 
-            # Apply per-CIDR limit if specified
-            if max_ips_per_cidr is not None and len(ip_list) > max_ips_per_cidr:
-                logging.info(f"Limiting {cidr} to {max_ips_per_cidr} IPs (out of {total_ips_in_cidr})")
-                ip_list = ip_list[:max_ips_per_cidr]
-            else:
-                logging.debug(f"Using all {len(ip_list)} IPs from {cidr}")
+    Overlapping ranges are merged (see TargetSet). Works purely on integers,
+    so no per-address objects are allocated however large the CIDR is.
+    """
+    if not isinstance(cidr_ranges, TargetSet):
+        cidr_ranges = TargetSet(cidr_ranges, max_ips_per_cidr=max_ips_per_cidr, log=log)
+    elif max_ips_per_cidr is not None:
+        raise ValueError("set max_ips_per_cidr when building the TargetSet")
+    remaining = max_ips
+    for first, count, version in cidr_ranges.ranges():
+        if remaining is not None and remaining <= 0:
+            if log:
+                logging.info(f"Reached global max-ips limit of {max_ips}, skipping remaining CIDR ranges")
+            return
+
+        # Apply global max_ips limit if specified
+        if remaining is not None:
+            if count > remaining and log:
+                logging.info(f"Reached global max-ips limit of {max_ips}, truncating the range at "
+                             f"{_int_to_ip(first, version)} to {remaining} IPs")
+            count = min(count, remaining)
+            remaining -= count
+
+        yield first, count, version
+
+def _int_to_ip(value: int, version: int) -> str:
+    if version == 4:
+        return socket.inet_ntoa(value.to_bytes(4, "big"))
+    return str(ip_address(value))
+
+def iter_ips(cidr_ranges: Targets, max_ips: int = None, max_ips_per_cidr: int = None, seed: int = None,
+             shard: Tuple[int, int] = (0, 1)) -> Iterator[str]:
+    """Lazily yield IPs from CIDR ranges or a TargetSet, applying global and per-CIDR limits.
+
+    Only addresses that are actually yielded are converted to strings. With
+    a `seed`, the IPs of all ranges are yielded in one pseudo-random order
+    (see Permutation) instead of range by range. `shard` = (index, count)
+    keeps every count-th IP of that order starting at position index, so
+    shards with the same seed are disjoint and together cover every IP.
+    """
+    if seed is None and shard == (0, 1):
+        for first, count, version in _plan_ranges(cidr_ranges, max_ips, max_ips_per_cidr):
+            for value in range(first, first + count):
+                yield _int_to_ip(value, version)
+        return
 
-            all_ips.extend(ip_list)
+    ranges = list(_plan_ranges(cidr_ranges, max_ips, max_ips_per_cidr))
+    starts = list(itertools.accumulate((count for _, count, _ in ranges), initial=0))
+    total = starts.pop()
+    positions = range(shard[0], total, shard[1])
+    if seed is not None:
+        order = Permutation(total, seed)
+        positions = (order[position] for position in positions)
+    for position in positions:
+        i = bisect.bisect_right(starts, position) - 1
+        first, _, version = ranges[i]
+        yield _int_to_ip(first + position - starts[i], version)
 
-            # Apply global max_ips limit if specified
-            if max_ips is not None and len(all_ips) > max_ips:
-                logging.info(f"Reached global max-ips limit of {max_ips}, truncating IP list")
-                all_ips = all_ips[:max_ips]
-                break
+def count_ips(cidr_ranges: Targets, max_ips: int = None, max_ips_per_cidr: int = None,
+              shard: Tuple[int, int] = (0, 1)) -> int:
+    """Count the IPs iter_ips() would yield without generating them."""
+    total = sum(count for _, count, _ in _plan_ranges(cidr_ranges, max_ips, max_ips_per_cidr, log=False))
+    return len(range(shard[0], total, shard[1]))
 
-        except ValueError as e:
-            logging.error(f"Invalid CIDR range {cidr}: {e}")
+def filter_shard(ips: Iterable[str], cidr_ranges: Targets, max_ips: int = None, max_ips_per_cidr: int = None,
+                 seed: int = None, shard: Tuple[int, int] = (0, 1)) -> List[str]:
+    """Keep the IPs that iter_ips() with the same arguments yields, without generating its IPs."""
+    ranges = []
+    start = 0
+    for first, count, version in _plan_ranges(cidr_ranges, max_ips, max_ips_per_cidr, log=False):
+        ranges.append(((version, first), count, start))
+        start += count
+    ranges.sort()
+    order = Permutation(start, seed) if seed is not None else None
+    kept = []
+    for ip in ips:
+        address = ip_address(ip)
+        i = bisect.bisect_right(ranges, ((address.version, int(address)), float("inf"))) - 1
+        if i < 0:
+            continue
+        (version, first), count, range_start = ranges[i]
+        if version != address.version or int(address) >= first + count:
+            continue
+        position = range_start + int(address) - first
+        if order is not None:
+            position = order.index(position)
+        if position % shard[1] == shard[0]:
+            kept.append(ip)
+    return kept
 
-    return all_ips
+def extract_ips(cidr_ranges: Targets, max_ips: int = None, max_ips_per_cidr: int = None) -> List[str]:
+    """Extract IPs from CIDR ranges, applying global and per-CIDR limits."""
+    return list(iter_ips(cidr_ranges, max_ips, max_ips_per_cidr))
+
+def address_family(ip: str) -> int:
+    """Return the socket address family for an IPv4 or IPv6 address string."""
+    return socket.AF_INET6 if ":" in ip else socket.AF_INET
 
-def is_host_alive(ip: str, timeout: float) -> bool:
+def is_host_alive(ip: str, timeout: float, metrics: ScanMetrics = None) -> bool:
     """Check if a host is alive by attempting a TCP connection."""
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((ip, 80))  # Try port 80 as a common port
-        sock.close()
-        return True
-    except (socket.timeout, socket.error):
+        return sockets.retry(lambda: _connect(ip, 80, timeout), metrics) == OPEN  # Try port 80 as a common port
+    except OSError:
         return False
 
-def scan_port(ip: str, port: int, timeout: float) -> bool:
+def scan_port(ip: str, port: int, timeout: float, metrics: ScanMetrics = None) -> bool:
     """Scan a specific port on an IP to check if it's open."""
+    def attempt() -> bool:
+        sock = sockets.probe_socket(address_family(ip))
+        try:
+            sock.settimeout(timeout)
+            result = sock.connect_ex((ip, port))
+        finally:
+            sock.close()
+        sockets.check_resources(result)
+        return result == 0
+
+    try:
+        return sockets.retry(attempt, metrics)
+    except OSError:
+        return False
+
+OPEN = "open"
+CLOSED = "closed"
+FILTERED = "filtered"
+ERROR = "error"
+
+def _connect(ip: str, port: int, timeout: float) -> str:
+    """Make one connect attempt and return its state; raises OSError if a local resource ran out."""
+    sock = sockets.probe_socket(address_family(ip))
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(timeout)
-        result = sock.connect_ex((ip, port))
+        sock.connect((ip, port))
+        return OPEN
+    except socket.timeout:
+        return FILTERED
+    except ConnectionRefusedError:
+        return CLOSED
+    except OSError as e:
+        if e.errno in sockets.RESOURCE_ERRORS:
+            raise
+        return ERROR
+    finally:
         sock.close()
-        return result == 0
-    except socket.error:
+
+def probe_port(ip: str, port: int, timeout: float, limiter: RateLimiter = None,
+               metrics: ScanMetrics = None) -> Tuple[str, float]:
+    """Connect to a port and return (state, seconds taken).
+
+    The state is OPEN (connected), CLOSED (refused with an RST), FILTERED
+    (no answer within the timeout) or ERROR (any other socket error). Running
+    out of file descriptors or ephemeral ports is retried (see
+    sockets.retry()) and gives ERROR only if it persists. With a `limiter`,
+    the probe waits for a token first and reports its outcome back. With
+    `metrics`, it is counted as in flight until it finishes.
+    """
+    if limiter is not None:
+        limiter.acquire()
+    if metrics is not None:
+        metrics.probe_started()
+    start = time.monotonic()
+
+    def attempt() -> str:
+        nonlocal start
+        # Time only the attempt that got an answer, not the back-off before it
+        start = time.monotonic()
+        return _connect(ip, port, timeout)
+
+    try:
+        state = sockets.retry(attempt, metrics)
+    except OSError:
+        state = ERROR
+    elapsed = time.monotonic() - start
+    if limiter is not None:
+        limiter.release(state in (FILTERED, ERROR))
+    if metrics is not None:
+        metrics.probe_finished(state, elapsed)
+    return state, elapsed
+
+def race_host(ip: str, timeout: float, discovery: Discovery, limiter: RateLimiter = None,
+              metrics: ScanMetrics = None) -> Tuple[bool, float]:
+    """Race the probes of `discovery` for a host and return (is up, seconds until the verdict).
+
+    Each raced probe takes a limiter token; `metrics` counts the race as one probe.
+    """
+    if discovery.skip:
+        return True, 0.0
+    probes = discovery.probe_count(ip)
+    if limiter is not None:
+        for _ in range(probes):
+            limiter.acquire()
+    if metrics is not None:
+        metrics.probe_started()
+    alive, elapsed = discovery.probe(ip, timeout, metrics)
+    if limiter is not None:
+        for _ in range(probes):
+            limiter.release(not alive)
+    if metrics is not None:
+        metrics.probe_finished(OPEN if alive else FILTERED, elapsed if alive else None)
+    return alive, elapsed
+
+def check_host(ip: str, timeout: float, policy: TimeoutPolicy = None, limiter: RateLimiter = None,
+               metrics: ScanMetrics = None, discovery: Discovery = None) -> bool:
+    """Check if a host is alive, feeding the probe's round-trip time to `policy` if given.
+
+    Races the probes of `discovery` if given; otherwise only tries to connect to port 80.
+    """
+    if discovery is not None:
+        alive, rtt = race_host(ip, timeout, discovery, limiter, metrics)
+        if policy is not None and alive and not discovery.skip:
+            policy.observe(ip, rtt)
+        return alive
+    if policy is None and limiter is None and metrics is None:
+        return is_host_alive(ip, timeout)
+    state, rtt = probe_port(ip, 80, timeout, limiter, metrics)
+    if policy is not None and state in (OPEN, CLOSED):
+        policy.observe(ip, rtt)
+    return state == OPEN
+
+def check_port(ip: str, port: int, timeout: float, policy: TimeoutPolicy = None, limiter: RateLimiter = None,
+               metrics: ScanMetrics = None) -> bool:
+    """Check if a port is open, using the per-host timeouts and retries of `policy` if given."""
+    if policy is None and limiter is None and metrics is None:
+        return scan_port(ip, port, timeout)
+    retries = policy.retries if policy is not None else 0
+    for attempt in range(retries + 1):
+        attempt_timeout = policy.timeout_for(ip, attempt) if policy is not None else timeout
+        state, rtt = probe_port(ip, port, attempt_timeout, limiter, metrics)
+        if state != FILTERED:
+            if policy is not None and state in (OPEN, CLOSED):
+                policy.observe(ip, rtt)
+            return state == OPEN
+        if policy is not None:
+            policy.record_timeout(attempt_timeout, retrying=attempt < retries)
+    return False
+
+def _bounded_map(executor: concurrent.futures.Executor, fn: Callable, tasks: Iterable[Tuple],
+                 window: int) -> Iterator[Tuple[Tuple, object]]:
+    """Run fn(*task) for each task on the executor, yielding (task, result) as they complete.
+
+    At most `window` tasks are submitted at a time, so `tasks` can be a lazy
+    iterator of any length without every future being created up front.
+    """
+    task_iter = iter(tasks)
+    pending = {executor.submit(fn, *task): task for task in itertools.islice(task_iter, window)}
+    try:
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+            for task in itertools.islice(task_iter, len(done)):
+                pending[executor.submit(fn, *task)] = task
+    finally:
+        # Closed early: drop the tasks that have not started
+        for future in pending:
+            future.cancel()
+
+class StageProgress:
+    """Per-stage probe counters, logged at most every `interval` seconds and mirrored to `metrics` if given.
+
+    With `total` (the probes the stage will make, if known), progress lines
+    include an ETA at the stage's average rate.
+    """
+
+    def __init__(self, stage: str, unit: str, interval: float = 10.0, limiter: RateLimiter = None,
+                 metrics: ScanMetrics = None, total: int = None):
+        self.stage = stage
+        self.unit = unit
+        self.limiter = limiter
+        self.metrics = metrics
+        self.total = total
+        self.interval = interval
+        self.probed = 0
+        self.hits = 0
+        self.started = time.monotonic()
+        self._last_log = self.started
+        if metrics is not None:
+            metrics.start_phase(stage, total)
+
+    def expect_more(self, count: int):
+        """Add `count` probes to the stage's total, e.g. the ports of a host found by pipelined discovery."""
+        self.total = (self.total or 0) + count
+        if self.metrics is not None:
+            self.metrics.expect_more(self.stage, count)
+
+    def advance(self, hit: bool, backlog: int = None):
+        self.probed += 1
+        if hit:
+            self.hits += 1
+        if self.metrics is not None:
+            self.metrics.phase_advance(self.stage, hit)
+        now = time.monotonic()
+        if now - self._last_log >= self.interval:
+            self._last_log = now
+            self.log(backlog)
+
+    def log(self, backlog: int = None, final: bool = False):
+        elapsed = time.monotonic() - self.started
+        rate = self.probed / elapsed if elapsed > 0 else 0.0
+        message = f"{self.stage}: {self.probed} probed, {self.hits} {self.unit} ({rate:.0f} probes/sec)"
+        if backlog is not None:
+            message += f", {backlog} hosts queued"
+        if self.limiter is not None:
+            message += f", {self.limiter.status()}"
+        if final:
+            message += f", finished in {elapsed:.1f}s"
+            if self.metrics is not None:
+                self.metrics.end_phase(self.stage)
+        elif self.total and rate > 0:
+            message += f", ETA {format_eta(max(0, self.total - self.probed) / rate)}"
+        logging.info(message)
+
+MAX_RATE_WORKERS = 500
+
+def _thread_pool(executor: concurrent.futures.Executor, max_workers: int):
+    """Use the caller's `executor` (left running) if given, else a new pool of `max_workers` threads for this stage."""
+    if executor is not None:
+        return contextlib.nullcontext(executor)
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+def _workers_for_rate(workers: int, timeout: float, limiter: RateLimiter) -> int:
+    """Grow a thread pool so it can sustain the limiter's rate when every probe waits out `timeout`."""
+    if limiter is None:
+        return workers
+    return max(workers, min(MAX_RATE_WORKERS, int(limiter.rate * timeout) + 1))
+
+def _scan_pipelined(ips: Iterable[str], ports: List[int], timeout: float, sink: ResultSink, queue_size: int,
+                    policy: TimeoutPolicy, limiter: RateLimiter, plan: ScanPlan,
+                    metrics: ScanMetrics, executor: concurrent.futures.Executor,
+                    discovery: Discovery) -> ScanResults:
+    """Port-scan each host as soon as discovery confirms it, instead of after all discovery.
+
+    Discovery runs on its own thread and hands live hosts to the port stage
+    through a queue of at most `queue_size` hosts; when the port stage falls
+    behind, discovery blocks rather than buffering without limit. If the
+    port stage stops early (e.g. the sink raised), discovery is stopped and
+    joined before the error propagates; an error in discovery is raised here.
+    """
+    results = ScanResults()
+    host_queue = queue.Queue(maxsize=queue_size)
+    end_of_hosts = object()
+    stop = threading.Event()
+    discovery_errors = []
+
+    def hand_over(item) -> bool:
+        while not stop.is_set():
+            try:
+                host_queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
         return False
 
-def scan_network(ips: List[str], ports: List[int], timeout: float) -> Tuple[List[str], List[Tuple[str, int]]]:
-    """Scan a list of IPs for live hosts and open ports."""
-    live_hosts = []
-    open_ports = []
+    discovery_stage = StageProgress("Discovery", "live", limiter=limiter, metrics=metrics)
+    port_stage = StageProgress("Port scan", "open", limiter=limiter, metrics=metrics)
+
+    def discover():
+        try:
+            workers = _workers_for_rate(50, timeout, limiter)
+            with _thread_pool(executor, workers) as pool:
+                tasks = ((ip, timeout, policy, limiter, metrics, discovery) for ip in ips)
+                with contextlib.closing(_bounded_map(pool, check_host, tasks, workers * 4)) as checked:
+                    for (ip, *_), alive in checked:
+                        plan.host_done(ip, alive)
+                        discovery_stage.advance(alive)
+                        if alive:
+                            results.add_live_host(ip)
+                            sink.add_live_host(ip)
+                            if not hand_over(ip):
+                                return
+        except BaseException as e:
+            discovery_errors.append(e)
+        finally:
+            discovery_stage.log(final=True)
+            hand_over(end_of_hosts)
+
+    logging.info(f"Scanning IPs for live hosts and {len(ports)} ports per live host (pipelined)")
+    discovery_thread = threading.Thread(target=discover, name="astra-discovery", daemon=True)
+    discovery_thread.start()
+
+    max_workers = _workers_for_rate(100, timeout, limiter)
+    window = max_workers * 4
+    host_tasks = iter(())
+    discovery_done = False
+    pending = {}
+    try:
+        with _thread_pool(executor, max_workers) as pool:
+            while True:
+                # Top up the window; only block waiting for a host when nothing is in flight
+                while len(pending) < window:
+                    task = next(host_tasks, None)
+                    if task is not None:
+                        pending[pool.submit(check_port, task[0], task[1], timeout, policy, limiter, metrics)] = task
+                        continue
+                    if discovery_done:
+                        break
+                    try:
+                        ip = host_queue.get(block=not pending)
+                    except queue.Empty:
+                        break
+                    if ip is end_of_hosts:
+                        discovery_done = True
+                        break
+                    host_ports = plan.host_ports(ip)
+                    port_stage.expect_more(len(host_ports))
+                    # zip binds this host now; a generator expression would see `ip` reassigned below
+                    host_tasks = zip(itertools.repeat(ip), host_ports)
+
+                if not pending:
+                    break
+
+                # Wake up periodically so newly discovered hosts join the window promptly
+                done, _ = concurrent.futures.wait(pending, timeout=None if discovery_done else 0.05,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    ip, port = pending.pop(future)
+                    is_open = future.result()
+                    plan.port_done(ip, port, is_open)
+                    if is_open:
+                        results.add_open_port(ip, port)
+                        sink.add_open_port(ip, port)
+                    port_stage.advance(is_open, host_queue.qsize())
+    finally:
+        stop.set()
+        for future in pending:
+            future.cancel()
+        discovery_thread.join()
+    if discovery_errors:
+        raise discovery_errors[0]
+    port_stage.log(final=True)
+    return results
+
+def scan_network(ips: Iterable[str], ports: List[int], timeout: float, engine: str = "thread",
+                 concurrency: int = None, sink: ResultSink = None, pipeline: bool = False,
+                 queue_size: int = 1000, policy: TimeoutPolicy = None, limiter: RateLimiter = None,
+                 plan: ScanPlan = None, metrics: ScanMetrics = None,
+                 executor: concurrent.futures.Executor = None, discovery: Discovery = None) -> ScanResults:
+    """Scan a list of IPs for live hosts and open ports.
+
+    `engine` selects the probe engine: "thread" (blocking sockets on thread
+    pools), "async" (non-blocking connects on an event loop, capped at
+    `concurrency` probes in flight) or "syn" (raw-socket half-open probes,
+    at most `concurrency` outstanding). All return a ScanResults, which
+    unpacks into (live_hosts, open_ports) lists. Each result is also passed
+    to `sink` as soon as it is found.
+
+    With `pipeline`, hosts are port-scanned as soon as discovery confirms
+    them, with at most `queue_size` live hosts waiting between the stages.
+    With a `policy`, the connect engines take per-host timeouts and retries
+    from it instead of using `timeout` for every probe. With a `limiter`,
+    every probe (retries included) is paced by its global rate limit.
+    A `plan` chooses the order of targets and of each host's ports, may skip
+    work already done, and is told about every finished probe. `metrics`
+    collects per-stage progress, probe outcomes and connect latencies.
+    The thread engine runs its probes on `executor` if given (e.g. a pool
+    kept warm across scans) instead of starting thread pools for each stage.
+    Host discovery races the probes of `discovery` if given (see
+    discovery.Discovery); otherwise a host is live if port 80 accepts a
+    connection.
+
+    The connect engines raise the open-file limit as far as allowed, and the
+    async engine keeps `concurrency` within the sockets available (see
+    sockets.socket_budget()), less those held by other scans running in
+    this process (see sockets.ScanResources). Probes that still run out of
+    descriptors or ephemeral ports are retried, and a summary is logged if
+    any did.
+    """
+    sink = sink or ResultSink()
+    plan = plan or ScanPlan(ports)
+    ips = plan.targets(ips)
+    resources = sockets.ScanResources()
+    try:
+        if engine == "async":
+            from .async_engine import DEFAULT_CONCURRENCY, scan_network_async
+            # A discovery race holds a socket per probe at once
+            sockets_per_probe = 1
+            if discovery is not None and not discovery.skip:
+                sockets_per_probe = max(1, len(discovery.ports) + discovery.icmp + bool(discovery.on_link))
+            concurrency = resources.fit(concurrency or DEFAULT_CONCURRENCY, sockets_per_probe)
+            results = scan_network_async(ips, ports, timeout, concurrency, sink, pipeline,
+                                         queue_size, policy, limiter, plan, metrics, discovery)
+        elif engine == "syn":
+            from .syn import DEFAULT_WINDOW, scan_network_syn
+            if pipeline:
+                logging.warning("Pipelined mode is not supported by the SYN engine; scanning in phases")
+            if policy is not None:
+                logging.warning("Adaptive timeouts and retries are not supported by the SYN engine; using the fixed timeout")
+                policy = None
+            results = scan_network_syn(ips, ports, timeout, concurrency or DEFAULT_WINDOW, sink, limiter, plan, metrics,
+                                       discovery)
+        elif engine == "thread":
+            sockets.raise_fd_limit()
+            if pipeline:
+                results = _scan_pipelined(ips, ports, timeout, sink, queue_size, policy, limiter, plan, metrics, executor,
+                                          discovery)
+            else:
+                results = _scan_phased(ips, ports, timeout, sink, policy, limiter, plan, metrics, executor, discovery)
+        else:
+            raise ValueError(f"Unknown scan engine: {engine}")
+    finally:
+        resources.close()
+
+    if policy is not None:
+        policy.log_summary()
+    if limiter is not None:
+        logging.info(f"Rate limit: finished at {limiter.rate:.0f} probes/sec"
+                     + (f" after {limiter.controller.backoffs} back-offs" if limiter.controller else ""))
+    return results
+
+def _scan_phased(ips: Iterable[str], ports: List[int], timeout: float, sink: ResultSink, policy: TimeoutPolicy,
+                 limiter: RateLimiter, plan: ScanPlan, metrics: ScanMetrics,
+                 executor: concurrent.futures.Executor, discovery: Discovery) -> ScanResults:
+    """Find all live hosts first, then scan their ports."""
+    results = ScanResults()
 
     # Step 1: Find live hosts
-    logging.info(f"Scanning {len(ips)} IPs for live hosts")
-    with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-        future_to_ip = {executor.submit(is_host_alive, ip, timeout): ip for ip in ips}
-        for future in concurrent.futures.as_completed(future_to_ip):
-            ip = future_to_ip[future]
-            if future.result():
-                live_hosts.append(ip)
-
-    if not live_hosts:
+    logging.info("Scanning IPs for live hosts")
+    discovery_stage = StageProgress("Discovery", "live", limiter=limiter, metrics=metrics)
+    max_workers = _workers_for_rate(50, timeout, limiter)
+    with _thread_pool(executor, max_workers) as pool:
+        tasks = ((ip, timeout, policy, limiter, metrics, discovery) for ip in ips)
+        for (ip, *_), alive in _bounded_map(pool, check_host, tasks, max_workers * 4):
+            plan.host_done(ip, alive)
+            discovery_stage.advance(alive)
+            if alive:
+                results.add_live_host(ip)
+                sink.add_live_host(ip)
+    discovery_stage.log(final=True)
+
+    if not results.live_host_count:
         logging.info("No live hosts found")
-        return [], []
+        return results
 
     # Step 2: Scan ports on live hosts
-    total_ports = len(ports) * len(live_hosts)
-    logging.info(f"Scanning {len(ports)} ports on {len(live_hosts)} live hosts ({total_ports} total scans)")
-    
+    live_host_count = results.live_host_count
+    total_ports = len(ports) * live_host_count
+    logging.info(f"Scanning {len(ports)} ports on {live_host_count} live hosts ({total_ports} total scans)")
+    port_stage = StageProgress("Port scan", "open", limiter=limiter, metrics=metrics, total=total_ports)
+
     # Optimize for large port ranges
-    max_workers = min(100, len(live_hosts) * len(ports) // 10 + 1)  # Scale workers based on workload
-    scanned = 0
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_task = {}
-        for ip in live_hosts:
-            for port in ports:
-                future = executor.submit(scan_port, ip, port, timeout)
-                future_to_task[future] = (ip, port)
-        
-        for future in concurrent.futures.as_completed(future_to_task):
-            ip, port = future_to_task[future]
-            if future.result():
-                open_ports.append((ip, port))
-            scanned += 1
-            if scanned % 1000 == 0:  # Log progress every 1000 scans
-                logging.debug(f"Scanned {scanned}/{total_ports} ports")
-
-    return live_hosts, open_ports
\ No newline at end of file
+    max_workers = min(100, live_host_count * len(ports) // 10 + 1)  # Scale workers based on workload
+    max_workers = _workers_for_rate(max_workers, timeout, limiter)
+    with _thread_pool(executor, max_workers) as pool:
+        tasks = ((ip, port, timeout, policy, limiter, metrics) for ip, port in plan.port_tasks(results))
+        for (ip, port, *_), is_open in _bounded_map(pool, check_port, tasks, max_workers * 4):
+            plan.port_done(ip, port, is_open)
+            if is_open:
+                results.add_open_port(ip, port)
+                sink.add_open_port(ip, port)
+            port_stage.advance(is_open)
+    port_stage.log(final=True)
+
+    return results
@@ -0,0 +1,148 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import traceback
+from typing import List, Tuple
+from .metrics import ScanMetrics
+from .network import Targets, iter_ips, scan_network
+from .report import ResultSink
+from .results import ScanResults
+
+# Seconds between worker metrics updates sent to the parent
+METRICS_INTERVAL = 1.0
+
+class WorkerFailed(RuntimeError):
+    """Raised in the parent when a worker process failed, so its share of the targets went unscanned."""
+
+class QueueSink(ResultSink):
+    """Forward results from a worker process to the parent over a multiprocessing queue."""
+
+    def __init__(self, result_queue: multiprocessing.Queue):
+        self.result_queue = result_queue
+
+    def add_live_host(self, ip: str):
+        self.result_queue.put(("host", ip))
+
+    def add_open_port(self, ip: str, port: int):
+        self.result_queue.put(("port", ip, port))
+
+def _report_metrics(index: int, metrics: ScanMetrics, result_queue: multiprocessing.Queue, stop: threading.Event):
+    while not stop.wait(METRICS_INTERVAL):
+        result_queue.put(("metrics", index, metrics.state()))
+
+def _worker(index: int, processes: int, cidr_ranges: Targets, max_ips: int, max_ips_per_cidr: int,
+            seed: int, shard: Tuple[int, int], ports: List[int], timeout: float, scan_kwargs: dict,
+            with_metrics: bool, result_queue: multiprocessing.Queue):
+    """Scan every `processes`-th target of the shard starting at `index` and stream results to the parent.
+
+    Ends with a ("done", index) message, or ("error", index, traceback) if the scan raised.
+    """
+    metrics = ScanMetrics() if with_metrics else None
+    if metrics is not None:
+        stop_reporting = threading.Event()
+        reporter = threading.Thread(target=_report_metrics, args=(index, metrics, result_queue, stop_reporting),
+                                    daemon=True)
+        reporter.start()
+    error = None
+    try:
+        # Each worker's stripe of the shard is itself a shard of the whole target sequence,
+        # so no target list has to be built or pickled in the parent.
+        worker_shard = (shard[0] + index * shard[1], shard[1] * processes)
+        targets = iter_ips(cidr_ranges, max_ips, max_ips_per_cidr, seed, worker_shard)
+        plan = scan_kwargs.get("plan")
+        if plan is not None:
+            # Progress records go to the parent, which owns the checkpoint log
+            plan = scan_kwargs["plan"] = plan.stripe(index, processes)
+            plan.write = lambda record: result_queue.put(("checkpoint", record))
+        scan_network(targets, ports, timeout, sink=QueueSink(result_queue), metrics=metrics, **scan_kwargs)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        if metrics is not None:
+            stop_reporting.set()
+            reporter.join()
+            result_queue.put(("metrics", index, metrics.state()))
+    result_queue.put(("done", index) if error is None else ("error", index, error))
+
+def scan_network_multiprocess(cidr_ranges: Targets, ports: List[int], timeout: float, processes: int,
+                              max_ips: int = None, max_ips_per_cidr: int = None, sink: ResultSink = None,
+                              seed: int = None, shard: Tuple[int, int] = (0, 1), **scan_kwargs) -> ScanResults:
+    """Split the targets of cidr_ranges across `processes` worker processes and merge their results.
+
+    Each worker runs its own scan_network() loop (with `scan_kwargs` such as
+    engine, concurrency and pipeline) over an interleaved slice of the
+    targets, taken in `seed` order and limited to `shard` as in iter_ips().
+    Results are streamed back as they are found and passed to `sink` in the
+    parent, then returned together as ScanResults. A `metrics` keyword
+    collects the workers' counters, which they send about once a second.
+
+    If a worker fails (its scan raises, or the process dies), the others
+    still run to the end, and WorkerFailed is raised once they have: the
+    results would be missing that worker's targets.
+    """
+    sink = sink or ResultSink()
+    plan = scan_kwargs.get("plan")
+    metrics = scan_kwargs.pop("metrics", None)
+    if scan_kwargs.get("limiter") is not None:
+        # Each worker enforces an equal share of the global rate
+        scan_kwargs["limiter"] = scan_kwargs["limiter"].split(processes)
+    results = ScanResults()
+    result_queue = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(i, processes, cidr_ranges, max_ips, max_ips_per_cidr, seed, shard, ports, timeout, scan_kwargs,
+                  metrics is not None, result_queue),
+            name=f"astra-scan-{i}",
+            daemon=True,
+        )
+        for i in range(processes)
+    ]
+    logging.info(f"Scanning with {processes} worker processes")
+    for worker in workers:
+        worker.start()
+
+    running = set(range(processes))
+    failed = []
+    try:
+        while running:
+            try:
+                message = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                # A worker killed outright never sends "done"
+                for i in list(running):
+                    if not workers[i].is_alive() and workers[i].exitcode:
+                        logging.error(f"Worker {i} exited with code {workers[i].exitcode}")
+                        running.discard(i)
+                        failed.append(i)
+                continue
+            kind = message[0]
+            if kind == "host":
+                results.add_live_host(message[1])
+                sink.add_live_host(message[1])
+            elif kind == "port":
+                results.add_open_port(message[1], message[2])
+                sink.add_open_port(message[1], message[2])
+            elif kind == "checkpoint":
+                plan.write(message[1])
+            elif kind == "metrics":
+                metrics.merge_worker(message[1], message[2])
+            elif kind == "done":
+                running.discard(message[1])
+            elif kind == "error":
+                logging.error(f"Worker {message[1]} failed:\n{message[2]}")
+                running.discard(message[1])
+                failed.append(message[1])
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+    if failed:
+        raise WorkerFailed(f"{len(failed)} of {processes} worker processes failed; their targets were not "
+                           f"fully scanned")
+    if not results.live_host_count:
+        logging.info("No live hosts found")
+    return results
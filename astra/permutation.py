@@ -0,0 +1,78 @@
+from typing import Iterator, Tuple
+
+_MASK64 = (1 << 64) - 1
+
+def _mix(value: int) -> int:
+    """splitmix64 finalizer: a fast, well-distributed 64-bit hash."""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & _MASK64
+    return value ^ (value >> 31)
+
+class Permutation:
+    """A seeded pseudo-random ordering of range(size) that stores nothing per element.
+
+    Position i maps to a unique value through a balanced Feistel network
+    over the smallest even power of two >= size; values that land outside
+    range(size) are encrypted again ("cycle walking"), which takes fewer
+    than four rounds on average. The same (size, seed) always gives the
+    same order, so independent processes or machines agree on it.
+    """
+
+    ROUNDS = 4
+
+    def __init__(self, size: int, seed: int):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self._half = (bits + 1) // 2
+        self._mask = (1 << self._half) - 1
+        self._keys = [_mix((seed + i * 0x9E3779B97F4A7C15) & _MASK64) for i in range(self.ROUNDS)]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self._half, value & self._mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(right ^ key) & self._mask)
+        return left << self._half | right
+
+    def _decrypt(self, value: int) -> int:
+        left, right = value >> self._half, value & self._mask
+        for key in reversed(self._keys):
+            left, right = right ^ (_mix(left ^ key) & self._mask), left
+        return left << self._half | right
+
+    def __getitem__(self, index: int) -> int:
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def index(self, value: int) -> int:
+        """Return the position of `value` in the order (the inverse of indexing)."""
+        if not 0 <= value < self.size:
+            raise ValueError("value out of range")
+        position = self._decrypt(value)
+        while position >= self.size:
+            position = self._decrypt(position)
+        return position
+
+    def __iter__(self) -> Iterator[int]:
+        return self.shard(0, 1)
+
+    def shard(self, index: int, count: int) -> Iterator[int]:
+        """Yield every `count`-th value of the order, starting at position `index`."""
+        for position in range(index, self.size, count):
+            yield self[position]
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parse an "I/N" shard spec (1-based, as on the command line) into a 0-based (index, count)."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {text!r}; expected I/N, e.g. 1/4") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard {text!r}; I must be between 1 and N")
+    return index - 1, count
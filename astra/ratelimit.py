@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+DEFAULT_RATE = 1000.0
+DEFAULT_MIN_RATE = 10.0
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.burst = max(1.0, rate / 10)
+            self._tokens = min(self._tokens, self.burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            # A negative balance is a queue of reservations paid back by the refill
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        """Block until a token is available."""
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
+
+class AIMDController:
+    """Additive-increase/multiplicative-decrease control of a TokenBucket's rate.
+
+    Probe outcomes are judged in windows of `window` probes. If a window's
+    failure fraction (timeouts plus connect errors) exceeds the baseline by
+    more than `tolerance`, the rate is multiplied by `decrease`; otherwise it
+    grows by `increase` probes/sec. The baseline is a moving average of the
+    failure fraction of windows that did not trigger a back-off, so targets
+    that simply drop most probes (heavily filtered hosts) do not hold the
+    rate down by themselves; only a rise in failures does.
+    """
+
+    def __init__(self, bucket: TokenBucket, min_rate: float = DEFAULT_MIN_RATE, max_rate: float = None,
+                 increase: float = None, decrease: float = 0.5, window: int = 100, tolerance: float = 0.1):
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else bucket.rate * 10
+        self.increase = increase if increase is not None else max(1.0, bucket.rate * 0.05)
+        self.decrease = decrease
+        self.window = window
+        self.tolerance = tolerance
+        self.baseline = None
+        self.backoffs = 0
+        self._probes = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, failed: bool):
+        with self._lock:
+            self._probes += 1
+            if failed:
+                self._failures += 1
+            if self._probes < self.window:
+                return
+            fraction = self._failures / self._probes
+            self._probes = self._failures = 0
+            rate = self.bucket.rate
+            if self.baseline is not None and fraction > self.baseline + self.tolerance:
+                rate = max(self.min_rate, rate * self.decrease)
+                self.backoffs += 1
+            else:
+                self.baseline = fraction if self.baseline is None else 0.8 * self.baseline + 0.2 * fraction
+                rate = min(self.max_rate, rate + self.increase)
+            self.bucket.set_rate(rate)
+
+class RateLimiter:
+    """Global probes-per-second limit for a scan, optionally adjusted by AIMD, with an in-flight count.
+
+    Engines call acquire() (or acquire_async()) before sending a probe and
+    release() with whether it failed once the probe is resolved.
+    """
+
+    def __init__(self, rate: float, adaptive: bool = False, min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: float = None):
+        self.bucket = TokenBucket(rate)
+        self.controller = AIMDController(self.bucket, min_rate, max_rate) if adaptive else None
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks cannot be pickled; worker processes get their own
+        return {"rate": self.bucket.rate, "adaptive": self.controller is not None,
+                "min_rate": self.controller.min_rate if self.controller else DEFAULT_MIN_RATE,
+                "max_rate": self.controller.max_rate if self.controller else None}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def split(self, parts: int) -> "RateLimiter":
+        """Return a limiter for one of `parts` processes sharing this limit."""
+        controller = self.controller
+        return RateLimiter(self.rate / parts, controller is not None,
+                           controller.min_rate / parts if controller else DEFAULT_MIN_RATE,
+                           controller.max_rate / parts if controller else None)
+
+    def _started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def acquire(self):
+        self.bucket.acquire()
+        self._started()
+
+    async def acquire_async(self):
+        delay = self.bucket.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        self._started()
+
+    def release(self, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+        if self.controller is not None:
+            self.controller.record(failed)
+
+    def status(self) -> str:
+        return f"rate {self.rate:.0f}/s, {self.in_flight} in flight"
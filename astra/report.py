@@ -1,77 +1,259 @@
 import json
-import csv
 import logging
+import os
+import threading
 from datetime import datetime
-from typing import List, Set, Tuple
+from typing import Dict, List, Tuple
+
+class ResultSink:
+    """Receives scan results as they are found. The base class discards everything."""
+
+    def start(self, org: str, cidr_ranges: List[str], timestamp: str = None):
+        """Record scan metadata before any results arrive.
+
+        `timestamp` (ISO 8601) is when the scan ran; it defaults to now, and is
+        passed when results are rewritten from an earlier scan.
+        """
+
+    def add_live_host(self, ip: str):
+        """Record a host confirmed alive."""
+
+    def add_open_port(self, ip: str, port: int):
+        """Record an open port."""
+
+    def close(self):
+        """Flush and release any resources held by the sink."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class StreamSink(ResultSink):
+    """Buffered, line-oriented file sink with periodic flushing.
+
+    Lines are written as results arrive and flushed every `flush_interval`
+    seconds (or every `flush_every` lines), so an interrupted scan keeps
+    everything found up to the last flush.
+    """
+
+    def __init__(self, path: str, append: bool = False, flush_interval: float = 1.0, flush_every: int = 1000):
+        self.path = path
+        self.flush_every = flush_every
+        self._file = open(path, "a" if append else "w", newline="")
+        self._is_new = self._file.tell() == 0
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,), daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self, interval: float):
+        while not self._closed.wait(interval):
+            self.flush()
+
+    def _write(self, line: str):
+        with self._lock:
+            self._file.write(line)
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._file.flush()
+                self._unflushed = 0
+
+    def flush(self):
+        with self._lock:
+            if self._unflushed and not self._file.closed:
+                self._file.flush()
+                self._unflushed = 0
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._file.close()
+
+class NDJSONSink(StreamSink):
+    """Write one JSON record per line: a "scan" header, then "host" and "port" records."""
+
+    def _record(self, record: Dict):
+        self._write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def start(self, org: str, cidr_ranges: List[str], timestamp: str = None):
+        self._record({"type": "scan", "organization": org, "timestamp": timestamp or datetime.now().isoformat(),
+                      "cidr_ranges": cidr_ranges})
+
+    def add_live_host(self, ip: str):
+        self._record({"type": "host", "ip": ip})
+
+    def add_open_port(self, ip: str, port: int):
+        self._record({"type": "port", "ip": ip, "port": port})
+
+class CSVSink(StreamSink):
+    """Write one IP,Port row per open port."""
+
+    def start(self, org: str, cidr_ranges: List[str], timestamp: str = None):
+        if self._is_new:
+            self._write("IP,Port\n")
+
+    def add_open_port(self, ip: str, port: int):
+        self._write(f"{ip},{port}\n")
+
+class JSONSink(NDJSONSink):
+    """Stream results to an NDJSON journal and derive the JSON document from it on close.
+
+    The journal (`<path>.ndjson`) is removed once the document is written; if
+    the process dies before that, the journal still holds every flushed result
+    and load_results() can rebuild the document from it.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        self.output_file = path
+        super().__init__(path + ".ndjson", **kwargs)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        super().close()
+        with open(self.output_file, "w") as f:
+            json.dump(load_results(self.path), f, indent=2)
+        os.remove(self.path)
+
+def open_sink(output_file: str, output_format: str = "json", **kwargs) -> ResultSink:
+    """Create the sink for an output file and format (json, ndjson, csv, bin)."""
+    if output_format == "bin":
+        # Held in memory as packed arrays and written on close
+        from .results import BinarySink
+        return BinarySink(output_file)
+    if output_format == "json":
+        return JSONSink(output_file, **kwargs)
+    if output_format == "ndjson":
+        return NDJSONSink(output_file, **kwargs)
+    if output_format == "csv":
+        return CSVSink(output_file, **kwargs)
+    raise ValueError(f"Unknown output format: {output_format}")
+
+def load_results(path: str) -> Dict:
+    """Rebuild the JSON results document from an NDJSON result stream."""
+    results = {"organization": None, "timestamp": None, "cidr_ranges": [], "live_hosts": [], "open_ports": []}
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a partially written final line
+                logging.warning(f"Skipping malformed record in {path}")
+                continue
+            kind = record.get("type")
+            if kind == "scan":
+                results.update({k: record[k] for k in ("organization", "timestamp", "cidr_ranges")})
+            elif kind == "host":
+                results["live_hosts"].append(record["ip"])
+            elif kind == "port":
+                results["open_ports"].append({"ip": record["ip"], "port": record["port"]})
+    return results
+
+def read_results(path: str) -> Dict:
+    """Load results written in any output format except CSV, as the JSON results document."""
+    from .results import ScanResults, is_binary_results
+    if is_binary_results(path):
+        return ScanResults.load(path).to_document()
+    with open(path) as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError:
+            pass
+    return load_results(path)
+
+def _load_scan_results(path: str):
+    from .results import ScanResults, is_binary_results
+    if is_binary_results(path):
+        # Stream straight from the packed arrays rather than building the JSON document
+        return ScanResults.load(path)
+    return ScanResults.from_document(read_results(path))
+
+def _write_scan_results(results, output_file: str, output_format: str):
+    with open_sink(output_file, output_format) as sink:
+        # Keep when the scan ran, not when it was converted or merged
+        sink.start(results.organization, results.cidr_ranges, results.timestamp)
+        for ip in results.live_hosts():
+            sink.add_live_host(ip)
+        for ip, port in results.open_ports():
+            sink.add_open_port(ip, port)
+
+def convert_results(input_file: str, output_file: str, output_format: str):
+    """Convert a results file (binary, JSON or NDJSON) to another output format."""
+    _write_scan_results(_load_scan_results(input_file), output_file, output_format)
+    logging.info(f"Converted {input_file} to {output_format.upper()} at {output_file}")
+
+def merge_results(input_files: List[str], output_file: str, output_format: str):
+    """Merge results files (binary, JSON or NDJSON), e.g. from the shards of one scan, into one output file."""
+    from .results import ScanResults
+    results = ScanResults()
+    for path in input_files:
+        results = results.merge(_load_scan_results(path))
+    _write_scan_results(results, output_file, output_format)
+    logging.info(f"Merged {len(input_files)} results files ({results.live_host_count} live hosts, "
+                 f"{results.open_port_count} open ports) to {output_format.upper()} at {output_file}")
+
+def log_results(live_hosts: List[str], open_ports: List[Tuple[str, int]]):
+    """Log scan results to the console."""
+    logging.info(f"Found {len(live_hosts)} live hosts")
+    for host in live_hosts:
+        logging.info(f"  - {host}")
+    logging.info(f"Found {len(open_ports)} open ports")
+    for ip, port in open_ports:
+        logging.info(f"  - {ip}:{port}")
+
+def log_diff(opened: List[Tuple[str, int]], closed: List[Tuple[str, int]]):
+    """Log the ports that opened or closed since an earlier scan."""
+    logging.info(f"Since the previous scan: {len(opened)} ports opened, {len(closed)} closed")
+    for ip, port in opened:
+        logging.info(f"  + {ip}:{port}")
+    for ip, port in closed:
+        logging.info(f"  - {ip}:{port}")
+
+def save_diff(previous_file: str, opened: List[Tuple[str, int]], closed: List[Tuple[str, int]], output_file: str):
+    """Save the ports that opened or closed since an earlier scan as JSON."""
+    diff = {
+        "previous": previous_file,
+        "timestamp": datetime.now().isoformat(),
+        "opened": [{"ip": ip, "port": port} for ip, port in opened],
+        "closed": [{"ip": ip, "port": port} for ip, port in closed],
+    }
+    try:
+        with open(output_file, "w") as f:
+            json.dump(diff, f, indent=2)
+        logging.info(f"Changes saved to {output_file}")
+    except OSError as e:
+        logging.error(f"Error saving changes to {output_file}: {e}")
+
+def save_results(org: str, cidr_ranges: List[str], live_hosts: List[str], open_ports: List[Tuple[str, int]], output_file: str, output_format: str):
+    """Save scan results to a file in the specified format."""
+    try:
+        with open_sink(output_file, output_format) as sink:
+            sink.start(org, cidr_ranges)
+            for ip in live_hosts:
+                sink.add_live_host(ip)
+            for ip, port in open_ports:
+                sink.add_open_port(ip, port)
+        logging.info(f"Results saved as {output_format.upper()} to {output_file}")
+    except Exception as e:
+        logging.error(f"Error saving results to {output_file}: {e}")
 
 def report_results(
     org: str,
     cidrs: List[str],
-    live_hosts: Set[str],
+    live_hosts: List[str],
     open_ports: List[Tuple[str, int]],
     output_file: str = None,
     output_format: str = "json"
 ):
-    """Generate and output scan results."""
-    results = {
-        "organization": org,
-        "timestamp": datetime.utcnow().isoformat(),
-        "cidr_ranges": cidrs,
-        "live_hosts": sorted(list(live_hosts)),
-        "open_ports": [{"ip": ip, "port": port} for ip, port in open_ports]
-    }
-
-    # Console output
+    """Log scan results and, if an output file is given, save them."""
     logging.info(f"Scan Results for {org}")
     logging.info(f"CIDR Ranges ({len(cidrs)}): {cidrs}")
-    logging.info(f"Live Hosts ({len(live_hosts)}):")
-    for host in sorted(live_hosts):
-        logging.info(f" - {host}")
-    logging.info(f"Open Ports ({len(open_ports)}):")
-    if open_ports:
-        for ip, port in sorted(open_ports):
-            logging.info(f" - {ip}:{port}")
-    else:
-        logging.info("No open ports found.")
-
-    # File output
+    log_results(live_hosts, open_ports)
     if output_file:
-        try:
-            if output_format == "json":
-                with open(output_file, "w") as f:
-                    json.dump(results, f, indent=2)
-                logging.info(f"Results saved as JSON to {output_file}")
-            elif output_format == "csv":
-                with open(output_file, "w", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["IP", "Port"])
-                    for ip, port in open_ports:
-                        writer.writerow([ip, port])
-                logging.info(f"Results saved as CSV to {output_file}")
-        except Exception as e:
-            logging.error(f"Error saving results to {output_file}: {e}")
-
-def save_results(org: str, cidr_ranges: List[str], live_hosts: List[str], open_ports: List[Tuple[str, int]], output_file: str, output_format: str):
-    """Save scan results to a file in the specified format."""
-    timestamp = datetime.now().isoformat()
-    results = {
-        "organization": org,
-        "timestamp": timestamp,
-        "cidr_ranges": cidr_ranges,
-        "live_hosts": live_hosts,
-        "open_ports": [{"ip": ip, "port": port} for ip, port in open_ports]
-    }
-
-    try:
-        if output_format == "json":
-            with open(output_file, "w") as f:
-                json.dump(results, f, indent=2)
-        elif output_format == "csv":
-            with open(output_file, "w", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerow(["IP", "Port"])
-                for ip, port in open_ports:
-                    writer.writerow([ip, port])
-        logging.info(f"Results saved as {output_format.upper()} to {output_file}")
-    except Exception as e:
-        logging.error(f"Error saving results to {output_file}: {e}")
\ No newline at end of file
+        save_results(org, cidrs, live_hosts, open_ports, output_file, output_format)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# dnspython, imported by the first BulkResolver so scans of plain CIDR ranges never load it
+dns = None
+
+DEFAULT_CACHE_PATH = "~/.astra/dns_cache.json"
+DEFAULT_DNS_CONCURRENCY = 100
+DEFAULT_DNS_TIMEOUT = 5.0
+# Negative answers without an SOA record to take the TTL from
+DEFAULT_NEGATIVE_TTL = 300
+RECORD_TYPES = ("A", "AAAA")
+
+def domain_for(org: str) -> str:
+    """Return the domain to resolve for an organization name or domain (apple -> apple.com)."""
+    return org if '.' in org else f"{org}.com"
+
+def _import_dns():
+    global dns
+    if dns is None:
+        import dns.asyncresolver
+        import dns.exception
+        import dns.message
+        import dns.rdatatype
+        import dns.resolver
+
+def _negative_ttl(response: "dns.message.Message") -> float:
+    """How long a negative answer may be cached: min(SOA TTL, SOA minimum) from the authority section (RFC 2308)."""
+    for rrset in response.authority:
+        if rrset.rdtype == dns.rdatatype.SOA:
+            return min(rrset.ttl, rrset[0].minimum)
+    return DEFAULT_NEGATIVE_TTL
+
+class DNSCache:
+    """Resolved addresses per (name, record type), kept until their TTL expires and saved as JSON.
+
+    An empty address list is a negative entry (NXDOMAIN or no records of that
+    type), cached for the negative TTL the zone's SOA allows.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = os.path.expanduser(path)
+        # "name/type" -> (expiry as Unix time, addresses)
+        self._entries: Dict[str, Tuple[float, List[str]]] = {}
+        self._dirty = False
+        try:
+            with open(self.path, "r") as f:
+                self._entries = {key: (expires, addresses) for key, (expires, addresses) in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError, OSError) as e:
+            logging.warning(f"Ignoring unreadable DNS cache {self.path}: {e}")
+
+    def get(self, name: str, rtype: str) -> Optional[List[str]]:
+        """Return the cached addresses (possibly empty) for name, or None if not cached or expired."""
+        entry = self._entries.get(f"{name}/{rtype}")
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def put(self, name: str, rtype: str, addresses: List[str], ttl: float):
+        if ttl <= 0:
+            return
+        self._entries[f"{name}/{rtype}"] = (time.time() + ttl, addresses)
+        self._dirty = True
+
+    def save(self):
+        """Write unexpired entries to disk if anything changed."""
+        if not self._dirty:
+            return
+        now = time.time()
+        entries = {key: entry for key, entry in self._entries.items() if entry[0] > now}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+class BulkResolver:
+    """Resolve A and AAAA records for many names concurrently, with at most `concurrency` queries in flight.
+
+    One resolver is shared by all queries. Answers (including negative
+    ones) are served from `cache` while their TTL lasts. `nameservers` and
+    `port` override the system resolver configuration.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_DNS_CONCURRENCY, timeout: float = DEFAULT_DNS_TIMEOUT,
+                 cache: DNSCache = None, nameservers: List[str] = None, port: int = 53):
+        _import_dns()
+        self.concurrency = concurrency
+        self.cache = cache
+        if nameservers:
+            self._resolver = dns.asyncresolver.Resolver(configure=False)
+            self._resolver.nameservers = nameservers
+            self._resolver.port = port
+        else:
+            self._resolver = dns.asyncresolver.Resolver()
+        self._resolver.lifetime = timeout
+        self.cached = 0
+        self.queried = 0
+        self.failed = 0
+
+    async def _query(self, name: str, rtype: str) -> Tuple[List[str], float]:
+        """Return (addresses, TTL) for one record type; a failed lookup has a TTL of 0 so it is not cached."""
+        try:
+            answer = await self._resolver.resolve(name, rtype)
+        except dns.resolver.NXDOMAIN as e:
+            logging.debug(f"{name} does not exist")
+            return [], min(_negative_ttl(response) for response in e.responses().values())
+        except dns.resolver.NoAnswer as e:
+            logging.debug(f"No {rtype} records found for {name}")
+            return [], _negative_ttl(e.response())
+        except dns.exception.Timeout:
+            logging.warning(f"DNS query for {name} ({rtype}) timed out")
+        except dns.exception.DNSException as e:
+            logging.warning(f"Could not resolve {name} ({rtype}): {e}")
+        else:
+            # The expiration covers every record in a CNAME chain
+            return sorted({record.to_text() for record in answer}), answer.expiration - time.time()
+        self.failed += 1
+        return [], 0
+
+    async def _resolve_all(self, tasks: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[str]]:
+        results = {}
+        task_iter = iter(tasks)
+
+        async def worker():
+            for name, rtype in task_iter:
+                addresses, ttl = await self._query(name, rtype)
+                self.queried += 1
+                results[name, rtype] = addresses
+                if self.cache is not None:
+                    self.cache.put(name, rtype, addresses, ttl)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(tasks)))))
+        return results
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, List[str]]:
+        """Resolve every name to its IPv4 and IPv6 addresses; names that do not resolve map to []."""
+        start = time.monotonic()
+        self.cached = self.queried = self.failed = 0
+        names = list(dict.fromkeys(names))
+        answers: Dict[Tuple[str, str], List[str]] = {}
+        pending = []
+        for name in names:
+            for rtype in RECORD_TYPES:
+                hit = self.cache.get(name, rtype) if self.cache is not None else None
+                if hit is None:
+                    pending.append((name, rtype))
+                else:
+                    self.cached += 1
+                    answers[name, rtype] = hit
+
+        if pending:
+            answers.update(asyncio.run(self._resolve_all(pending)))
+            if self.cache is not None:
+                self.cache.save()
+
+        logging.info(f"Resolved {len(names)} names in {time.monotonic() - start:.1f}s "
+                     f"({self.cached} cached answers, {self.queried} queries, {self.failed} failed)")
+        return {name: [address for rtype in RECORD_TYPES for address in answers[name, rtype]] for name in names}
@@ -0,0 +1,361 @@
+import bisect
+import heapq
+import json
+import socket
+import struct
+import sys
+import threading
+from array import array
+from datetime import datetime
+from ipaddress import IPv4Address, IPv6Address
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from .report import ResultSink
+
+MAGIC = b"ASTRARES"
+FORMAT_VERSION = 1
+
+def _union(a: Iterable[int], b: Iterable[int]) -> Iterator[int]:
+    """Merge two sorted iterables of unique ints into one sorted, duplicate-free stream."""
+    last = None
+    for key in heapq.merge(a, b):
+        if key != last:
+            yield key
+            last = key
+
+def _difference(a: Iterable[int], b: Iterable[int]) -> Iterator[int]:
+    """Yield the keys of sorted iterable `a` that are not in sorted iterable `b`."""
+    b = iter(b)
+    other = next(b, None)
+    for key in a:
+        while other is not None and other < key:
+            other = next(b, None)
+        if key != other:
+            yield key
+
+def _to_le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+class _Table:
+    """Live hosts and open ports of one address family, as sorted integer arrays.
+
+    `hosts[i]` has the open ports `ports[offsets[i]:offsets[i + 1]]`, sorted,
+    so a host with three open ports costs 4 + 8 + 3 * 2 bytes (IPv4). IPv6
+    addresses do not fit an array typecode and are kept in plain lists.
+    Additions are buffered and folded into the sorted arrays on first read.
+    """
+
+    def __init__(self, version: int):
+        self.version = version
+        self.width = 4 if version == 4 else 16
+        self.live = self._new()
+        self.hosts = self._new()
+        self.offsets = array("Q", [0])
+        self.ports = array("H")
+        self._new_live = self._new()
+        self._new_keys = self._new_key_buffer()
+        self._lock = threading.Lock()
+
+    def _new(self, values: Iterable[int] = ()):
+        return array("I", values) if self.version == 4 else list(values)
+
+    def _new_key_buffer(self):
+        # IPv4 keys fit in 48 bits
+        return array("Q") if self.version == 4 else []
+
+    def add_live(self, host: int):
+        with self._lock:
+            self._new_live.append(host)
+
+    def add_port(self, host: int, port: int):
+        with self._lock:
+            self._new_keys.append(host << 16 | port)
+
+    def compact_live(self):
+        with self._lock:
+            if self._new_live:
+                self.live = self._new(_union(self.live, sorted(set(self._new_live))))
+                self._new_live = self._new()
+
+    def compact(self):
+        self.compact_live()
+        with self._lock:
+            if self._new_keys:
+                self._set_keys(_union(self.keys(), sorted(set(self._new_keys))))
+                self._new_keys = self._new_key_buffer()
+
+    def _set_keys(self, keys: Iterable[int]):
+        hosts = self._new()
+        offsets = array("Q", [0])
+        ports = array("H")
+        for key in keys:
+            host = key >> 16
+            if not hosts or hosts[-1] != host:
+                if hosts:
+                    offsets.append(len(ports))
+                hosts.append(host)
+            ports.append(key & 0xFFFF)
+        if hosts:
+            offsets.append(len(ports))
+        self.hosts, self.offsets, self.ports = hosts, offsets, ports
+
+    def keys(self) -> Iterator[int]:
+        """Yield each open port as a sorted (host << 16 | port) key."""
+        offsets, ports = self.offsets, self.ports
+        for i, host in enumerate(self.hosts):
+            base = host << 16
+            for port in ports[offsets[i]:offsets[i + 1]]:
+                yield base | port
+
+    def ports_of(self, host: int) -> array:
+        i = _index(self.hosts, host)
+        if i is None:
+            return array("H")
+        return self.ports[self.offsets[i]:self.offsets[i + 1]]
+
+    @classmethod
+    def combine(cls, a: "_Table", b: "_Table", difference: bool = False) -> "_Table":
+        table = cls(a.version)
+        op = _difference if difference else _union
+        table.live = table._new(op(a.live, b.live))
+        table._set_keys(op(a.keys(), b.keys()))
+        return table
+
+    def write(self, f):
+        for hosts in (self.live, self.hosts):
+            f.write(struct.pack("<Q", len(hosts)))
+            if self.version == 4:
+                f.write(_to_le(hosts))
+            else:
+                f.write(b"".join(host.to_bytes(16, "big") for host in hosts))
+        f.write(_to_le(self.offsets))
+        f.write(struct.pack("<Q", len(self.ports)))
+        f.write(_to_le(self.ports))
+
+    def read(self, f):
+        def read_hosts():
+            count, = struct.unpack("<Q", f.read(8))
+            data = f.read(count * self.width)
+            if self.version == 4:
+                return _from_le("I", data)
+            return [int.from_bytes(data[i:i + 16], "big") for i in range(0, len(data), 16)]
+
+        self.live = read_hosts()
+        self.hosts = read_hosts()
+        self.offsets = _from_le("Q", f.read((len(self.hosts) + 1) * 8))
+        count, = struct.unpack("<Q", f.read(8))
+        self.ports = _from_le("H", f.read(count * 2))
+
+def _index(values, value: int) -> Optional[int]:
+    """Binary-search a sorted sequence for `value` and return its index, or None."""
+    i = bisect.bisect_left(values, value)
+    return i if i < len(values) and values[i] == value else None
+
+class ScanResults(ResultSink):
+    """Compact store of a scan's live hosts and open ports.
+
+    IPv4 hosts are packed 32-bit integers and each host's open ports a
+    sorted array('H') (see _Table), so a million hosts take tens of
+    megabytes rather than the gigabyte or so of string lists and tuples.
+    Results are added like a ResultSink, and merge(), difference() and
+    membership tests work on the sorted arrays. Iterating a ScanResults
+    yields (live_hosts, open_ports) lists, so it unpacks like the tuple
+    scan_network() used to return.
+    """
+
+    def __init__(self):
+        self.organization = None
+        self.timestamp = None
+        self.cidr_ranges: List[str] = []
+        self._tables = {4: _Table(4), 6: _Table(6)}
+
+    def _table(self, ip: str) -> Tuple[_Table, int]:
+        # inet_pton is strict and several times faster than ipaddress parsing
+        try:
+            return self._tables[4], int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+        except OSError:
+            pass
+        try:
+            return self._tables[6], int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+        except OSError:
+            raise ValueError(f"{ip!r} is not a valid IP address") from None
+
+    def _compacted(self) -> Dict[int, _Table]:
+        for table in self._tables.values():
+            table.compact()
+        return self._tables
+
+    # ResultSink interface
+
+    def start(self, org: str, cidr_ranges: List[str], timestamp: str = None):
+        self.organization = org
+        self.timestamp = timestamp or datetime.now().isoformat()
+        self.cidr_ranges = list(cidr_ranges)
+
+    def add_live_host(self, ip: str):
+        table, host = self._table(ip)
+        table.add_live(host)
+
+    def add_open_port(self, ip: str, port: int):
+        table, host = self._table(ip)
+        table.add_port(host, port)
+
+    # Queries
+
+    @property
+    def live_host_count(self) -> int:
+        return sum(len(table.live) for table in self._compacted().values())
+
+    @property
+    def open_port_count(self) -> int:
+        return sum(len(table.ports) for table in self._compacted().values())
+
+    def __contains__(self, ip: str) -> bool:
+        """Whether `ip` is a live host."""
+        self._compacted()
+        table, host = self._table(ip)
+        return _index(table.live, host) is not None
+
+    def has_open_port(self, ip: str, port: int) -> bool:
+        self._compacted()
+        table, host = self._table(ip)
+        return _index(table.ports_of(host), port) is not None
+
+    def ports_of(self, ip: str) -> List[int]:
+        """Return the open ports of a host, sorted."""
+        self._compacted()
+        table, host = self._table(ip)
+        return table.ports_of(host).tolist()
+
+    def live_host_at(self, index: int) -> str:
+        """Return the live host at `index` in live_hosts() order."""
+        for table in self._tables.values():
+            # Only live hosts are folded in, so open ports added meanwhile do not force a rebuild
+            table.compact_live()
+            if index < len(table.live):
+                return str((IPv4Address if table.version == 4 else IPv6Address)(table.live[index]))
+            index -= len(table.live)
+        raise IndexError("live host index out of range")
+
+    def live_hosts(self) -> Iterator[str]:
+        """Yield live hosts in address order, IPv4 first."""
+        for table in self._compacted().values():
+            to_address = IPv4Address if table.version == 4 else IPv6Address
+            for host in table.live:
+                yield str(to_address(host))
+
+    def open_ports(self) -> Iterator[Tuple[str, int]]:
+        """Yield (ip, port) for every open port in address and port order."""
+        for table in self._compacted().values():
+            to_address = IPv4Address if table.version == 4 else IPv6Address
+            for key in table.keys():
+                yield str(to_address(key >> 16)), key & 0xFFFF
+
+    def __iter__(self):
+        return iter((list(self.live_hosts()), list(self.open_ports())))
+
+    # Set operations
+
+    def _combine(self, other: "ScanResults", difference: bool) -> "ScanResults":
+        results = ScanResults()
+        results.organization, results.timestamp = self.organization, self.timestamp
+        results.cidr_ranges = self.cidr_ranges
+        if not difference:
+            results.organization = self.organization or other.organization
+            results.timestamp = self.timestamp or other.timestamp
+            results.cidr_ranges = self.cidr_ranges + [c for c in other.cidr_ranges if c not in self.cidr_ranges]
+        other_tables = other._compacted()
+        results._tables = {version: _Table.combine(table, other_tables[version], difference)
+                           for version, table in self._compacted().items()}
+        return results
+
+    def merge(self, other: "ScanResults") -> "ScanResults":
+        """Return the live hosts and open ports found by either result, and the CIDR ranges of both."""
+        return self._combine(other, difference=False)
+
+    def difference(self, other: "ScanResults") -> "ScanResults":
+        """Return the live hosts and open ports in this result but not in `other`."""
+        return self._combine(other, difference=True)
+
+    __or__ = merge
+    __sub__ = difference
+
+    # Conversion and storage
+
+    @classmethod
+    def from_lists(cls, live_hosts: Iterable[str], open_ports: Iterable[Tuple[str, int]]) -> "ScanResults":
+        results = cls()
+        for ip in live_hosts:
+            results.add_live_host(ip)
+        for ip, port in open_ports:
+            results.add_open_port(ip, port)
+        return results
+
+    @classmethod
+    def from_document(cls, document: Dict) -> "ScanResults":
+        """Build results from a JSON results document."""
+        results = cls.from_lists(document.get("live_hosts", []),
+                                 ((entry["ip"], entry["port"]) for entry in document.get("open_ports", [])))
+        results.organization = document.get("organization")
+        results.timestamp = document.get("timestamp")
+        results.cidr_ranges = document.get("cidr_ranges") or []
+        return results
+
+    def to_document(self) -> Dict:
+        """Return the JSON results document (as written by the json output format)."""
+        return {"organization": self.organization, "timestamp": self.timestamp, "cidr_ranges": self.cidr_ranges,
+                "live_hosts": list(self.live_hosts()),
+                "open_ports": [{"ip": ip, "port": port} for ip, port in self.open_ports()]}
+
+    def save(self, path: str):
+        """Write the results in the binary format: a header, then each table's arrays, little-endian."""
+        meta = json.dumps({"organization": self.organization, "timestamp": self.timestamp,
+                           "cidr_ranges": self.cidr_ranges}).encode()
+        with open(path, "wb") as f:
+            f.write(MAGIC + struct.pack("<BI", FORMAT_VERSION, len(meta)) + meta)
+            for version in (4, 6):
+                self._compacted()[version].write(f)
+
+    @classmethod
+    def load(cls, path: str) -> "ScanResults":
+        """Read results written by save()."""
+        results = cls()
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an Astra binary results file")
+            version, meta_len = struct.unpack("<BI", f.read(5))
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported results format version {version} in {path}")
+            meta = json.loads(f.read(meta_len))
+            results.organization, results.timestamp = meta["organization"], meta["timestamp"]
+            results.cidr_ranges = meta["cidr_ranges"]
+            for version in (4, 6):
+                results._tables[version].read(f)
+        return results
+
+def is_binary_results(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+class BinarySink(ScanResults):
+    """Collect results in memory and write them in the binary format on close."""
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__()
+        self.path = path
+        self._closed = False
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.save(self.path)
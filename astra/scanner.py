@@ -0,0 +1,242 @@
+import collections
+import concurrent.futures
+import queue
+import threading
+from ipaddress import ip_network
+from typing import Iterable, Iterator, List, Tuple
+from .checkpoint import ScanPlan
+from .discovery import Discovery
+from .metrics import ScanMetrics
+from .network import iter_ips, scan_network
+from .parallel import QueueSink
+from .ratelimit import RateLimiter
+from .report import ResultSink
+from .results import ScanResults
+from .sockets import raise_fd_limit
+from .targets import TargetSet
+
+DEFAULT_WORKERS = 256
+
+class ScanCancelled(Exception):
+    """Raised inside a scan whose `cancel` event was set."""
+
+class FairExecutor:
+    """A thread pool shared by concurrent scans that serves their probes round-robin.
+
+    Each scan submits through its own lane(). A free worker takes the
+    oldest probe of the next lane with work queued, so every running scan
+    gets an equal share of the threads however many probes it has queued,
+    and a small scan is never stuck behind a large one.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._ready = threading.Condition()
+        # Lanes with queued work, in the order they will next be served
+        self._queued = collections.deque()
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._work, name=f"astra-pool-{i}", daemon=True)
+                         for i in range(max_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def lane(self) -> "Lane":
+        return Lane(self)
+
+    def _submit(self, lane: "Lane", item: Tuple):
+        with self._ready:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            if not lane.items:
+                self._queued.append(lane)
+            lane.items.append(item)
+            self._ready.notify()
+
+    def _work(self):
+        while True:
+            with self._ready:
+                while not self._queued and not self._shutdown:
+                    self._ready.wait()
+                if not self._queued:
+                    return
+                lane = self._queued.popleft()
+                future, fn, args, kwargs = lane.items.popleft()
+                if lane.items:
+                    self._queued.append(lane)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _cancel(self, lane: "Lane"):
+        """Cancel the probes `lane` has queued that no worker has started."""
+        with self._ready:
+            items = list(lane.items)
+            lane.items.clear()
+            if lane in self._queued:
+                self._queued.remove(lane)
+        for future, *_ in items:
+            future.cancel()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once every queued probe has run."""
+        with self._ready:
+            self._shutdown = True
+            self._ready.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+class Lane(concurrent.futures.Executor):
+    """One scan's view of a FairExecutor; shutting a lane down leaves the shared pool running."""
+
+    def __init__(self, pool: FairExecutor):
+        self._pool = pool
+        self.items = collections.deque()
+
+    def submit(self, fn, *args, **kwargs) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._pool._submit(self, (future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """With `cancel_futures`, drop this lane's queued probes; the shared pool keeps running either way."""
+        if cancel_futures:
+            self._pool._cancel(self)
+
+class _CancellableSink(ResultSink):
+    def __init__(self, sink: ResultSink, cancel: threading.Event):
+        self.sink = sink
+        self.cancel = cancel
+
+    def add_live_host(self, ip: str):
+        if self.cancel.is_set():
+            raise ScanCancelled()
+        self.sink.add_live_host(ip)
+
+    def add_open_port(self, ip: str, port: int):
+        if self.cancel.is_set():
+            raise ScanCancelled()
+        self.sink.add_open_port(ip, port)
+
+def _until(ips: Iterable[str], cancel: threading.Event) -> Iterator[str]:
+    for ip in ips:
+        if cancel.is_set():
+            return
+        yield ip
+
+class Scanner:
+    """Run many scans in one process, reusing a warm thread pool instead of starting one per scan.
+
+    All scans share a FairExecutor of `workers` threads (thread engine) and,
+    with a `limiter`, one global probe rate limit. Hosts are found with
+    `discovery` (see discovery.Discovery), or by a connect to port 80 if it
+    is None. Domains among the targets are
+    resolved with `resolver`, a resolver.BulkResolver created on first use,
+    so dnspython is only loaded when a scan needs it. Scans may run
+    concurrently from several threads.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, timeout: float = 1.0, engine: str = "thread",
+                 concurrency: int = None, limiter: RateLimiter = None, resolver=None, discovery: Discovery = None):
+        self.timeout = timeout
+        self.engine = engine
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.discovery = discovery
+        # Every worker may hold a socket (a discovery race several) at once
+        raise_fd_limit()
+        self.pool = FairExecutor(workers)
+        self._resolver = resolver
+        self._resolver_lock = threading.Lock()
+
+    def resolve(self, targets: Iterable[str]) -> List[str]:
+        """Turn CIDR ranges, IPs and domains into CIDR ranges; only domains are looked up."""
+        cidr_ranges = []
+        domains = []
+        for target in targets:
+            try:
+                cidr_ranges.append(str(ip_network(target, strict=False)))
+            except ValueError:
+                domains.append(target)
+        if domains:
+            from .api import get_cidr_ranges_bulk
+            from .resolver import BulkResolver
+            with self._resolver_lock:
+                if self._resolver is None:
+                    self._resolver = BulkResolver()
+                # BulkResolver runs its own event loop per call, so lookups are serialized
+                cidr_ranges += get_cidr_ranges_bulk(domains, self._resolver)
+        return list(dict.fromkeys(cidr_ranges))
+
+    def scan(self, targets: Iterable[str], ports: List[int], timeout: float = None, sink: ResultSink = None,
+             max_ips: int = None, max_ips_per_cidr: int = None, seed: int = None, pipeline: bool = False,
+             metrics: ScanMetrics = None, cancel: threading.Event = None, exclude: Iterable[str] = ()) -> ScanResults:
+        """Scan `targets` (CIDR ranges, IPs or domains) and return the results, passing each to `sink` as found.
+
+        Addresses in `exclude` (CIDR ranges or IPs) are never probed; an
+        invalid entry raises ValueError. Setting `cancel` stops the scan
+        early with ScanCancelled.
+        """
+        target_set = TargetSet(self.resolve(targets), exclude, max_ips_per_cidr)
+        sink = sink or ResultSink()
+        ips = iter_ips(target_set, max_ips, seed=seed)
+        if cancel is not None:
+            sink = _CancellableSink(sink, cancel)
+            ips = _until(ips, cancel)
+        plan = ScanPlan(ports, seed=seed) if seed is not None else None
+        lane = self.pool.lane()
+        try:
+            results = scan_network(ips, ports, self.timeout if timeout is None else timeout, self.engine,
+                                   self.concurrency, sink, pipeline, limiter=self.limiter, plan=plan,
+                                   metrics=metrics, executor=lane, discovery=self.discovery)
+        finally:
+            # A cancelled or failed scan leaves probes queued that nobody will collect
+            lane.shutdown(wait=False, cancel_futures=True)
+        if cancel is not None and cancel.is_set():
+            raise ScanCancelled()
+        return results
+
+    def stream(self, targets: Iterable[str], ports: List[int], **options) -> Iterator[Tuple]:
+        """Run scan() on a background thread, yielding ("host", ip) and ("port", ip, port) as they are found.
+
+        Errors from the scan are raised from the generator; closing the
+        generator early cancels the scan.
+        """
+        events = queue.Queue()
+        cancel = threading.Event()
+
+        def run():
+            try:
+                self.scan(targets, ports, sink=QueueSink(events), cancel=cancel, **options)
+            except ScanCancelled:
+                pass
+            except Exception as e:
+                events.put(("error", e))
+            finally:
+                events.put(("done",))
+
+        threading.Thread(target=run, name="astra-stream", daemon=True).start()
+        try:
+            while True:
+                event = events.get()
+                if event[0] == "done":
+                    return
+                if event[0] == "error":
+                    raise event[1]
+                yield event
+        finally:
+            cancel.set()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,226 @@
+import asyncio
+import collections
+import errno
+import itertools
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from .metrics import ScanMetrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Errors that mean this machine ran out of something, not that the target answered
+RESOURCE_ERRORS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL}
+RESOURCE_RETRIES = 5
+# First back-off after a resource error, doubled for each further retry
+RESOURCE_BACKOFF = 0.01
+# File descriptors left free for output files, the resolver, the metrics server...
+FD_RESERVE = 64
+# Ceiling for an unlimited hard limit; macOS refuses more than OPEN_MAX per process
+MAX_FDS = 1 << 20
+MACOS_OPEN_MAX = 10240
+# l_onoff=1, l_linger=0: close() sends an RST and frees the port at once, without TIME_WAIT
+_LINGER_RST = struct.pack("ii", 1, 0)
+
+T = TypeVar("T")
+
+class ResourceStats:
+    """Process-wide counts of probes that ran into a local resource limit (fds, buffers, ephemeral ports)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = collections.Counter()
+        self.failed = 0
+
+    def record(self, err: int, gave_up: bool = False):
+        with self._lock:
+            if gave_up:
+                self.failed += 1
+            else:
+                self.retries[errno.errorcode.get(err, str(err))] += 1
+
+    def snapshot(self) -> Tuple[Dict[str, int], int]:
+        with self._lock:
+            return dict(self.retries), self.failed
+
+    def log_summary(self, since: Tuple[Dict[str, int], int], shared: bool = False):
+        """Warn about the resource errors recorded after `since` (an earlier snapshot()).
+
+        With `shared`, other scans ran in this process meanwhile and their errors are included.
+        """
+        retries, failed = self.snapshot()
+        counts = {name: count - since[0].get(name, 0) for name, count in retries.items()}
+        counts = {name: count for name, count in counts.items() if count}
+        failed -= since[1]
+        if not counts and not failed:
+            return
+        detail = ", ".join(f"{name} {count}" for name, count in sorted(counts.items()))
+        scope = " (across all scans running in this process)" if shared else ""
+        logging.warning(f"Local socket resources ran out {sum(counts.values())} times ({detail}){scope}; "
+                        f"{failed} probes still failed after {RESOURCE_RETRIES} retries and were not "
+                        f"reported as open. Lower --concurrency or --rate, or raise `ulimit -n`")
+
+stats = ResourceStats()
+
+def raise_fd_limit() -> Optional[int]:
+    """Raise the soft open-file limit (RLIMIT_NOFILE) to the hard limit and return the limit now in effect.
+
+    Returns None where the limit cannot be read (Windows).
+    """
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = MAX_FDS if hard == resource.RLIM_INFINITY else hard
+    if soft == resource.RLIM_INFINITY:
+        return target
+    for candidate in (target, min(target, MACOS_OPEN_MAX)):
+        if soft >= candidate:
+            break
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (candidate, hard))
+        except (ValueError, OSError):
+            continue
+        logging.debug(f"Raised the open-file limit from {soft} to {candidate}")
+        soft = candidate
+        break
+    return soft
+
+def open_fd_count() -> int:
+    """Number of file descriptors this process has open (0 if it cannot be told)."""
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return 0
+
+def ephemeral_port_count(path: str = "/proc/sys/net/ipv4/ip_local_port_range") -> Optional[int]:
+    """Size of the local port range outgoing connections are given ports from (None if unknown)."""
+    try:
+        with open(path) as f:
+            low, high = (int(value) for value in f.read().split())
+    except (OSError, ValueError):
+        return None
+    return high - low + 1
+
+def socket_budget() -> Optional[int]:
+    """How many probe sockets may be open at once: free file descriptors (after raise_fd_limit()) or
+    ephemeral ports, whichever is fewer. None if neither is known."""
+    budgets = []
+    limit = raise_fd_limit()
+    if limit is not None:
+        budgets.append(limit - open_fd_count() - FD_RESERVE)
+    ports = ephemeral_port_count()
+    if ports is not None:
+        budgets.append(ports)
+    return max(1, min(budgets)) if budgets else None
+
+def fit_concurrency(concurrency: int, sockets_per_probe: int = 1, reserved: int = 0) -> int:
+    """Lower `concurrency` so that probes holding `sockets_per_probe` sockets each stay within socket_budget(),
+    less `reserved` sockets already promised to other scans."""
+    budget = socket_budget()
+    if budget is None:
+        return concurrency
+    budget = max(1, budget - reserved)
+    fitted = max(1, min(concurrency, budget // sockets_per_probe))
+    if fitted < concurrency:
+        logging.warning(f"Lowering concurrency from {concurrency} to {fitted}: only {budget} sockets "
+                        f"(file descriptors or ephemeral ports) are available")
+    return fitted
+
+class ScanResources:
+    """One scan's share of the process's probe sockets, and the resource errors logged when it ends.
+
+    Scans running at once in one process (Scanner, the daemon) share one
+    socket budget: fit() sizes a scan from the sockets that the other
+    running scans have not reserved, and holds them until close(). Sockets
+    the other scans have open count against the budget as well, so the
+    split errs on the low side. `stats` is process-wide, so when scans
+    overlapped, close() says that its summary covers all of them.
+    """
+
+    _lock = threading.Lock()
+    _reserved = 0
+    _running = 0
+    _started = 0
+
+    def __init__(self):
+        with ScanResources._lock:
+            ScanResources._running += 1
+            ScanResources._started += 1
+            self._shared = ScanResources._running > 1
+            self._started_as = ScanResources._started
+        self.reserved = 0
+        self._before = stats.snapshot()
+
+    def fit(self, concurrency: int, sockets_per_probe: int = 1) -> int:
+        """fit_concurrency() within the sockets left by other scans, reserving the result for this one."""
+        with ScanResources._lock:
+            fitted = fit_concurrency(concurrency, sockets_per_probe, ScanResources._reserved - self.reserved)
+            ScanResources._reserved += fitted * sockets_per_probe - self.reserved
+            self.reserved = fitted * sockets_per_probe
+        return fitted
+
+    def close(self):
+        """Release this scan's sockets and log its resource summary."""
+        with ScanResources._lock:
+            ScanResources._reserved -= self.reserved
+            ScanResources._running -= 1
+            shared = self._shared or ScanResources._started != self._started_as
+        self.reserved = 0
+        stats.log_summary(self._before, shared)
+
+def probe_socket(family: int) -> socket.socket:
+    """A TCP socket for one probe; closing it sends an RST, so probes leave no TIME_WAIT entries behind."""
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_RST)
+    except OSError:
+        pass
+    return sock
+
+def check_resources(err: int):
+    """Raise OSError for a connect_ex() result that is a resource error."""
+    if err in RESOURCE_ERRORS:
+        raise OSError(err, os.strerror(err))
+
+def retry(attempt: Callable[[], T], metrics: ScanMetrics = None) -> T:
+    """Call `attempt`, retrying with back-off while it raises a resource error.
+
+    Other errors propagate at once; a resource error that persists after
+    RESOURCE_RETRIES retries is raised too. Every retry is counted in
+    `stats` (and `metrics`), so exhaustion never passes silently as a
+    closed port.
+    """
+    for n in itertools.count():
+        try:
+            return attempt()
+        except OSError as e:
+            _record(e, n, metrics)
+        time.sleep(RESOURCE_BACKOFF * 2 ** n)
+
+async def retry_async(attempt: Callable[[], Awaitable[T]], metrics: ScanMetrics = None) -> T:
+    """Event-loop counterpart of retry()."""
+    for n in itertools.count():
+        try:
+            return await attempt()
+        except OSError as e:
+            _record(e, n, metrics)
+        await asyncio.sleep(RESOURCE_BACKOFF * 2 ** n)
+
+def _record(e: OSError, n: int, metrics: ScanMetrics):
+    if e.errno not in RESOURCE_ERRORS:
+        raise e
+    if n == RESOURCE_RETRIES:
+        stats.record(e.errno, gave_up=True)
+        raise e
+    stats.record(e.errno)
+    if metrics is not None:
+        metrics.resource_retry()
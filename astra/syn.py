@@ -0,0 +1,317 @@
+import collections
+import errno
+import hashlib
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+from .checkpoint import ScanPlan
+from .discovery import Discovery
+from .metrics import ScanMetrics
+from .network import CLOSED, ERROR, FILTERED, OPEN, StageProgress
+from .ratelimit import RateLimiter
+from .report import ResultSink
+from .results import ScanResults
+
+DEFAULT_WINDOW = 4096
+# A full window of replies arrives in a burst; the default buffer holds a few hundred packets
+RECV_BUFFER = 8 * 1024 * 1024
+
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+# MSS option (1460) so the SYN looks like one a normal stack would send
+_SYN_OPTIONS = b"\x02\x04\x05\xb4"
+
+def checksum(data: bytes) -> int:
+    """Compute the 16-bit ones' complement Internet checksum."""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+def build_syn(src_ip: bytes, dst_ip: bytes, src_port: int, dst_port: int, seq: int) -> bytes:
+    """Build a TCP SYN segment (header only) with a valid checksum for the given addresses."""
+    offset = (20 + len(_SYN_OPTIONS)) // 4
+    header = struct.pack("!HHIIBBHHH", src_port, dst_port, seq, 0, offset << 4, TCP_SYN, 65535, 0, 0)
+    header += _SYN_OPTIONS
+    pseudo = src_ip + dst_ip + struct.pack("!BBH", 0, socket.IPPROTO_TCP, len(header))
+    return header[:16] + struct.pack("!H", checksum(pseudo + header)) + header[18:]
+
+def parse_reply(packet: bytes) -> Tuple[bytes, int, int, int, int]:
+    """Return (source IP, source port, destination port, ack number, flags) from a raw IPv4 TCP packet."""
+    ihl = (packet[0] & 0x0F) * 4
+    src_port, dst_port, _, ack = struct.unpack("!HHII", packet[ihl:ihl + 12])
+    return packet[12:16], src_port, dst_port, ack, packet[ihl + 13]
+
+def raw_sockets_available() -> bool:
+    """Check whether this process may open raw TCP sockets."""
+    try:
+        socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP).close()
+        return True
+    except (PermissionError, OSError):
+        return False
+
+def _enlarge_recv_buffer(sock: socket.socket, size: int = RECV_BUFFER):
+    """Grow the receive buffer of `sock` to `size` bytes, so a burst of replies is not dropped.
+
+    SO_RCVBUFFORCE (root) may exceed net.core.rmem_max; SO_RCVBUF is capped
+    by it. If neither can be set, the scan goes on with the default buffer.
+    """
+    for option in (getattr(socket, "SO_RCVBUFFORCE", 33), socket.SO_RCVBUF):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+            return
+        except OSError as e:
+            error = e
+    logging.warning(f"Could not enlarge the SYN receive buffer ({error}); replies to a full window may be dropped. "
+                    f"Lower --concurrency if open ports are missed")
+
+class SynScanner:
+    """Half-open TCP scanner: SYNs go out on one raw socket, replies are matched on a receive thread.
+
+    No connection or file descriptor is held per probe. Each SYN carries a
+    keyed hash of (ip, port) as its sequence number, so a reply is accepted
+    only if it acknowledges a SYN this scanner sent. A SYN-ACK means open;
+    an RST means closed; silence until `timeout` means closed or filtered.
+    The kernel answers the SYN-ACK with an RST since no socket owns the
+    connection. Requires Linux and root or CAP_NET_RAW.
+    """
+
+    def __init__(self, timeout: float, window: int = DEFAULT_WINDOW, limiter: RateLimiter = None,
+                 metrics: ScanMetrics = None):
+        self.timeout = timeout
+        self.window = window
+        self.limiter = limiter
+        self.metrics = metrics
+        # Raises PermissionError without CAP_NET_RAW
+        self._send_sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        self._recv_sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_TCP)
+        self._recv_sock.settimeout(0.1)
+        _enlarge_recv_buffer(self._recv_sock)
+        # Reserve the source port so no local connection can be assigned it
+        self._port_guard = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._port_guard.bind(("0.0.0.0", 0))
+        self.src_port = self._port_guard.getsockname()[1]
+        self._secret = os.urandom(16)
+        self._source_ips: Dict[str, bytes] = {}
+        self._replies = queue.Queue()
+        self._stop = threading.Event()
+        self._receiver = threading.Thread(target=self._receive_loop, name="astra-syn-recv", daemon=True)
+        self._receiver.start()
+
+    def _cookie(self, ip: bytes, port: int) -> int:
+        digest = hashlib.blake2s(ip + port.to_bytes(2, "big"), key=self._secret, digest_size=4).digest()
+        return int.from_bytes(digest, "big")
+
+    def _source_ip(self, ip: str) -> bytes:
+        """Find the local address the kernel routes `ip` from (needed for the TCP checksum)."""
+        src = self._source_ips.get(ip)
+        if src is None:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+                probe.connect((ip, 9))
+                src = socket.inet_aton(probe.getsockname()[0])
+            self._source_ips[ip] = src
+        return src
+
+    def _send_syn(self, ip: str, port: int):
+        dst = socket.inet_aton(ip)
+        segment = build_syn(self._source_ip(ip), dst, self.src_port, port, self._cookie(dst, port))
+        self._send_sock.sendto(segment, (ip, 0))
+
+    def _receive_loop(self):
+        while not self._stop.is_set():
+            try:
+                packet = self._recv_sock.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                if not self._stop.is_set():
+                    logging.exception("SYN receive socket failed")
+                return
+            try:
+                src, src_port, dst_port, ack, flags = parse_reply(packet)
+            except (IndexError, struct.error):
+                continue
+            if dst_port != self.src_port or not flags & TCP_ACK:
+                continue
+            if ack != (self._cookie(src, src_port) + 1) & 0xFFFFFFFF:
+                continue
+            if flags & TCP_SYN and not flags & TCP_RST:
+                self._replies.put((socket.inet_ntoa(src), src_port, True))
+            elif flags & TCP_RST:
+                self._replies.put((socket.inet_ntoa(src), src_port, False))
+
+    def probe(self, tasks: Iterable[Tuple[str, int]], on_result: Callable[[str, int, bool], None],
+              states: bool = False):
+        """Probe every (ip, port) in `tasks`, calling on_result(ip, port, is_open) once per task.
+
+        At most `window` probes are outstanding, and SYNs are paced by the
+        limiter if one is set. Callbacks run on the calling thread. With
+        `states`, on_result gets the probe's state (OPEN, CLOSED, FILTERED or
+        ERROR) instead of is_open.
+        """
+        limiter = self.limiter
+        metrics = self.metrics
+        task_iter = iter(tasks)
+        exhausted = False
+        held = None
+        # (ip, port) -> deadline; insertion order is deadline order since the timeout is fixed
+        outstanding: Dict[Tuple[str, int], float] = collections.OrderedDict()
+        while True:
+            while not exhausted and len(outstanding) < self.window:
+                task, held = held or next(task_iter, None), None
+                if task is None:
+                    exhausted = True
+                    break
+                if limiter is not None:
+                    limiter.acquire()
+                try:
+                    self._send_syn(*task)
+                except OSError as e:
+                    if limiter is not None:
+                        limiter.release(True)
+                    if e.errno in (errno.ENOBUFS, errno.EAGAIN):
+                        # Transmit queue is full: hold the probe and drain replies before retrying
+                        held = task
+                        if not outstanding:
+                            time.sleep(0.001)
+                        break
+                    logging.debug(f"Could not send SYN to {task[0]}:{task[1]}: {e}")
+                    if metrics is not None:
+                        metrics.probe_started()
+                        metrics.probe_finished(ERROR)
+                    on_result(task[0], task[1], ERROR if states else False)
+                    continue
+                outstanding[task] = time.monotonic() + self.timeout
+                if metrics is not None:
+                    metrics.probe_started()
+            if exhausted and not outstanding:
+                return
+
+            now = time.monotonic()
+            wait = max(0.0, min(0.01, next(iter(outstanding.values())) - now)) if outstanding else 0.0
+            try:
+                reply = self._replies.get(timeout=wait) if wait else self._replies.get_nowait()
+                while True:
+                    ip, port, is_open = reply
+                    # Duplicate or late replies no longer have an outstanding probe
+                    deadline = outstanding.pop((ip, port), None)
+                    if deadline is not None:
+                        if limiter is not None:
+                            limiter.release(False)
+                        state = OPEN if is_open else CLOSED
+                        if metrics is not None:
+                            metrics.probe_finished(state, time.monotonic() - (deadline - self.timeout))
+                        on_result(ip, port, state if states else is_open)
+                    reply = self._replies.get_nowait()
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            while outstanding:
+                task, deadline = next(iter(outstanding.items()))
+                if deadline > now:
+                    break
+                del outstanding[task]
+                if limiter is not None:
+                    limiter.release(True)
+                if metrics is not None:
+                    metrics.probe_finished(FILTERED)
+                on_result(task[0], task[1], FILTERED if states else False)
+
+    def close(self):
+        self._stop.set()
+        self._receiver.join()
+        for sock in (self._send_sock, self._recv_sock, self._port_guard):
+            sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def scan_network_syn(ips: Iterable[str], ports: List[int], timeout: float, window: int = DEFAULT_WINDOW,
+                     sink: ResultSink = None, limiter: RateLimiter = None,
+                     plan: ScanPlan = None, metrics: ScanMetrics = None, discovery: Discovery = None) -> ScanResults:
+    """Scan a list of IPs for live hosts and open ports using raw-socket SYN probes.
+
+    With `discovery`, a host is live when any of its discovery ports answers
+    the SYN, with a SYN-ACK or an RST. Only the TCP probes apply here; ICMP
+    and ARP need the connect-based engines.
+    """
+    sink = sink or ResultSink()
+    plan = plan or ScanPlan(ports)
+    results = ScanResults()
+    # Without a Discovery, keep the old check: SYN-ACK from port 80, like is_host_alive
+    discovery_ports = (discovery.ports if discovery is not None else None) or [80]
+    if discovery is not None and (discovery.icmp or discovery.on_link):
+        logging.warning("SYN scan discovers hosts with TCP probes only; ICMP and ARP are not used")
+
+    with SynScanner(timeout, window, limiter, metrics) as scanner:
+        # Step 1: Find live hosts
+        logging.info(f"Scanning IPs for live hosts (SYN scan, window {window})")
+        discovery_stage = StageProgress("Discovery", "live", limiter=limiter, metrics=metrics)
+
+        def host_done(ip: str, alive: bool):
+            plan.host_done(ip, alive)
+            discovery_stage.advance(alive)
+            if alive:
+                results.add_live_host(ip)
+                sink.add_live_host(ip)
+
+        if discovery is not None and discovery.skip:
+            for ip in ips:
+                host_done(ip, True)
+        else:
+            # Discovery probes still unanswered per undecided host
+            pending: Dict[str, int] = {}
+
+            def discovery_tasks() -> Iterable[Tuple[str, int]]:
+                for ip in ips:
+                    pending[ip] = len(discovery_ports)
+                    for port in discovery_ports:
+                        yield ip, port
+
+            def on_host(ip: str, port: int, state: str):
+                if ip not in pending:
+                    # Already decided by an earlier reply
+                    return
+                pending[ip] -= 1
+                alive = state == OPEN or (state == CLOSED and discovery is not None)
+                if alive or not pending[ip]:
+                    del pending[ip]
+                    host_done(ip, alive)
+
+            scanner.probe(discovery_tasks(), on_host, states=True)
+        discovery_stage.log(final=True)
+
+        if not results.live_host_count:
+            logging.info("No live hosts found")
+            return results
+
+        # Step 2: Scan ports on live hosts
+        live_host_count = results.live_host_count
+        total_ports = len(ports) * live_host_count
+        logging.info(f"Scanning {len(ports)} ports on {live_host_count} live hosts ({total_ports} total scans)")
+        port_stage = StageProgress("Port scan", "open", limiter=limiter, metrics=metrics, total=total_ports)
+
+        def on_port(ip: str, port: int, is_open: bool):
+            plan.port_done(ip, port, is_open)
+            if is_open:
+                results.add_open_port(ip, port)
+                sink.add_open_port(ip, port)
+            port_stage.advance(is_open)
+
+        scanner.probe(plan.port_tasks(results), on_port)
+        port_stage.log(final=True)
+
+    return results
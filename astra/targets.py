@@ -0,0 +1,124 @@
+import bisect
+import logging
+from ipaddress import ip_address, ip_network
+from typing import Iterable, Iterator, List, Tuple
+
+# An address interval: (IP version, first address as int, last address as int, rank)
+Interval = Tuple[int, int, int, int]
+
+def _parse(text: str) -> Tuple[int, int, int]:
+    """Return (IP version, first, last) for a CIDR range or single IP; raises ValueError."""
+    network = ip_network(text.strip(), strict=False)
+    first = int(network.network_address)
+    return network.version, first, first + network.num_addresses - 1
+
+def _coalesce(intervals: List[Interval]) -> List[Interval]:
+    """Sort intervals and merge overlapping or adjacent ones, keeping the lowest rank of each merged group."""
+    merged: List[Interval] = []
+    for version, first, last, rank in sorted(intervals):
+        if merged and merged[-1][0] == version and first <= merged[-1][2] + 1:
+            _, start, end, low = merged[-1]
+            merged[-1] = (version, start, max(end, last), min(low, rank))
+        else:
+            merged.append((version, first, last, rank))
+    return merged
+
+def _subtract(include: List[Interval], exclude: List[Interval]) -> List[Interval]:
+    """Remove the addresses of `exclude` from `include`; both sorted and coalesced."""
+    remaining: List[Interval] = []
+    j = 0
+    for version, first, last, rank in include:
+        # Skip excludes that end before this interval starts
+        while j < len(exclude) and (exclude[j][0], exclude[j][2]) < (version, first):
+            j += 1
+        start = first
+        k = j
+        while k < len(exclude) and exclude[k][0] == version and exclude[k][1] <= last:
+            _, cut_first, cut_last, _ = exclude[k]
+            if cut_first > start:
+                remaining.append((version, start, cut_first - 1, rank))
+            start = max(start, cut_last + 1)
+            if cut_last >= last:
+                break
+            k += 1
+        if start <= last:
+            remaining.append((version, start, last, rank))
+    return remaining
+
+class TargetSet:
+    """The addresses to scan: included CIDR ranges and IPs, without duplicates or excluded addresses.
+
+    Ranges are kept as sorted, merged integer intervals, so overlapping and
+    duplicate targets are probed once and a large exclude list costs
+    O(n log n) to apply, not per address. Membership is a binary search.
+    ranges() yields the remaining intervals in the order their ranges were
+    first given, so callers that put some ranges first (--incremental)
+    still have them probed first.
+
+    `max_ips_per_cidr` keeps the first addresses of each included range
+    before anything is merged or excluded. Invalid include entries are
+    logged and skipped; an invalid exclude entry raises ValueError, so a
+    typo never widens a scan.
+    """
+
+    def __init__(self, include: Iterable[str], exclude: Iterable[str] = (), max_ips_per_cidr: int = None,
+                 log: bool = True):
+        intervals: List[Interval] = []
+        self.requested = 0
+        for rank, cidr in enumerate(include):
+            try:
+                version, first, last = _parse(cidr)
+            except ValueError as e:
+                if log:
+                    logging.error(f"Invalid CIDR range {cidr}: {e}")
+                continue
+            total = last - first + 1
+            if log:
+                logging.debug(f"Processing CIDR {cidr} with {total} total IPs")
+            if max_ips_per_cidr is not None and total > max_ips_per_cidr:
+                if log:
+                    logging.info(f"Limiting {cidr} to {max_ips_per_cidr} IPs (out of {total})")
+                last = first + max_ips_per_cidr - 1
+            if last >= first:
+                intervals.append((version, first, last, rank))
+                self.requested += last - first + 1
+
+        cuts: List[Interval] = []
+        for cidr in exclude:
+            try:
+                cuts.append((*_parse(cidr), 0))
+            except ValueError as e:
+                raise ValueError(f"invalid exclude entry {cidr!r}: {e}") from None
+
+        merged = _coalesce(intervals)
+        unique = sum(last - first + 1 for _, first, last, _ in merged)
+        self.exclude_ranges = len(cuts)
+        self._intervals = _subtract(merged, _coalesce(cuts))
+        self._keys = [(version, first) for version, first, _, _ in self._intervals]
+        self.size = sum(last - first + 1 for _, first, last, _ in self._intervals)
+        # Addresses named more than once, and addresses removed by the exclude list
+        self.duplicates = self.requested - unique
+        self.excluded = unique - self.size
+
+    def __contains__(self, ip: str) -> bool:
+        address = ip_address(ip)
+        key = (address.version, int(address))
+        i = bisect.bisect_right(self._keys, key) - 1
+        return i >= 0 and self._intervals[i][0] == key[0] and key[1] <= self._intervals[i][2]
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def ranges(self) -> Iterator[Tuple[int, int, int]]:
+        """Yield (first address as int, address count, IP version) per remaining interval, in input order."""
+        for version, first, last, _ in sorted(self._intervals, key=lambda interval: interval[3]):
+            yield first, last - first + 1, version
+
+    def summary(self) -> str:
+        """Describe the set and what deduplication and exclusion removed, for the scan log."""
+        text = f"{self.size} IPs in {len(self._intervals)} ranges"
+        if self.duplicates:
+            text += f", {self.duplicates} duplicate IPs merged"
+        if self.exclude_ranges:
+            text += f", {self.excluded} IPs excluded by {self.exclude_ranges} exclude entries"
+        return text
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Measure how scan throughput scales with --processes on loopback.
+
+Listens on port 80 of every loopback address (so each 127.0.x.y target is
+live) and scans a CIDR of loopback addresses with 1, 2, 4, ... worker
+processes, printing probes/sec for each.
+
+    python3 benchmarks/bench_processes.py --cidr 127.0.0.0/22 --ports 50 --max-processes 8
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from astra.network import count_ips  # noqa: E402
+from astra.parallel import scan_network_multiprocess  # noqa: E402
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Astra multi-process scanning on loopback")
+    parser.add_argument("--cidr", default="127.0.0.0/22", help="Loopback CIDR to scan (default: 127.0.0.0/22)")
+    parser.add_argument("--ports", type=int, default=50, help="Number of ports per host starting at 1 (default: 50)")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Probe timeout in seconds (default: 1.0)")
+    parser.add_argument("--engine", choices=["thread", "async"], default="thread", help="Scan engine (default: thread)")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1,
+                        help="Largest process count to try, doubling from 1 (default: CPU count)")
+    args = parser.parse_args()
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        listener.bind(("0.0.0.0", 80))
+    except PermissionError:
+        sys.exit("Binding port 80 for host discovery needs root or CAP_NET_BIND_SERVICE")
+    listener.listen(4096)
+
+    ports = list(range(1, args.ports + 1))
+    hosts = count_ips([args.cidr])
+    probes = hosts * (len(ports) + 1)  # discovery probe plus port probes per host
+    print(f"{hosts} hosts x {len(ports)} ports, {os.cpu_count()} CPUs, {args.engine} engine")
+    print(f"{'processes':>9} {'seconds':>9} {'probes/sec':>12} {'speedup':>8}")
+    baseline = None
+    processes = 1
+    try:
+        while processes <= args.max_processes:
+            start = time.perf_counter()
+            scan_network_multiprocess([args.cidr], ports, args.timeout, processes, engine=args.engine)
+            elapsed = time.perf_counter() - start
+            rate = probes / elapsed
+            baseline = baseline or rate
+            print(f"{processes:>9} {elapsed:>9.2f} {rate:>12.0f} {rate / baseline:>7.2f}x")
+            processes *= 2
+    finally:
+        listener.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare the memory held by scan results as lists and tuples and as a ScanResults.
+
+Builds the same synthetic result set (consecutive IPv4 hosts, each with a
+few open ports) both ways, measures it with tracemalloc, and reports the
+size of the binary results file.
+
+    python3 benchmarks/bench_results.py --hosts 1000000 --ports-per-host 3
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from ipaddress import IPv4Address
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from astra.results import ScanResults  # noqa: E402
+
+PORTS = [22, 80, 443, 3389, 8080, 8443]
+
+def synthetic_results(hosts: int, ports_per_host: int):
+    base = int(IPv4Address("10.0.0.0"))
+    for i in range(hosts):
+        ip = str(IPv4Address(base + i))
+        yield ip, PORTS[:ports_per_host]
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current, elapsed
+
+def build_lists(hosts: int, ports_per_host: int):
+    live_hosts, open_ports = [], []
+    for ip, ports in synthetic_results(hosts, ports_per_host):
+        live_hosts.append(ip)
+        open_ports.extend((ip, port) for port in ports)
+    return live_hosts, open_ports
+
+def build_results(hosts: int, ports_per_host: int):
+    results = ScanResults()
+    for ip, ports in synthetic_results(hosts, ports_per_host):
+        results.add_live_host(ip)
+        for port in ports:
+            results.add_open_port(ip, port)
+    results.live_host_count  # fold the buffered additions into the sorted arrays
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the memory use of Astra scan results")
+    parser.add_argument("--hosts", type=int, default=1000000, help="Number of live hosts (default: 1000000)")
+    parser.add_argument("--ports-per-host", type=int, default=3, choices=range(1, len(PORTS) + 1),
+                        help="Open ports per host (default: 3)")
+    args = parser.parse_args()
+
+    lists, lists_bytes, lists_time = measure(lambda: build_lists(args.hosts, args.ports_per_host))
+    del lists
+    results, results_bytes, results_time = measure(lambda: build_results(args.hosts, args.ports_per_host))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "results.bin")
+        results.save(path)
+        file_bytes = os.path.getsize(path)
+
+    print(f"{args.hosts} hosts, {args.hosts * args.ports_per_host} open ports")
+    print(f"{'store':<14}{'memory MB':>12}{'build s':>10}")
+    print(f"{'lists/tuples':<14}{lists_bytes / 1e6:>12.1f}{lists_time:>10.2f}")
+    print(f"{'ScanResults':<14}{results_bytes / 1e6:>12.1f}{results_time:>10.2f}")
+    print(f"binary file: {file_bytes / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
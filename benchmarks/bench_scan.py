@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""Offline scan benchmark against simulated hosts, with machine-readable results.
+
+Each profile describes a set of simulated hosts: how many are live, which
+ports are open, closed or filtered, and (netns backend only) the latency
+and packet loss on the path to them. Every scan engine and mode is run
+against each profile in a fresh process, reporting probes/sec, time to
+first result, peak RSS and peak open file descriptors. A second section
+times target generation (iter_ips) on its own.
+
+Backends (Linux only):
+  loopback  Hosts are 127.77.0.x addresses, served by listeners on the
+            loopback interface. No setup and no root needed unless port 80
+            (the liveness check) is privileged. No latency or loss, and dead
+            hosts refuse port 80 at once instead of timing out.
+  netns     Hosts live in a network namespace behind a veth pair; tc netem
+            adds latency and loss, and addresses with no host time out like
+            real dead hosts. Needs root, iproute2 and the sch_netem module.
+
+Filtered ports are listeners with a full accept queue, whose SYNs the
+kernel drops unanswered, so no firewall tooling is needed.
+
+    python3 benchmarks/bench_scan.py --profiles lan sparse --json results/bench.json
+    sudo python3 benchmarks/bench_scan.py --backend netns --engines thread async syn
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from astra.checkpoint import ScanPlan  # noqa: E402
+from astra.network import count_ips, iter_ips, scan_network  # noqa: E402
+from astra.report import ResultSink  # noqa: E402
+from astra.syn import raw_sockets_available  # noqa: E402
+
+PROFILES = {
+    # name: live hosts, addresses scanned, open/filtered ports, scanned port count, latency (ms), loss (%)
+    "lan": {"live": 60, "addresses": 64, "open": [22, 80, 443, 8080], "filtered": [], "ports": 1000,
+            "latency": 0, "loss": 0},
+    "sparse": {"live": 8, "addresses": 256, "open": [22, 80, 443], "filtered": [], "ports": 1000,
+               "latency": 0, "loss": 0},
+    "filtered": {"live": 15, "addresses": 16, "open": [80, 443], "filtered": [135, 139, 445], "ports": 1000,
+                 "latency": 0, "loss": 0},
+    "wan": {"live": 16, "addresses": 64, "open": [22, 80, 443], "filtered": [25], "ports": 1000,
+            "latency": 40, "loss": 0},
+    "lossy": {"live": 16, "addresses": 64, "open": [22, 80, 443], "filtered": [], "ports": 1000,
+              "latency": 20, "loss": 5},
+}
+
+NETNS = "astra-bench"
+HOST_VETH = "astra-b0"
+PEER_VETH = "astra-b1"
+NETNS_PREFIX = "10.213.0"
+NETNS_GATEWAY = "10.213.255.254"
+LOOPBACK_PREFIX = "127.77.0"
+
+def addresses_for(backend: str, profile: dict):
+    """Return the scanned CIDR (`addresses` IPs) and the addresses of its live hosts."""
+    prefix = NETNS_PREFIX if backend == "netns" else LOOPBACK_PREFIX
+    prefix_len = 32 - max(0, (profile["addresses"] - 1).bit_length())
+    # .0 is the network address, so live hosts start at .1
+    return f"{prefix}.0/{prefix_len}", [f"{prefix}.{i}" for i in range(1, profile["live"] + 1)]
+
+# Simulated hosts
+
+def serve(addresses, open_ports, filtered_ports):
+    """Listen on every host's open and filtered ports until stdin closes; accept and drop connections."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    selector = selectors.DefaultSelector()
+    keep = []
+    for address in addresses:
+        for port in open_ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, port))
+            sock.listen(4096)
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ)
+        for port in filtered_ports:
+            # Backlog 0 admits one connection; with it never accepted, further SYNs are dropped
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, port))
+            sock.listen(0)
+            filler = socket.create_connection((address, port), timeout=5)
+            keep.extend((sock, filler))
+    selector.register(sys.stdin, selectors.EVENT_READ)
+    print("ready", flush=True)
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is sys.stdin:
+                return
+            try:
+                conn, _ = key.fileobj.accept()
+                conn.close()
+            except BlockingIOError:
+                pass
+
+def start_hosts(backend: str, addresses, profile: dict) -> subprocess.Popen:
+    spec = json.dumps({"addresses": addresses, "open": profile["open"], "filtered": profile["filtered"]})
+    command = [sys.executable, os.path.abspath(__file__), "--serve", spec]
+    if backend == "netns":
+        command = ["ip", "netns", "exec", NETNS] + command
+    server = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              text=True)
+    if server.stdout.readline().strip() != "ready":
+        server.kill()
+        error = server.stderr.read().strip().splitlines()
+        raise RuntimeError(f"simulated hosts failed to start: {error[-1] if error else 'no output'}")
+    return server
+
+def stop_hosts(server: subprocess.Popen):
+    server.stdin.close()
+    server.wait(timeout=10)
+
+def _run(command, input: str = None):
+    process = subprocess.run(command, input=input, text=True, capture_output=True)
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(command[:3])} failed: {process.stderr.strip()}")
+
+def _ip(*args, input: str = None):
+    _run(["ip"] + list(args), input=input)
+
+def setup_netns(addresses, latency: float, loss: float):
+    """Create the namespace, move the hosts' addresses into it and shape the host side of the link."""
+    teardown_netns()
+    _ip("netns", "add", NETNS)
+    _ip("link", "add", HOST_VETH, "type", "veth", "peer", "name", PEER_VETH)
+    _ip("link", "set", PEER_VETH, "netns", NETNS)
+    _ip("addr", "add", f"{NETNS_GATEWAY}/16", "dev", HOST_VETH)
+    _ip("link", "set", HOST_VETH, "up")
+    batch = "".join(f"addr add {address}/32 dev {PEER_VETH}\n" for address in addresses)
+    batch += f"link set {PEER_VETH} up\nlink set lo up\nroute add default dev {PEER_VETH}\n"
+    _ip("-n", NETNS, "-batch", "-", input=batch)
+    if latency or loss:
+        # Added on the probe direction only, so the round trip grows by `latency`
+        _run(["tc", "qdisc", "add", "dev", HOST_VETH, "root", "netem", "delay", f"{latency}ms", "loss", f"{loss}%"])
+
+def teardown_netns():
+    # Deleting the namespace also deletes the veth pair
+    subprocess.run(["ip", "netns", "del", NETNS], capture_output=True)
+    subprocess.run(["ip", "link", "del", HOST_VETH], capture_output=True)
+
+# Measurement, run in a fresh process per scan so peak RSS is its own
+
+class FirstResultSink(ResultSink):
+    def __init__(self):
+        self.first_result_at = None
+
+    def add_open_port(self, ip: str, port: int):
+        if self.first_result_at is None:
+            self.first_result_at = time.perf_counter()
+
+class CountingPlan(ScanPlan):
+    """Count finished discovery and port probes (retries not included)."""
+
+    def __init__(self, ports):
+        super().__init__(ports)
+        self.probes = 0
+        self._lock = threading.Lock()
+
+    def host_done(self, ip: str, alive: bool):
+        with self._lock:
+            self.probes += 1
+
+    def port_done(self, ip: str, port: int, is_open: bool):
+        with self._lock:
+            self.probes += 1
+
+class FDSampler(threading.Thread):
+    """Track the peak number of open file descriptors of this process."""
+
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.baseline = self.peak = self._count()
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _count() -> int:
+        return len(os.listdir("/proc/self/fd"))
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, self._count())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak - self.baseline
+
+def run_scan(spec: dict) -> dict:
+    ports = spec["ports"]
+    plan = CountingPlan(ports)
+    sink = FirstResultSink()
+    sampler = FDSampler()
+    sampler.start()
+    start = time.perf_counter()
+    results = scan_network(iter_ips([spec["cidr"]]), ports, spec["timeout"], spec["engine"], spec["concurrency"],
+                           sink, spec["pipeline"], plan=plan)
+    elapsed = time.perf_counter() - start
+    peak_fds = sampler.stop()
+    return {
+        "probes": plan.probes,
+        "seconds": round(elapsed, 3),
+        "probes_per_sec": round(plan.probes / elapsed, 1) if elapsed else None,
+        "first_result": round(sink.first_result_at - start, 3) if sink.first_result_at else None,
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_fds": peak_fds,
+        "live_found": results.live_host_count,
+        "open_found": results.open_port_count,
+    }
+
+def measure_scan(spec: dict) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", json.dumps(spec)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+def bench_targets(count: int) -> list:
+    """Time lazy target generation over a /8, in order and permuted."""
+    rows = []
+    for seed in (None, 1):
+        start = time.perf_counter()
+        generated = sum(1 for _ in iter_ips(["10.0.0.0/8"], max_ips=count, seed=seed))
+        elapsed = time.perf_counter() - start
+        # Memory is traced on a shorter run, as tracing slows generation down; it should not grow with count
+        tracemalloc.start()
+        sum(1 for _ in iter_ips(["10.0.0.0/8"], max_ips=count // 10, seed=seed))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rows.append({"order": "sequential" if seed is None else "permuted", "ips": generated,
+                     "seconds": round(elapsed, 3), "ips_per_sec": round(generated / elapsed),
+                     "peak_traced_kib": peak // 1024})
+    return rows
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Astra scan engines against simulated hosts")
+    parser.add_argument("--backend", choices=["loopback", "netns"], default="loopback",
+                        help="Where the simulated hosts live (default: loopback)")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), help="Profiles to run (default: all "
+                        "that the backend supports)")
+    parser.add_argument("--engines", nargs="+", choices=["thread", "async", "syn"],
+                        help="Engines to run (default: thread and async, plus syn when raw sockets are available)")
+    parser.add_argument("--ports", type=int, help="Ports to scan per host, starting at 1 (default: per profile)")
+    parser.add_argument("--timeout", type=float, default=0.5, help="Probe timeout in seconds (default: 0.5)")
+    parser.add_argument("--concurrency", type=int, help="Async/SYN concurrency (default: engine default)")
+    parser.add_argument("--target-count", type=int, default=1000000,
+                        help="IPs to generate in the target generation benchmark (default: 1000000)")
+    parser.add_argument("--json", metavar="FILE", help="Write the results as JSON to FILE")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        spec = json.loads(args.serve)
+        serve(spec["addresses"], spec["open"], spec["filtered"])
+        return
+    if args.run:
+        print(json.dumps(run_scan(json.loads(args.run))))
+        return
+
+    if not sys.platform.startswith("linux"):
+        sys.exit("This benchmark needs Linux")
+    if args.backend == "netns" and os.geteuid() != 0:
+        sys.exit("The netns backend needs root")
+    engines = args.engines or ["thread", "async"] + (["syn"] if raw_sockets_available() else [])
+    report = {"timestamp": datetime.now().isoformat(), "commit": git_commit(), "python": platform.python_version(),
+              "platform": platform.platform(), "backend": args.backend, "timeout": args.timeout,
+              "scans": [], "targets": []}
+
+    print(f"{'profile':<9} {'engine':<7} {'mode':<9} {'probes':>8} {'probes/s':>9} {'first':>7} {'seconds':>8} "
+          f"{'RSS MiB':>8} {'fds':>5} {'open':>9}")
+    for name in args.profiles or sorted(PROFILES):
+        profile = PROFILES[name]
+        if args.backend == "loopback" and (profile["latency"] or profile["loss"]):
+            print(f"{name:<9} skipped: latency and loss need --backend netns")
+            report["scans"].append({"profile": name, "skipped": "latency and loss need the netns backend"})
+            continue
+        cidr, addresses = addresses_for(args.backend, profile)
+        ports = list(range(1, (args.ports or profile["ports"]) + 1))
+        expected = profile["live"] * len(set(profile["open"]) & set(ports))
+        try:
+            if args.backend == "netns":
+                setup_netns(addresses, profile["latency"], profile["loss"])
+            server = start_hosts(args.backend, addresses, profile)
+        except RuntimeError as e:
+            # e.g. port 80 needs root or CAP_NET_BIND_SERVICE, or the kernel lacks sch_netem
+            if args.backend == "netns":
+                teardown_netns()
+            print(f"{name:<9} skipped: {e}")
+            report["scans"].append({"profile": name, "skipped": str(e)})
+            continue
+        try:
+            for engine in engines:
+                for pipeline in ([False] if engine == "syn" else [False, True]):
+                    spec = {"cidr": cidr, "ports": ports, "timeout": args.timeout, "engine": engine,
+                            "concurrency": args.concurrency, "pipeline": pipeline}
+                    row = {"profile": name, "engine": engine, "pipeline": pipeline, "addresses": profile["addresses"],
+                           "live": profile["live"], "ports": len(ports), "latency_ms": profile["latency"],
+                           "loss_pct": profile["loss"], "open_expected": expected}
+                    row.update(measure_scan(spec))
+                    report["scans"].append(row)
+                    first = f"{row['first_result']:.2f}s" if row["first_result"] is not None else "-"
+                    print(f"{name:<9} {engine:<7} {'pipeline' if pipeline else 'phased':<9} {row['probes']:>8} "
+                          f"{row['probes_per_sec']:>9.0f} {first:>7} {row['seconds']:>8.2f} "
+                          f"{row['peak_rss_kib'] / 1024:>8.1f} {row['peak_fds']:>5} "
+                          f"{row['open_found']:>4}/{expected:<4}")
+        finally:
+            stop_hosts(server)
+            if args.backend == "netns":
+                teardown_netns()
+
+    print(f"\n{'targets':<11} {'IPs':>9} {'seconds':>8} {'IPs/sec':>10} {'traced KiB':>11}")
+    for row in bench_targets(args.target_count):
+        report["targets"].append(row)
+        print(f"{row['order']:<11} {row['ips']:>9} {row['seconds']:>8.2f} {row['ips_per_sec']:>10} "
+              f"{row['peak_traced_kib']:>11}")
+    # count_ips is arithmetic only; recorded so a regression to iterating shows up
+    start = time.perf_counter()
+    count_ips(["10.0.0.0/8"])
+    report["count_ips_seconds"] = round(time.perf_counter() - start, 6)
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import asyncio
+import socket
+import unittest
+from astra.async_engine import _connect, _run_probes
+
+def closed_port() -> int:
+    """Return a loopback port with nothing listening on it."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+class TestAsyncEngine(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.open_port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_connect_open(self):
+        self.assertTrue(asyncio.run(_connect("127.0.0.1", self.open_port, 1.0)))
+
+    def test_connect_closed(self):
+        self.assertFalse(asyncio.run(_connect("127.0.0.1", closed_port(), 1.0)))
+
+    def test_run_probes_reports_every_task(self):
+        closed = closed_port()
+        results = {}
+        tasks = [("127.0.0.1", self.open_port), ("127.0.0.1", closed)]
+        probe = lambda ip, port: _connect(ip, port, 1.0)
+        asyncio.run(_run_probes(tasks, probe, 8, lambda ip, port, ok: results.__setitem__(port, ok)))
+        self.assertEqual(results, {self.open_port: True, closed: False})
+
+if __name__ == "__main__":
+    unittest.main()
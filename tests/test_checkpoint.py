@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from astra.checkpoint import Checkpoint, ScanPlan, diff_results, plan_incremental
+from astra.network import iter_ips, scan_network
+from astra.parallel import scan_network_multiprocess
+from astra.report import ResultSink
+from astra.results import ScanResults
+
+class Interrupted(Exception):
+    pass
+
+class FakeNetwork:
+    """Stand-in probes: hosts .1-.3 are up with ports 22 and 443 open; can fail after `limit` port probes."""
+
+    def __init__(self, limit: int = None):
+        self.limit = limit
+        self.hosts = []
+        self.ports = []
+        self._lock = threading.Lock()
+
+    def is_host_alive(self, ip, timeout):
+        with self._lock:
+            self.hosts.append(ip)
+        return ip.endswith((".1", ".2", ".3"))
+
+    def scan_port(self, ip, port, timeout):
+        with self._lock:
+            if self.limit is not None and len(self.ports) >= self.limit:
+                raise Interrupted()
+            self.ports.append((ip, port))
+        return port in (22, 443)
+
+class RecordingSink(ResultSink):
+    def __init__(self):
+        self.hosts = []
+        self.ports = []
+
+    def add_live_host(self, ip):
+        self.hosts.append(ip)
+
+    def add_open_port(self, ip, port):
+        self.ports.append((ip, port))
+
+class TestCheckpoint(unittest.TestCase):
+    ports = list(range(1000))
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "results.json.state")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def scan(self, network, plan, sink=None):
+        with patch("astra.network.is_host_alive", side_effect=network.is_host_alive), \
+                patch("astra.network.scan_port", side_effect=network.scan_port):
+            return scan_network(iter_ips(["10.0.0.0/29"]), self.ports, 0.1, sink=sink, plan=plan)
+
+    def test_resume_skips_finished_work(self):
+        first = FakeNetwork(limit=1500)
+        checkpoint = Checkpoint(self.path, self.ports, block_size=100)
+        with self.assertRaises(Interrupted):
+            self.scan(first, checkpoint)
+        checkpoint.close()
+
+        second = FakeNetwork()
+        checkpoint = Checkpoint(self.path, self.ports, block_size=100, resume=True)
+        sink = RecordingSink()
+        resumed = checkpoint.replay(sink)
+        results = self.scan(second, checkpoint, sink)
+        checkpoint.close(remove=True)
+
+        # Only live hosts with unfinished blocks were probed again, and no finished block was
+        self.assertNotIn("10.0.0.0", second.hosts)
+        self.assertLess(len(second.ports), 3 * 1000 - 1000)
+        self.assertEqual(len(first.ports) + len(second.ports) - len(set(first.ports) & set(second.ports)), 3000)
+        expected = {(f"10.0.0.{i}", port) for i in (1, 2, 3) for port in (22, 443)}
+        self.assertEqual(sorted(sink.ports), sorted(expected))
+        self.assertEqual(list(results.merge(resumed).open_ports()), sorted(expected))
+        self.assertEqual(sorted(sink.hosts), ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_replay_waits_for_rediscovery(self):
+        first = FakeNetwork(limit=1500)
+        checkpoint = Checkpoint(self.path, self.ports, block_size=100)
+        with self.assertRaises(Interrupted):
+            self.scan(first, checkpoint)
+        checkpoint.close()
+
+        checkpoint = Checkpoint(self.path, self.ports, block_size=100, resume=True)
+        partial = {ip for ip in checkpoint.finished if checkpoint._needs_scan(ip)}
+        self.assertTrue(partial)
+        sink = RecordingSink()
+        resumed = checkpoint.replay(sink)
+        self.assertFalse(partial & {ip for ip, _ in sink.ports})
+        # Hosts that were part-way through their ports are down now
+        second = FakeNetwork()
+        second.is_host_alive = lambda ip, timeout: ip.endswith((".1", ".2", ".3")) and ip not in partial
+        self.scan(second, checkpoint, sink)
+        checkpoint.close()
+        self.assertFalse(partial & {ip for ip, _ in sink.ports})
+        self.assertFalse(partial & {ip for ip, _ in resumed.open_ports()})
+
+    def test_resume_rejects_different_ports(self):
+        Checkpoint(self.path, self.ports).close()
+        with self.assertRaises(ValueError):
+            Checkpoint(self.path, [80, 443], resume=True)
+
+    def test_multiprocess_records_reach_the_log(self):
+        network = FakeNetwork()
+        checkpoint = Checkpoint(self.path, [22, 80, 443], block_size=2)
+        with patch("astra.network.is_host_alive", side_effect=network.is_host_alive), \
+                patch("astra.network.scan_port", side_effect=network.scan_port):
+            scan_network_multiprocess(["10.0.0.0/29"], [22, 80, 443], 0.1, 2, plan=checkpoint)
+        checkpoint.close()
+        with open(self.path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(sum(record["type"] == "host" for record in records), 8)
+        blocks = [record for record in records if record["type"] == "block"]
+        self.assertEqual(len(blocks), 3 * 2)
+        self.assertEqual(sorted(port for record in blocks for port in record["open"]), [22, 22, 22, 443, 443, 443])
+
+class TestIncremental(unittest.TestCase):
+    previous = {
+        "cidr_ranges": ["10.0.0.0/29"],
+        "live_hosts": ["10.0.0.3", "192.168.0.1"],
+        "open_ports": [{"ip": "10.0.0.3", "port": 8080}, {"ip": "10.0.0.3", "port": 22},
+                       {"ip": "192.168.0.1", "port": 22}],
+    }
+
+    def test_new_ranges_and_known_open_ports_come_first(self):
+        cidr_ranges, first_hosts, first_ports = plan_incremental(self.previous, ["10.0.0.0/29", "10.0.1.0/30"])
+        self.assertEqual(cidr_ranges, ["10.0.1.0/30", "10.0.0.0/29"])
+        self.assertEqual(first_hosts, ["10.0.0.3"])
+        plan = ScanPlan([21, 22, 80, 8080], first_hosts, first_ports)
+        self.assertEqual(list(plan.targets(["10.0.0.1", "10.0.0.3", "10.0.0.4"])), ["10.0.0.3", "10.0.0.1", "10.0.0.4"])
+        self.assertEqual(plan.ports_for("10.0.0.3"), [8080, 22, 21, 80])
+        self.assertEqual(plan.ports_for("10.0.0.1"), [21, 22, 80, 8080])
+
+    def test_diff_only_counts_covered_ports_as_closed(self):
+        _, first_hosts, _ = plan_incremental(self.previous, ["10.0.0.0/29"])
+        results = ScanResults.from_lists(["10.0.0.3", "10.0.0.5"], [("10.0.0.3", 443), ("10.0.0.5", 22)])
+        opened, closed = diff_results(self.previous, first_hosts, [22, 443], results)
+        self.assertEqual(opened, [("10.0.0.3", 443), ("10.0.0.5", 22)])
+        # 8080 was not scanned and 192.168.0.1 is outside the ranges, so neither counts as closed
+        self.assertEqual(closed, [("10.0.0.3", 22)])
+
+if __name__ == "__main__":
+    unittest.main()
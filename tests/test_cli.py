@@ -0,0 +1,27 @@
+import contextlib
+import io
+import unittest
+from unittest.mock import patch
+from astra.cli import parse_args
+
+def parse(*argv: str):
+    with patch("sys.argv", ["astra", *argv]):
+        return parse_args()
+
+class TestParseArgs(unittest.TestCase):
+    def test_syn_selects_the_syn_engine(self):
+        self.assertEqual(parse("--cidr", "10.0.0.0/30", "--syn").engine, "syn")
+
+    def test_daemon_rejects_syn(self):
+        with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+            parse("--daemon", "--syn")
+
+    def test_discovery_race_is_opt_in(self):
+        self.assertIsNone(parse("--cidr", "10.0.0.0/30").discovery)
+        self.assertEqual(parse("--cidr", "10.0.0.0/30", "--discovery", "tcp,icmp").discovery, ["tcp", "icmp"])
+        for flags in (["--discovery-ports", "22"], ["--discovery", "tcp", "--skip-discovery"]):
+            with self.assertRaises(SystemExit), contextlib.redirect_stderr(io.StringIO()):
+                parse("--cidr", "10.0.0.0/30", *flags)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import json
+import os
+import socket
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from unittest.mock import patch
+from astra.daemon import ScanDaemon, parse_job, submit
+from astra.scanner import Scanner
+
+def fake_is_host_alive(ip, timeout):
+    return ip.endswith((".1", ".2"))
+
+def fake_scan_port(ip, port, timeout):
+    return port == 443
+
+class TestParseJob(unittest.TestCase):
+    def test_valid_jobs(self):
+        self.assertEqual(parse_job({"targets": "10.0.0.0/24, example.com", "ports": "22,443", "seed": 3}),
+                         {"targets": ["10.0.0.0/24", "example.com"], "ports": [22, 443], "seed": 3})
+        self.assertEqual(parse_job({"targets": ["10.0.0.1"], "ports": [80], "timeout": 1}),
+                         {"targets": ["10.0.0.1"], "ports": [80], "timeout": 1})
+        self.assertEqual(parse_job({"targets": "10.0.0.0/24", "ports": [80], "exclude": "10.0.0.1,10.0.0.64/26"}),
+                         {"targets": ["10.0.0.0/24"], "ports": [80], "exclude": ["10.0.0.1", "10.0.0.64/26"]})
+
+    def test_invalid_jobs(self):
+        for job in ([], {"ports": [80]}, {"targets": ["10.0.0.1"]}, {"targets": ["10.0.0.1"], "ports": [70000]},
+                    {"targets": ["10.0.0.1"], "ports": "a"}, {"targets": ["10.0.0.1"], "ports": [80], "engine": "syn"},
+                    {"targets": ["10.0.0.1"], "ports": [80], "max_ips": True},
+                    {"targets": ["10.0.0.1"], "ports": [80], "exclude": ["example.com"]}):
+            with self.assertRaises(ValueError):
+                parse_job(job)
+
+@patch("astra.network.scan_port", side_effect=fake_scan_port)
+@patch("astra.network.is_host_alive", side_effect=fake_is_host_alive)
+class TestScanDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.daemon = ScanDaemon(Scanner(workers=8, timeout=0.1), max_jobs=1)
+
+    def tearDown(self):
+        self.daemon.close()
+        self.daemon.scanner.close()
+        self.tmpdir.cleanup()
+
+    def test_unix_socket_jobs(self, *_):
+        path = os.path.join(self.tmpdir.name, "astrad.sock")
+        self.daemon.serve_unix(path)
+        records = list(submit({"targets": ["10.0.0.0/29"], "ports": [22, 443]}, path))
+        self.assertEqual(records[0], {"type": "job", "id": 1, "ahead": 0})
+        self.assertEqual(sorted(record["ip"] for record in records if record["type"] == "host"),
+                         ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(sorted((r["ip"], r["port"]) for r in records if r["type"] == "port"),
+                         [("10.0.0.1", 443), ("10.0.0.2", 443)])
+        self.assertEqual(records[-1]["type"], "done")
+        self.assertEqual((records[-1]["live_hosts"], records[-1]["open_ports"]), (2, 2))
+        self.assertEqual(list(submit({"targets": ["10.0.0.1"]}, path))[0]["type"], "error")
+        self.assertEqual(list(submit({"command": "status"}, path)), [{"type": "status", "jobs": []}])
+
+    def test_socket_path_is_only_replaced_when_stale(self, *_):
+        path = os.path.join(self.tmpdir.name, "astrad.sock")
+        # A socket left behind by a daemon that exited
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        self.daemon.serve_unix(path)
+        other = ScanDaemon(self.daemon.scanner)
+        try:
+            with self.assertRaises(OSError):
+                other.serve_unix(path)
+            self.assertEqual(list(submit({"command": "status"}, path)), [{"type": "status", "jobs": []}])
+            regular = os.path.join(self.tmpdir.name, "results.json")
+            with open(regular, "w") as f:
+                f.write("{}")
+            with self.assertRaises(OSError):
+                other.serve_unix(regular)
+            self.assertTrue(os.path.isfile(regular))
+        finally:
+            other.close()
+
+    def test_http_jobs(self, *_):
+        server = self.daemon.serve_http(0)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        request = urllib.request.Request(f"{url}/scans", json.dumps({"targets": "10.0.0.2", "ports": "443"}).encode())
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(response.headers["Content-Type"], "application/x-ndjson")
+            records = [json.loads(line) for line in response]
+        self.assertEqual([record["type"] for record in records], ["job", "host", "port", "done"])
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(urllib.request.Request(f"{url}/scans", b"{}"))
+        self.assertEqual(error.exception.code, 400)
+        with urllib.request.urlopen(f"{url}/jobs") as response:
+            self.assertEqual(json.load(response), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import socket
+import tempfile
+import unittest
+from ipaddress import IPv4Network
+from unittest.mock import MagicMock, patch
+from astra.discovery import Discovery, NeighbourTable, icmp_available, on_link_networks
+from astra.network import scan_network
+
+ROUTES = """Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT
+eth0\t00000000\t0101A8C0\t0003\t0\t0\t0\t00000000\t0\t0\t0
+eth0\t0001A8C0\t00000000\t0001\t0\t0\t0\t00FFFFFF\t0\t0\t0
+eth1\t0000000A\t00000000\t0000\t0\t0\t0\t000000FF\t0\t0\t0
+"""
+
+NEIGHBOURS = """IP address       HW type     Flags       HW address            Mask     Device
+192.168.1.1      0x1         0x2         aa:bb:cc:dd:ee:ff     *        eth0
+192.168.1.9      0x1         0x0         00:00:00:00:00:00     *        eth0
+"""
+
+def closed_port() -> int:
+    """Return a loopback port with nothing listening on it."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def fake_scan_port(ip, port, timeout):
+    return port == 443
+
+class TestDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.open_port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_open_or_refused_port_means_up(self):
+        for port in (self.open_port, closed_port()):
+            alive, elapsed = Discovery([port], ["tcp"]).probe("127.0.0.1", 1.0)
+            self.assertTrue(alive)
+            self.assertLess(elapsed, 1.0)
+
+    def test_probe_async(self):
+        discovery = Discovery([closed_port(), self.open_port], ["tcp"])
+        alive, _ = asyncio.run(discovery.probe_async("127.0.0.1", 1.0))
+        self.assertTrue(alive)
+
+    def test_no_probes_means_down(self):
+        discovery = Discovery([80], [])
+        self.assertEqual(discovery.probe_count("127.0.0.1"), 0)
+        self.assertFalse(discovery.probe("127.0.0.1", 1.0)[0])
+        self.assertEqual(discovery.describe(), "no probes available")
+
+    def test_skip(self):
+        discovery = Discovery(skip=True)
+        self.assertEqual(discovery.probe("192.0.2.1", 1.0), (True, 0.0))
+
+    def test_icmp_reply_with_ip_header(self):
+        reply = bytes([0, 0, 0, 0, 0, 0, 0, 1])
+        header = bytes([0x45]) + bytes(19)
+        sock = MagicMock(family=socket.AF_INET)
+        for data in (reply, header + reply):
+            sock.recv.return_value = data
+            self.assertTrue(Discovery._answer(sock, "icmp"))
+        # An echo request looped back to us is not an answer
+        sock.recv.return_value = header + bytes([8]) + reply[1:]
+        self.assertIsNone(Discovery._answer(sock, "icmp"))
+
+    @unittest.skipUnless(icmp_available(), "ping sockets are not permitted")
+    def test_icmp_echo(self):
+        self.assertTrue(Discovery([], ["icmp"]).probe("127.0.0.1", 1.0)[0])
+
+class TestKernelTables(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, name: str, text: str) -> str:
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_on_link_networks(self):
+        # Skips the default route and routes that are down
+        self.assertEqual(on_link_networks(self.write("route", ROUTES)), [IPv4Network("192.168.1.0/24")])
+        self.assertEqual(on_link_networks(os.path.join(self.tmpdir.name, "missing")), [])
+
+    def test_neighbour_table(self):
+        table = NeighbourTable(self.write("arp", NEIGHBOURS))
+        self.assertTrue(table.resolved("192.168.1.1"))
+        # Incomplete entries are still being resolved, or failed
+        self.assertFalse(table.resolved("192.168.1.9"))
+        self.assertFalse(table.resolved("192.168.1.2"))
+
+@patch("astra.network.scan_port", side_effect=fake_scan_port)
+class TestScanWithDiscovery(unittest.TestCase):
+    def test_live_hosts_come_from_discovery(self, _):
+        with patch.object(Discovery, "probe", side_effect=lambda ip, timeout, metrics=None: (ip.endswith(".1"), 0.01)):
+            for pipeline in (False, True):
+                results = scan_network(["10.0.0.1", "10.0.0.2"], [22, 443], 0.1, pipeline=pipeline,
+                                       discovery=Discovery([80], ["tcp"]))
+                self.assertEqual(list(results.live_hosts()), ["10.0.0.1"])
+                self.assertEqual(list(results.open_ports()), [("10.0.0.1", 443)])
+
+    def test_skip_discovery_scans_every_target(self, _):
+        with patch.object(Discovery, "probe") as probe:
+            results = scan_network(["10.0.0.1", "10.0.0.2"], [443], 0.1, discovery=Discovery(skip=True))
+        probe.assert_not_called()
+        self.assertEqual(sorted(results.live_hosts()), ["10.0.0.1", "10.0.0.2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+from unittest.mock import patch
+from astra.metrics import MetricsServer, ScanMetrics, StatsWriter, format_eta
+from astra.network import CLOSED, FILTERED, OPEN, StageProgress, scan_network
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestScanMetrics(unittest.TestCase):
+    def test_phases_rate_and_eta(self):
+        clock = FakeClock()
+        metrics = ScanMetrics(clock)
+        metrics.expect("Discovery", 100)
+        stage = StageProgress("Discovery", "live", metrics=metrics)
+        metrics.snapshot()
+        clock.now += 2
+        for i in range(40):
+            stage.advance(i % 4 == 0)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["phase"], "discovery")
+        self.assertEqual(snapshot["probes_per_sec"], 20.0)
+        self.assertEqual(snapshot["eta_seconds"], 3.0)
+        self.assertEqual(snapshot["phases"]["discovery"]["hits"], 10)
+        clock.now += 1
+        stage.log(final=True)
+        snapshot = metrics.snapshot()
+        self.assertIsNone(snapshot["phase"])
+        self.assertEqual(snapshot["phases"]["discovery"]["duration"], 3.0)
+        self.assertTrue(snapshot["phases"]["discovery"]["finished"])
+
+    def test_outcomes_and_latency(self):
+        metrics = ScanMetrics()
+        for outcome, latency in ((OPEN, 0.003), (CLOSED, 0.2), (FILTERED, 1.0), (OPEN, 9.0)):
+            metrics.probe_started()
+            metrics.probe_finished(outcome, latency)
+        metrics.probe_started()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["in_flight"], 1)
+        self.assertEqual(snapshot["outcomes"], {"open": 2, "closed": 1, "filtered": 1, "error": 0})
+        # Timeouts are not connect latencies; 9s is beyond the last bucket and only counts towards +Inf
+        self.assertEqual(snapshot["connect_latency"]["count"], 3)
+        self.assertEqual(snapshot["connect_latency"]["buckets"]["0.005"], 1)
+        self.assertEqual(snapshot["connect_latency"]["buckets"]["0.25"], 1)
+        self.assertEqual(sum(snapshot["connect_latency"]["buckets"].values()), 2)
+
+    def test_prometheus_format(self):
+        metrics = ScanMetrics()
+        stage = StageProgress("Port scan", "open", metrics=metrics, total=10)
+        stage.advance(True)
+        metrics.probe_started()
+        metrics.probe_finished(OPEN, 0.02)
+        text = metrics.prometheus()
+        self.assertIn("# TYPE astra_probes_total counter", text)
+        self.assertIn('astra_probes_total{phase="port_scan"} 1', text)
+        self.assertIn('astra_phase_expected_probes{phase="port_scan"} 10', text)
+        self.assertIn('astra_probe_outcomes_total{outcome="open"} 1', text)
+        self.assertIn('astra_connect_latency_seconds_bucket{le="0.01"} 0', text)
+        self.assertIn('astra_connect_latency_seconds_bucket{le="0.025"} 1', text)
+        self.assertIn('astra_connect_latency_seconds_bucket{le="+Inf"} 1', text)
+        for line in text.splitlines():
+            if not line.startswith("#"):
+                float(line.rsplit(" ", 1)[1])
+
+    def test_merges_worker_states(self):
+        clock = FakeClock()
+        workers = [ScanMetrics(clock) for _ in range(2)]
+        for i, worker in enumerate(workers):
+            stage = StageProgress("Discovery", "live", metrics=worker)
+            for _ in range(5 * (i + 1)):
+                worker.probe_started()
+                worker.probe_finished(FILTERED)
+                stage.advance(False)
+        clock.now += 1
+        workers[0].end_phase("Discovery")
+        parent = ScanMetrics(clock)
+        parent.expect("Discovery", 50)
+        for i, worker in enumerate(workers):
+            parent.merge_worker(i, worker.state())
+        snapshot = parent.snapshot()
+        self.assertEqual(snapshot["phases"]["discovery"]["probed"], 15)
+        self.assertEqual(snapshot["phases"]["discovery"]["expected"], 50)
+        self.assertFalse(snapshot["phases"]["discovery"]["finished"])
+        self.assertEqual(snapshot["outcomes"]["filtered"], 15)
+
+    def test_format_eta(self):
+        self.assertEqual(format_eta(None), "unknown")
+        self.assertEqual(format_eta(75), "1m15s")
+        self.assertEqual(format_eta(7260), "2h01m")
+
+class TestMetricsOutputs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_stats_file_and_http_endpoint(self):
+        metrics = ScanMetrics()
+        path = os.path.join(self.tmpdir.name, "stats.json")
+
+        def probe_port(ip, port, timeout, limiter=None, metrics=None):
+            metrics.probe_started()
+            metrics.probe_finished(OPEN, 0.001)
+            return OPEN, 0.001
+
+        with patch("astra.network.probe_port", side_effect=probe_port):
+            writer = StatsWriter(metrics, path, interval=60)
+            scan_network(["10.0.0.1", "10.0.0.2"], [22, 80, 443], 0.1, metrics=metrics)
+            writer.close()
+        with open(path) as f:
+            stats = json.load(f)
+        self.assertEqual(stats["phases"]["discovery"]["probed"], 2)
+        self.assertEqual(stats["phases"]["port_scan"]["expected"], 6)
+        self.assertEqual(stats["phases"]["port_scan"]["hits"], 6)
+        self.assertEqual(stats["outcomes"]["open"], 8)
+        self.assertFalse(os.path.exists(f"{path}.tmp"))
+
+        server = MetricsServer(metrics, 0)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                self.assertIn('astra_hits_total{phase="port_scan"} 6', response.read().decode())
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/stats") as response:
+                self.assertEqual(json.load(response)["in_flight"], 0)
+        finally:
+            server.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import queue
+import unittest
+from unittest.mock import patch
+from astra import network
+from astra.parallel import WorkerFailed, _worker, scan_network_multiprocess
+from astra.report import ResultSink
+
+def fake_is_host_alive(ip, timeout):
+    return ip.endswith((".1", ".2"))
+
+def fake_scan_port(ip, port, timeout):
+    return port == 443
+
+class RecordingSink(ResultSink):
+    def __init__(self):
+        self.hosts = []
+        self.ports = []
+
+    def add_live_host(self, ip):
+        self.hosts.append(ip)
+
+    def add_open_port(self, ip, port):
+        self.ports.append((ip, port))
+
+@patch("astra.network.scan_port", side_effect=fake_scan_port)
+@patch("astra.network.is_host_alive", side_effect=fake_is_host_alive)
+class TestMultiprocess(unittest.TestCase):
+    # Workers are forked, so the patched probes carry over into them
+    def test_results_merged_from_all_workers(self, *_):
+        sink = RecordingSink()
+        live_hosts, open_ports = scan_network_multiprocess(["10.0.0.0/28"], [22, 443], 0.1, 3, sink=sink)
+        self.assertEqual(sorted(live_hosts), ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(sorted(open_ports), [("10.0.0.1", 443), ("10.0.0.2", 443)])
+        self.assertEqual(sorted(sink.hosts), sorted(live_hosts))
+        self.assertEqual(sorted(sink.ports), sorted(open_ports))
+
+    def test_limits_apply_before_partitioning(self, *_):
+        live_hosts, _ = scan_network_multiprocess(["10.0.0.0/28"], [443], 0.1, 4, max_ips=2)
+        self.assertEqual(sorted(live_hosts), ["10.0.0.1"])
+
+def failing_is_host_alive(ip, timeout):
+    if ip == "10.0.0.5":
+        raise RuntimeError("probe failed")
+    return fake_is_host_alive(ip, timeout)
+
+@patch("astra.network.scan_port", side_effect=fake_scan_port)
+@patch("astra.network.is_host_alive", side_effect=failing_is_host_alive)
+class TestWorkerFailure(unittest.TestCase):
+    def test_failed_worker_fails_the_scan(self, *_):
+        sink = RecordingSink()
+        with self.assertLogs(level="ERROR") as logs, self.assertRaises(WorkerFailed):
+            scan_network_multiprocess(["10.0.0.0/28"], [443], 0.1, 3, sink=sink)
+        self.assertIn("probe failed", "\n".join(logs.output))
+        # The other workers still finished their targets
+        self.assertIn("10.0.0.1", sink.hosts)
+
+class TestWorkerShards(unittest.TestCase):
+    def test_workers_only_generate_their_own_targets(self):
+        all_ips = list(network.iter_ips(["10.0.0.0/26"], seed=7, shard=(1, 2)))
+        to_ip = network._int_to_ip
+        stripes = []
+        for index in range(3):
+            converted = []
+
+            def record(value, version):
+                converted.append(value)
+                return to_ip(value, version)
+
+            def scan(targets, *args, **kwargs):
+                stripes.append(list(targets))
+
+            with patch("astra.network._int_to_ip", side_effect=record), \
+                    patch("astra.parallel.scan_network", side_effect=scan):
+                _worker(index, 3, ["10.0.0.0/26"], None, None, 7, (1, 2), [443], 0.1, {}, False, queue.Queue())
+            # Other workers' addresses are skipped by arithmetic, never generated
+            self.assertEqual(len(converted), len(stripes[-1]))
+        self.assertEqual(sorted(ip for stripe in stripes for ip in stripe), sorted(all_ips))
+        self.assertEqual(len(set().union(*stripes)), len(all_ips))
+
+if __name__ == "__main__":
+    unittest.main()
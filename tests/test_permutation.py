@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from astra.checkpoint import ScanPlan
+from astra.network import count_ips, filter_shard, iter_ips, scan_network
+from astra.permutation import Permutation, parse_shard
+from astra.report import merge_results, open_sink, read_results
+from astra.results import ScanResults
+
+class TestPermutation(unittest.TestCase):
+    def test_is_a_seeded_bijection(self):
+        for size in (1, 2, 7, 1000, 4097):
+            order = Permutation(size, 42)
+            self.assertEqual(sorted(order), list(range(size)))
+            self.assertEqual([order.index(value) for value in order], list(range(size)))
+        self.assertEqual(list(Permutation(1000, 1)), list(Permutation(1000, 1)))
+        self.assertNotEqual(list(Permutation(1000, 1)), list(Permutation(1000, 2)))
+        # Indexing a huge space needs no per-element state
+        self.assertLess(Permutation(1 << 64, 3)[12345], 1 << 64)
+
+    def test_scatters_neighbours(self):
+        order = list(Permutation(65536, 7))
+        jumps = sorted(abs(a - b) for a, b in zip(order, order[1:]))
+        self.assertGreater(jumps[len(jumps) // 2], 1000)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("1/4"), (0, 4))
+        self.assertEqual(parse_shard("4/4"), (3, 4))
+        for text in ("0/4", "5/4", "2", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+class TestShardedTargets(unittest.TestCase):
+    cidr_ranges = ["10.1.0.0/28", "10.0.0.0/30", "2001:db8::/126"]
+
+    def test_shards_are_disjoint_and_complete(self):
+        everything = sorted(iter_ips(self.cidr_ranges))
+        self.assertEqual(sorted(iter_ips(self.cidr_ranges, seed=9)), everything)
+        self.assertNotEqual(list(iter_ips(self.cidr_ranges, seed=9)), list(iter_ips(self.cidr_ranges)))
+        shards = [list(iter_ips(self.cidr_ranges, seed=9, shard=(i, 3))) for i in range(3)]
+        self.assertEqual(sorted(ip for shard in shards for ip in shard), everything)
+        self.assertEqual([len(shard) for shard in shards],
+                         [count_ips(self.cidr_ranges, shard=(i, 3)) for i in range(3)])
+        self.assertEqual(filter_shard(everything + ["192.0.2.1"], self.cidr_ranges, seed=9, shard=(1, 3)),
+                         sorted(shards[1]))
+
+    def test_port_tasks_visit_every_pair_once(self):
+        live = ScanResults.from_lists(["10.0.0.1", "10.0.0.2", "10.0.0.3"], [])
+        plan = ScanPlan(list(range(100)), first_hosts=["10.0.0.2"], first_ports={"10.0.0.2": [99, 5000]}, seed=3)
+        tasks = list(plan.port_tasks(live))
+        self.assertEqual(sorted(tasks), sorted((ip, port) for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3")
+                                               for port in range(100)))
+        same_host = sum(a[0] == b[0] for a, b in zip(tasks, tasks[1:]))
+        self.assertLess(same_host, len(tasks) // 2)
+        self.assertEqual(list(ScanPlan([22, 80]).port_tasks(live))[:2], [("10.0.0.1", 22), ("10.0.0.1", 80)])
+
+    def test_host_ports_shuffle_each_host(self):
+        plan = ScanPlan(list(range(100)), first_ports={"10.0.0.2": [99, 5000]}, seed=3)
+        first, second = plan.host_ports("10.0.0.1"), plan.host_ports("10.0.0.2")
+        self.assertEqual(sorted(first), list(range(100)))
+        self.assertNotEqual(first, list(range(100)))
+        # Previously open ports stay first; every host gets its own order
+        self.assertEqual(second[0], 99)
+        self.assertNotEqual(first[:10], second[1:11])
+        self.assertEqual(ScanPlan(list(range(100)), seed=3).host_ports("10.0.0.1"), first)
+        self.assertEqual(ScanPlan([22, 80]).host_ports("10.0.0.1"), [22, 80])
+
+    @patch("astra.network.is_host_alive", side_effect=lambda ip, timeout: True)
+    def test_pipelined_scan_uses_host_order(self, _):
+        probed = []
+        with patch("astra.network.scan_port", side_effect=lambda ip, port, timeout: probed.append(port)):
+            plan = ScanPlan(list(range(50)), seed=9)
+            scan_network(["10.0.0.1"], list(range(50)), 0.1, pipeline=True, plan=plan)
+        self.assertEqual(sorted(probed), list(range(50)))
+        self.assertNotEqual(probed, list(range(50)))
+
+class TestShardedScan(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_shard_results_merge_into_one_report(self):
+        cidr_ranges = ["10.0.0.0/28"]
+        ports = [22, 80, 443]
+        probed = []
+
+        def is_host_alive(ip, timeout):
+            probed.append(ip)
+            return int(ip.rsplit(".", 1)[1]) % 2 == 1
+
+        paths = []
+        with patch("astra.network.is_host_alive", side_effect=is_host_alive), \
+                patch("astra.network.scan_port", side_effect=lambda ip, port, timeout: port == 443):
+            for i in range(3):
+                path = os.path.join(self.tmpdir.name, f"shard{i}.bin")
+                with open_sink(path, "bin") as sink:
+                    sink.start("example", cidr_ranges)
+                    scan_network(iter_ips(cidr_ranges, seed=5, shard=(i, 3)), ports, 0.1, sink=sink,
+                                 plan=ScanPlan(ports, seed=5))
+                paths.append(path)
+
+        self.assertEqual(sorted(probed), sorted(iter_ips(cidr_ranges)))
+        merged = os.path.join(self.tmpdir.name, "merged.json")
+        merge_results(paths, merged, "json")
+        document = read_results(merged)
+        self.assertEqual(document["cidr_ranges"], cidr_ranges)
+        self.assertEqual(document["live_hosts"], [f"10.0.0.{i}" for i in range(1, 16, 2)])
+        self.assertEqual(document["open_ports"], [{"ip": f"10.0.0.{i}", "port": 443} for i in range(1, 16, 2)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+from astra.network import scan_network
+
+LIVE = {"10.0.0.1", "10.0.0.2"}
+OPEN = {("10.0.0.1", 22), ("10.0.0.2", 443)}
+
+def fake_is_host_alive(ip, timeout):
+    if ip not in LIVE:
+        time.sleep(timeout)  # dead hosts cost a full timeout
+        return False
+    return True
+
+def fake_scan_port(ip, port, timeout):
+    return (ip, port) in OPEN
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.ips = ["10.0.0.1", "10.0.0.2"] + [f"10.0.1.{i}" for i in range(100)]
+
+    @patch("astra.network.scan_port", side_effect=fake_scan_port)
+    @patch("astra.network.is_host_alive", side_effect=fake_is_host_alive)
+    def test_same_results_as_phased_scan(self, *_):
+        phased = scan_network(self.ips, [22, 80, 443], 0.01)
+        pipelined = scan_network(iter(self.ips), [22, 80, 443], 0.01, pipeline=True)
+        self.assertEqual(list(phased.live_hosts()), list(pipelined.live_hosts()))
+        self.assertEqual(list(phased.open_ports()), list(pipelined.open_ports()))
+
+    @patch("astra.network.is_host_alive", side_effect=fake_is_host_alive)
+    def test_ports_scanned_before_discovery_finishes(self, _):
+        first_port_at = []
+
+        def timed_scan_port(ip, port, timeout):
+            first_port_at.append(time.monotonic())
+            return fake_scan_port(ip, port, timeout)
+
+        with patch("astra.network.scan_port", side_effect=timed_scan_port):
+            start = time.monotonic()
+            live_hosts, open_ports = scan_network(self.ips, [22, 443], 0.2, pipeline=True, queue_size=1)
+            elapsed = time.monotonic() - start
+        self.assertEqual(sorted(open_ports), sorted(OPEN))
+        # Dead hosts keep discovery busy for >= 2 rounds of 0.2s; ports start well before that
+        self.assertLess(min(first_port_at) - start, 0.2)
+        self.assertGreaterEqual(elapsed, 0.4)
+
+    def test_every_host_gets_all_its_ports(self):
+        # Regression: each host's port tasks must stay bound to that host while later hosts are handed over
+        # (a generator expression reading `ip` late sent ports to whichever host arrived last).
+        # More ports than either engine keeps in flight, so a host's port tasks outlive other probes;
+        # queue_size=1 hands the hosts over one at a time.
+        ports = list(range(3000))
+        expected = {(ip, port) for ip in LIVE for port in ports}
+        probed = set()
+
+        def scan_port(ip, port, timeout):
+            probed.add((ip, port))
+            return fake_scan_port(ip, port, timeout)
+
+        async def check_host(ip, timeout, policy, limiter, metrics, discovery):
+            return ip in LIVE
+
+        async def check_port(ip, port, timeout, policy, limiter, metrics):
+            return scan_port(ip, port, timeout)
+
+        for queue_size in (1000, 1):
+            with self.subTest(engine="thread", queue_size=queue_size):
+                probed.clear()
+                with patch("astra.network.is_host_alive", side_effect=lambda ip, timeout: ip in LIVE), \
+                        patch("astra.network.scan_port", side_effect=scan_port):
+                    results = scan_network(self.ips, ports, 0.01, pipeline=True, queue_size=queue_size)
+                self.assertEqual(probed, expected)
+                self.assertEqual(sorted(results.open_ports()), sorted(OPEN))
+
+            with self.subTest(engine="async", queue_size=queue_size):
+                probed.clear()
+                with patch("astra.async_engine._check_host", side_effect=check_host), \
+                        patch("astra.async_engine._check_port", side_effect=check_port):
+                    results = scan_network(self.ips, ports, 0.01, engine="async", concurrency=100, pipeline=True,
+                                           queue_size=queue_size)
+                self.assertEqual(probed, expected)
+                self.assertEqual(sorted(results.open_ports()), sorted(OPEN))
+
+    def test_async_single_host_uses_all_port_workers(self):
+        in_flight = peak = 0
+
+        async def check_host(ip, timeout, policy, limiter, metrics, discovery):
+            return ip == "10.0.0.1"
+
+        async def check_port(ip, port, timeout, policy, limiter, metrics):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return port == 22
+
+        with patch("astra.async_engine._check_host", side_effect=check_host), \
+                patch("astra.async_engine._check_port", side_effect=check_port):
+            start = time.monotonic()
+            results = scan_network(["10.0.0.1"], list(range(200)), 0.01, engine="async", concurrency=100,
+                                   pipeline=True)
+            elapsed = time.monotonic() - start
+        self.assertEqual(list(results.open_ports()), [("10.0.0.1", 22)])
+        # 75 port workers (a quarter of the budget goes to discovery) all take ports of the one host
+        self.assertEqual(peak, 75)
+        self.assertLess(elapsed, 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
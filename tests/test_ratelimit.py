@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from astra.network import ERROR, FILTERED, OPEN, scan_network
+from astra.ratelimit import AIMDController, RateLimiter, TokenBucket
+
+class FaultInjector:
+    """Stand-in for probe_port on a link with limited capacity.
+
+    Drops a fixed `loss` fraction of probes, plus everything sent beyond
+    `capacity` probes/sec (measured over the last `span` seconds), the way an
+    overrun upstream link would.
+    """
+
+    def __init__(self, capacity: float, loss: float = 0.0, span: float = 0.2, seed: int = 1):
+        self.capacity = capacity
+        self.loss = loss
+        self.span = span
+        self.sent = []
+        self.dropped = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, ip, port, timeout, limiter=None, metrics=None):
+        if limiter is not None:
+            limiter.acquire()
+        with self._lock:
+            now = time.monotonic()
+            self.sent.append(now)
+            recent = sum(1 for t in self.sent[-int(self.capacity * self.span * 4):] if t > now - self.span)
+            overrun = recent > self.capacity * self.span
+            drop = overrun or self._rng.random() < self.loss
+            if drop:
+                self.dropped += 1
+        state = FILTERED if drop else OPEN
+        if limiter is not None:
+            limiter.release(state in (FILTERED, ERROR))
+        return state, 0.0
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate_is_enforced(self):
+        bucket = TokenBucket(200, burst=1)
+        start = time.monotonic()
+        for _ in range(41):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_burst_is_immediate(self):
+        bucket = TokenBucket(10, burst=5)
+        self.assertEqual([bucket.reserve() for _ in range(5)], [0.0] * 5)
+        self.assertGreater(bucket.reserve(), 0.0)
+
+class TestAIMD(unittest.TestCase):
+    def simulate(self, capacity, loss, rounds=200):
+        controller = AIMDController(TokenBucket(100), min_rate=10, max_rate=10000, increase=20, window=100)
+        rng = random.Random(7)
+        rates = []
+        for _ in range(rounds):
+            # Drop probability of a window sent at the current rate
+            overrun = max(0.0, 1 - capacity / controller.bucket.rate)
+            for _ in range(controller.window):
+                controller.record(rng.random() < loss + overrun)
+            rates.append(controller.bucket.rate)
+        return controller, rates
+
+    def test_converges_below_link_capacity(self):
+        controller, rates = self.simulate(capacity=1000, loss=0.0)
+        self.assertGreater(controller.backoffs, 0)
+        settled = rates[100:]
+        self.assertLess(max(settled), 1000 * 1.5)
+        self.assertGreater(sum(settled) / len(settled), 1000 * 0.4)
+
+    def test_constant_loss_does_not_force_backoff(self):
+        controller, rates = self.simulate(capacity=1e9, loss=0.6, rounds=50)
+        self.assertEqual(controller.backoffs, 0)
+        self.assertGreater(rates[-1], rates[0])
+
+    def test_limiter_survives_pickling(self):
+        import pickle
+        limiter = pickle.loads(pickle.dumps(RateLimiter(500, adaptive=True, max_rate=800)))
+        self.assertEqual((limiter.rate, limiter.controller.max_rate), (500, 800))
+        self.assertEqual(limiter.split(2).rate, 250)
+
+class TestRateLimitedScan(unittest.TestCase):
+    def test_adaptive_scan_backs_off_on_overrun_link(self):
+        injector = FaultInjector(capacity=300, loss=0.05)
+        limiter = RateLimiter(3000, adaptive=True, min_rate=50)
+        with patch("astra.network.probe_port", side_effect=injector):
+            live_hosts, open_ports = scan_network(["10.0.0.1"], list(range(1500)), 0.01, limiter=limiter)
+        self.assertEqual(live_hosts, ["10.0.0.1"])
+        self.assertGreater(limiter.controller.backoffs, 0)
+        self.assertLess(limiter.rate, 3000)
+        self.assertEqual(limiter.in_flight, 0)
+        # One discovery probe (answered) plus one per port, each either open or dropped
+        self.assertEqual(len(injector.sent), 1 + 1500)
+        self.assertEqual(len(open_ports) + injector.dropped, 1500)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+from astra.report import load_results, open_sink, save_results
+
+class TestReport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "results")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_ndjson_stream_is_flushed_before_close(self):
+        sink = open_sink(self.path, "ndjson", flush_every=1)
+        sink.start("example", ["192.168.1.0/30"])
+        sink.add_live_host("192.168.1.1")
+        sink.add_open_port("192.168.1.1", 443)
+        results = load_results(self.path)
+        sink.close()
+        self.assertEqual(results["live_hosts"], ["192.168.1.1"])
+        self.assertEqual(results["open_ports"], [{"ip": "192.168.1.1", "port": 443}])
+
+    def test_json_document_derived_from_journal(self):
+        save_results("example", ["192.168.1.0/30"], ["192.168.1.1"], [("192.168.1.1", 80)], self.path, "json")
+        with open(self.path) as f:
+            results = json.load(f)
+        self.assertEqual(results["organization"], "example")
+        self.assertEqual(results["cidr_ranges"], ["192.168.1.0/30"])
+        self.assertEqual(results["live_hosts"], ["192.168.1.1"])
+        self.assertEqual(results["open_ports"], [{"ip": "192.168.1.1", "port": 80}])
+        self.assertFalse(os.path.exists(self.path + ".ndjson"))
+
+    def test_csv_rows(self):
+        save_results("example", [], ["192.168.1.1"], [("192.168.1.1", 22), ("192.168.1.1", 80)], self.path, "csv")
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "IP,Port\n192.168.1.1,22\n192.168.1.1,80\n")
+
+    def test_truncated_stream_is_readable(self):
+        with open(self.path, "w") as f:
+            f.write('{"type":"host","ip":"10.0.0.1"}\n{"type":"port","ip":"10.0.')
+        self.assertEqual(load_results(self.path)["live_hosts"], ["10.0.0.1"])
+
+if __name__ == "__main__":
+    unittest.main()
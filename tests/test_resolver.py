@@ -0,0 +1,122 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+import dns.message
+import dns.rcode
+import dns.rdataclass
+import dns.rdatatype
+import dns.rrset
+from astra.api import get_cidr_ranges_bulk, read_targets_file
+from astra.resolver import BulkResolver, DNSCache
+
+class StubDNSServer:
+    """UDP DNS server on loopback answering from a fixed zone, counting the queries it receives."""
+
+    ZONE = {
+        ("web.example.", "A"): ["192.0.2.1", "192.0.2.2"],
+        ("web.example.", "AAAA"): ["2001:db8::1"],
+        ("v4only.example.", "A"): ["192.0.2.3"],
+        ("short.example.", "A"): ["192.0.2.4"],
+    }
+    TTLS = {"short.example.": 1}
+    # Names that exist but may have no records of the queried type
+    NAMES = {"web.example.", "v4only.example.", "short.example."}
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            threading.Thread(target=self._answer, args=(data, addr), daemon=True).start()
+
+    def _answer(self, data, addr):
+        query = dns.message.from_wire(data)
+        question = query.question[0]
+        name, rtype = question.name.to_text(), dns.rdatatype.to_text(question.rdtype)
+        self.queries.append((name, rtype))
+        time.sleep(self.delay)
+        response = dns.message.make_response(query)
+        addresses = self.ZONE.get((name, rtype))
+        if addresses:
+            response.answer.append(dns.rrset.from_text_list(name, self.TTLS.get(name, 300), "IN", rtype, addresses))
+        else:
+            if name not in self.NAMES:
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            response.authority.append(dns.rrset.from_text(
+                "example.", 3600, "IN", "SOA", "ns.example. admin.example. 1 3600 600 86400 60"))
+        try:
+            self.sock.sendto(response.to_wire(), addr)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+class TestBulkResolver(unittest.TestCase):
+    def setUp(self):
+        self.server = StubDNSServer()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmpdir.name, "dns_cache.json")
+
+    def tearDown(self):
+        self.server.close()
+        self.tmpdir.cleanup()
+
+    def resolver(self, cache=True, **kwargs):
+        return BulkResolver(cache=DNSCache(self.cache_path) if cache else None, nameservers=["127.0.0.1"],
+                            port=self.server.port, timeout=2.0, **kwargs)
+
+    def test_resolves_a_and_aaaa(self):
+        results = self.resolver(cache=False).resolve(["web.example", "v4only.example", "missing.example"])
+        self.assertEqual(results, {
+            "web.example": ["192.0.2.1", "192.0.2.2", "2001:db8::1"],
+            "v4only.example": ["192.0.2.3"],
+            "missing.example": [],
+        })
+
+    def test_cache_is_persisted_and_honors_ttl(self):
+        names = ["web.example", "v4only.example", "missing.example", "short.example"]
+        first = self.resolver().resolve(names)
+        self.assertEqual(len(self.server.queries), 8)
+
+        # A new resolver (next run) reads the cache from disk; only the 1s TTL entry is re-queried once expired
+        time.sleep(1.1)
+        resolver = self.resolver()
+        self.assertEqual(resolver.resolve(names), first)
+        self.assertEqual(self.server.queries[8:], [("short.example.", "A")])
+        # Negative answers (NXDOMAIN, no AAAA records) were cached for the SOA minimum
+        self.assertEqual(resolver.cached, 7)
+
+    def test_in_flight_queries_are_bounded(self):
+        self.server.delay = 0.2
+        names = [f"host{i}.example" for i in range(10)]
+        start = time.monotonic()
+        self.resolver(cache=False, concurrency=5).resolve(names)
+        # 20 queries, 5 at a time, 0.2s each
+        self.assertGreaterEqual(time.monotonic() - start, 0.75)
+        self.assertEqual(len(self.server.queries), 20)
+
+    def test_bulk_targets_file(self):
+        path = os.path.join(self.tmpdir.name, "targets.txt")
+        with open(path, "w") as f:
+            f.write("# targets\nweb.example\n\n10.0.0.0/30\nv4only.example  # comment\nweb.example\n")
+        targets = read_targets_file(path)
+        self.assertEqual(targets, ["web.example", "10.0.0.0/30", "v4only.example", "web.example"])
+        self.assertEqual(get_cidr_ranges_bulk(targets, self.resolver(cache=False)), [
+            "10.0.0.0/30", "192.0.2.1/32", "192.0.2.2/32", "2001:db8::1/128", "192.0.2.3/32"])
+
+if __name__ == "__main__":
+    unittest.main()
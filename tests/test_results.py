@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+import unittest
+from astra.report import convert_results, merge_results, open_sink, read_results
+from astra.results import ScanResults
+
+class TestScanResults(unittest.TestCase):
+    def setUp(self):
+        self.results = ScanResults.from_lists(
+            ["10.0.0.2", "10.0.0.1", "2001:db8::1", "10.0.0.1"],
+            [("10.0.0.2", 443), ("10.0.0.2", 22), ("2001:db8::1", 80), ("10.0.0.1", 8080), ("10.0.0.2", 22)])
+
+    def test_sorted_and_deduplicated(self):
+        self.assertEqual(list(self.results.live_hosts()), ["10.0.0.1", "10.0.0.2", "2001:db8::1"])
+        self.assertEqual(list(self.results.open_ports()),
+                         [("10.0.0.1", 8080), ("10.0.0.2", 22), ("10.0.0.2", 443), ("2001:db8::1", 80)])
+        self.assertEqual((self.results.live_host_count, self.results.open_port_count), (3, 4))
+
+    def test_membership(self):
+        self.assertIn("10.0.0.2", self.results)
+        self.assertNotIn("10.0.0.3", self.results)
+        self.assertTrue(self.results.has_open_port("2001:db8::1", 80))
+        self.assertFalse(self.results.has_open_port("10.0.0.2", 80))
+        self.assertEqual(self.results.ports_of("10.0.0.2"), [22, 443])
+        self.assertEqual(self.results.ports_of("10.0.0.9"), [])
+
+    def test_merge_and_difference(self):
+        other = ScanResults.from_lists(["10.0.0.1", "10.0.0.9"], [("10.0.0.1", 8080), ("10.0.0.9", 25)])
+        merged = self.results | other
+        self.assertEqual(list(merged.live_hosts()), ["10.0.0.1", "10.0.0.2", "10.0.0.9", "2001:db8::1"])
+        self.assertEqual(merged.open_port_count, 5)
+        difference = self.results - other
+        self.assertEqual(list(difference.live_hosts()), ["10.0.0.2", "2001:db8::1"])
+        self.assertEqual(list(difference.open_ports()), [("10.0.0.2", 22), ("10.0.0.2", 443), ("2001:db8::1", 80)])
+        # Results added after a read are folded in on the next one
+        self.results.add_open_port("10.0.0.1", 21)
+        self.assertEqual(self.results.ports_of("10.0.0.1"), [21, 8080])
+
+    def test_unpacks_like_a_tuple(self):
+        live_hosts, open_ports = self.results
+        self.assertEqual(live_hosts, ["10.0.0.1", "10.0.0.2", "2001:db8::1"])
+        self.assertEqual(open_ports[0], ("10.0.0.1", 8080))
+
+class TestBinaryFormat(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "results.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip_and_convert(self):
+        with open_sink(self.path, "bin") as sink:
+            sink.start("example", ["10.0.0.0/30", "2001:db8::/126"])
+            sink.add_live_host("10.0.0.1")
+            sink.add_live_host("2001:db8::1")
+            sink.add_open_port("10.0.0.1", 443)
+            sink.add_open_port("2001:db8::1", 22)
+        loaded = ScanResults.load(self.path)
+        self.assertEqual(loaded.organization, "example")
+        self.assertEqual(loaded.cidr_ranges, ["10.0.0.0/30", "2001:db8::/126"])
+        self.assertEqual(list(loaded.open_ports()), [("10.0.0.1", 443), ("2001:db8::1", 22)])
+        self.assertEqual(read_results(self.path)["live_hosts"], ["10.0.0.1", "2001:db8::1"])
+
+        json_path = os.path.join(self.tmpdir.name, "results.json")
+        convert_results(self.path, json_path, "json")
+        with open(json_path) as f:
+            document = json.load(f)
+        self.assertEqual(document["open_ports"], [{"ip": "10.0.0.1", "port": 443}, {"ip": "2001:db8::1", "port": 22}])
+        self.assertEqual(document["timestamp"], loaded.timestamp)
+
+        csv_path = os.path.join(self.tmpdir.name, "results.csv")
+        convert_results(json_path, csv_path, "csv")
+        with open(csv_path) as f:
+            self.assertEqual(f.read(), "IP,Port\n10.0.0.1,443\n2001:db8::1,22\n")
+
+    def test_merge_keeps_scan_timestamp(self):
+        paths = []
+        for i, timestamp in enumerate(["2026-01-01T00:00:00", "2026-01-02T00:00:00"]):
+            paths.append(os.path.join(self.tmpdir.name, f"shard{i}.ndjson"))
+            with open_sink(paths[-1], "ndjson") as sink:
+                sink.start("example", ["10.0.0.0/30"], timestamp)
+                sink.add_live_host(f"10.0.0.{i + 1}")
+        merged_path = os.path.join(self.tmpdir.name, "merged.json")
+        merge_results(paths, merged_path, "json")
+        self.assertEqual(read_results(merged_path)["timestamp"], "2026-01-01T00:00:00")
+
+    def test_rejects_other_files(self):
+        with open(self.path, "w") as f:
+            f.write("{}")
+        with self.assertRaises(ValueError):
+            ScanResults.load(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
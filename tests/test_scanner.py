@@ -0,0 +1,116 @@
+import threading
+import unittest
+from unittest.mock import patch
+from astra.report import ResultSink
+from astra.scanner import FairExecutor, ScanCancelled, Scanner
+
+def fake_is_host_alive(ip, timeout):
+    return ip.endswith((".1", ".2"))
+
+def fake_scan_port(ip, port, timeout):
+    return port == 443
+
+class TestFairExecutor(unittest.TestCase):
+    def test_lanes_are_served_round_robin(self):
+        pool = FairExecutor(1)
+        gate = threading.Event()
+        order = []
+        blocker = pool.lane().submit(gate.wait)
+        big, small = pool.lane(), pool.lane()
+        futures = [big.submit(order.append, f"big{i}") for i in range(4)]
+        futures += [small.submit(order.append, f"small{i}") for i in range(2)]
+        gate.set()
+        for future in [blocker] + futures:
+            future.result(timeout=5)
+        self.assertEqual(order, ["big0", "small0", "big1", "small1", "big2", "big3"])
+        with big:
+            pass
+        # Leaving a lane's with-block does not stop the shared pool
+        self.assertEqual(small.submit(len, "abc").result(timeout=5), 3)
+        pool.shutdown()
+
+    def test_exceptions_reach_the_future(self):
+        pool = FairExecutor(2)
+        future = pool.lane().submit(int, "x")
+        with self.assertRaises(ValueError):
+            future.result(timeout=5)
+        pool.shutdown()
+        with self.assertRaises(RuntimeError):
+            pool.lane().submit(int, "1")
+
+    def test_shutdown_cancels_queued_futures(self):
+        pool = FairExecutor(1)
+        gate = threading.Event()
+        blocker = pool.lane().submit(gate.wait)
+        lane = pool.lane()
+        queued = [lane.submit(len, "abc") for _ in range(3)]
+        lane.shutdown(wait=False, cancel_futures=True)
+        gate.set()
+        blocker.result(timeout=5)
+        self.assertTrue(all(future.cancelled() for future in queued))
+        pool.shutdown()
+
+class CancelOnFirstPort(ResultSink):
+    def __init__(self, cancel: threading.Event):
+        self.cancel = cancel
+
+    def add_open_port(self, ip, port):
+        self.cancel.set()
+
+@patch("astra.network.scan_port", side_effect=fake_scan_port)
+@patch("astra.network.is_host_alive", side_effect=fake_is_host_alive)
+class TestScanner(unittest.TestCase):
+    def setUp(self):
+        self.scanner = Scanner(workers=8, timeout=0.1)
+
+    def tearDown(self):
+        self.scanner.close()
+
+    def test_concurrent_scans_share_the_pool(self, *_):
+        results = {}
+
+        def scan(name, cidr):
+            results[name] = self.scanner.scan([cidr], [22, 443], pipeline=name == "b")
+
+        threads = [threading.Thread(target=scan, args=(name, cidr))
+                   for name, cidr in (("a", "10.0.0.0/28"), ("b", "10.0.1.0/24"))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(list(results["a"].live_hosts()), ["10.0.0.1", "10.0.0.2"])
+        self.assertEqual(list(results["b"].open_ports()), [("10.0.1.1", 443), ("10.0.1.2", 443)])
+
+    def test_stream_yields_results(self, *_):
+        events = list(self.scanner.stream(["10.0.0.0/30"], [443]))
+        self.assertEqual(sorted(events), [("host", "10.0.0.1"), ("host", "10.0.0.2"),
+                                          ("port", "10.0.0.1", 443), ("port", "10.0.0.2", 443)])
+
+    def test_exclude(self, *_):
+        results = self.scanner.scan(["10.0.0.0/30", "10.0.0.0/31"], [443], exclude=["10.0.0.2"])
+        self.assertEqual(list(results.live_hosts()), ["10.0.0.1"])
+
+    def test_cancel(self, *_):
+        cancel = threading.Event()
+        cancel.set()
+        with self.assertRaises(ScanCancelled):
+            self.scanner.scan(["10.0.0.0/16"], [443], cancel=cancel)
+
+    def test_cancelled_pipelined_scan_stops_discovery(self, *_):
+        cancel = threading.Event()
+        # Every host is live, so discovery fills the host queue and has to be stopped, not drained
+        with patch("astra.network.is_host_alive", return_value=True):
+            with self.assertRaises(ScanCancelled):
+                self.scanner.scan(["10.0.0.0/20"], list(range(400, 500)), pipeline=True,
+                                  sink=CancelOnFirstPort(cancel), cancel=cancel)
+        self.assertFalse([thread for thread in threading.enumerate() if thread.name == "astra-discovery"])
+        self.assertFalse(self.scanner.pool._queued)
+
+    def test_plain_ranges_need_no_resolver(self, *_):
+        with patch("astra.resolver.BulkResolver") as resolver:
+            self.assertEqual(self.scanner.resolve(["10.0.0.0/24", "192.0.2.7", "10.0.0.5/24"]),
+                             ["10.0.0.0/24", "192.0.2.7/32"])
+        resolver.assert_not_called()
+
+if __name__ == "__main__":
+    unittest.main()
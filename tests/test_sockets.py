@@ -0,0 +1,144 @@
+import asyncio
+import errno
+import os
+import socket
+import tempfile
+import unittest
+from unittest.mock import patch
+from astra import sockets
+from astra.async_engine import _probe
+from astra.discovery import Discovery
+from astra.metrics import ScanMetrics
+from astra.network import ERROR, OPEN, probe_port, scan_port
+
+def failing(err: int, times: int, result="ok"):
+    """An attempt that raises OSError(err) `times` times, then returns `result`."""
+    calls = []
+
+    def attempt():
+        calls.append(None)
+        if len(calls) <= times:
+            raise OSError(err, os.strerror(err))
+        return result
+    return attempt, calls
+
+@patch("astra.sockets.RESOURCE_BACKOFF", 0)
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        self.before = sockets.stats.snapshot()
+
+    def counted(self):
+        retries, failed = sockets.stats.snapshot()
+        return {name: count - self.before[0].get(name, 0) for name, count in retries.items()}, failed - self.before[1]
+
+    def test_resource_errors_are_retried_and_counted(self):
+        metrics = ScanMetrics()
+        attempt, calls = failing(errno.EMFILE, 2)
+        self.assertEqual(sockets.retry(attempt, metrics), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(self.counted()[0].get("EMFILE"), 2)
+        self.assertEqual(metrics.snapshot()["resource_retries"], 2)
+
+    def test_persistent_errors_are_raised(self):
+        attempt, calls = failing(errno.EADDRNOTAVAIL, 100)
+        with self.assertRaises(OSError):
+            sockets.retry(attempt)
+        self.assertEqual(len(calls), sockets.RESOURCE_RETRIES + 1)
+        self.assertEqual(self.counted()[1], 1)
+        # Other errors are not retried
+        attempt, calls = failing(errno.EHOSTUNREACH, 1)
+        with self.assertRaises(OSError):
+            sockets.retry(attempt)
+        self.assertEqual(len(calls), 1)
+
+    def test_async_retry(self):
+        async def attempt():
+            return sync_attempt()
+
+        sync_attempt, calls = failing(errno.ENFILE, 1)
+        self.assertEqual(asyncio.run(sockets.retry_async(attempt)), "ok")
+        self.assertEqual(len(calls), 2)
+
+    @patch("socket.socket")
+    def test_exhaustion_is_not_a_closed_port(self, mock_socket):
+        mock_socket.return_value.connect.side_effect = OSError(errno.EMFILE, "Too many open files")
+        self.assertEqual(probe_port("127.0.0.1", 80, timeout=1.0)[0], ERROR)
+        mock_socket.return_value.connect.side_effect = [OSError(errno.EADDRNOTAVAIL, "No ports"), None]
+        self.assertEqual(probe_port("127.0.0.1", 80, timeout=1.0)[0], OPEN)
+        mock_socket.return_value.connect_ex.side_effect = [errno.EMFILE, 0]
+        self.assertTrue(scan_port("127.0.0.1", 80, timeout=1.0))
+
+    def test_discovery_retries_are_counted(self):
+        metrics = ScanMetrics()
+        attempt, calls = failing(errno.EMFILE, 1, ([], False, False))
+        with patch.object(Discovery, "_open", side_effect=lambda ip: attempt()):
+            self.assertFalse(Discovery([80], ["tcp"]).probe("127.0.0.1", 1.0, metrics)[0])
+        self.assertEqual(metrics.snapshot()["resource_retries"], 1)
+
+    def test_async_probe_retries(self):
+        attempt, calls = failing(errno.EMFILE, 1, (OPEN, 0.01))
+
+        async def fake_attempt(ip, port, timeout):
+            return attempt()
+
+        with patch("astra.async_engine._attempt", side_effect=fake_attempt):
+            self.assertEqual(asyncio.run(_probe("127.0.0.1", 80, 1.0)), (OPEN, 0.01))
+
+class TestSocketBudget(unittest.TestCase):
+    def test_probe_sockets_close_with_rst(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(1)
+        try:
+            sock = sockets.probe_socket(socket.AF_INET)
+            sock.connect(listener.getsockname())
+            server, _ = listener.accept()
+            sock.close()
+            with server, self.assertRaises(ConnectionResetError):
+                server.recv(1)
+        finally:
+            listener.close()
+
+    def test_ephemeral_port_count(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".range") as f:
+            f.write("32768\t60999\n")
+            f.flush()
+            self.assertEqual(sockets.ephemeral_port_count(f.name), 28232)
+        self.assertIsNone(sockets.ephemeral_port_count("/nonexistent"))
+
+    def test_fit_concurrency(self):
+        with patch("astra.sockets.socket_budget", return_value=900):
+            self.assertEqual(sockets.fit_concurrency(1000), 900)
+            self.assertEqual(sockets.fit_concurrency(1000, sockets_per_probe=3), 300)
+            self.assertEqual(sockets.fit_concurrency(100), 100)
+
+    def test_concurrent_scans_share_the_budget(self):
+        with patch("astra.sockets.socket_budget", return_value=900):
+            first, second = sockets.ScanResources(), sockets.ScanResources()
+            self.assertEqual(first.fit(300, sockets_per_probe=2), 300)
+            self.assertEqual(second.fit(1000), 300)
+            first.close()
+            third = sockets.ScanResources()
+            self.assertEqual(third.fit(1000), 600)
+            second.close()
+            third.close()
+            self.assertEqual(sockets.ScanResources._reserved, 0)
+
+    def test_summary_names_overlapping_scans(self):
+        first = sockets.ScanResources()
+        second = sockets.ScanResources()
+        sockets.stats.record(errno.EMFILE)
+        second.close()
+        with self.assertLogs(level="WARNING") as logs:
+            first.close()
+        self.assertIn("across all scans running in this process", logs.output[0])
+
+    @unittest.skipIf(sockets.resource is None, "no RLIMIT_NOFILE on this platform")
+    def test_raise_fd_limit(self):
+        limit = sockets.raise_fd_limit()
+        soft, hard = sockets.resource.getrlimit(sockets.resource.RLIMIT_NOFILE)
+        self.assertEqual(limit, soft)
+        self.assertGreater(sockets.socket_budget(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import socket
+import struct
+import sys
+import unittest
+from unittest.mock import MagicMock
+from astra.syn import SynScanner, _enlarge_recv_buffer, build_syn, checksum, parse_reply, raw_sockets_available
+
+class TestSynPackets(unittest.TestCase):
+    def test_checksum_of_valid_segment_is_zero(self):
+        src, dst = socket.inet_aton("10.0.0.1"), socket.inet_aton("10.0.0.2")
+        segment = build_syn(src, dst, 40000, 443, 12345)
+        pseudo = src + dst + struct.pack("!BBH", 0, socket.IPPROTO_TCP, len(segment))
+        self.assertEqual(checksum(pseudo + segment), 0)
+
+    def test_syn_fields(self):
+        segment = build_syn(bytes(4), bytes(4), 40000, 443, 12345)
+        src_port, dst_port, seq, ack, offset, flags = struct.unpack("!HHIIBB", segment[:14])
+        self.assertEqual((src_port, dst_port, seq, ack, flags), (40000, 443, 12345, 0, 0x02))
+        self.assertEqual((offset >> 4) * 4, len(segment))
+
+    def test_parse_reply(self):
+        ip_header = bytes([0x45]) + bytes(11) + socket.inet_aton("10.0.0.2") + socket.inet_aton("10.0.0.1")
+        tcp = struct.pack("!HHIIBB", 443, 40000, 1, 12346, 5 << 4, 0x12) + bytes(6)
+        self.assertEqual(parse_reply(ip_header + tcp), (socket.inet_aton("10.0.0.2"), 443, 40000, 12346, 0x12))
+
+    def test_recv_buffer_falls_back_to_so_rcvbuf(self):
+        sock = MagicMock()
+        sock.setsockopt.side_effect = [PermissionError(1, "Operation not permitted"), None]
+        _enlarge_recv_buffer(sock, 1 << 20)
+        self.assertEqual(sock.setsockopt.call_args.args, (socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20))
+        # Neither option allowed: warn and keep the default buffer
+        sock.setsockopt.side_effect = OSError(1, "Operation not permitted")
+        with self.assertLogs(level="WARNING"):
+            _enlarge_recv_buffer(sock)
+
+@unittest.skipUnless(sys.platform.startswith("linux") and raw_sockets_available(), "needs Linux and CAP_NET_RAW")
+class TestSynLoopback(unittest.TestCase):
+    def test_open_and_closed_ports(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(16)
+        open_port = listener.getsockname()[1]
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(("127.0.0.1", 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+
+        results = {}
+        try:
+            with SynScanner(timeout=1.0) as scanner:
+                tasks = [("127.0.0.1", open_port), ("127.0.0.1", closed_port)]
+                scanner.probe(tasks, lambda ip, port, is_open: results.__setitem__(port, is_open))
+        finally:
+            listener.close()
+        self.assertEqual(results, {open_port: True, closed_port: False})
+
+if __name__ == "__main__":
+    unittest.main()
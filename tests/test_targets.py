@@ -0,0 +1,67 @@
+import unittest
+from astra.network import count_ips, extract_ips, filter_shard, iter_ips
+from astra.targets import TargetSet
+
+class TestTargetIteration(unittest.TestCase):
+    def test_iter_ips_is_lazy(self):
+        ips = iter_ips(["10.0.0.0/8"])
+        self.assertEqual(next(ips), "10.0.0.0")
+        self.assertEqual(next(ips), "10.0.0.1")
+
+    def test_per_cidr_limit(self):
+        ips = list(iter_ips(["10.0.0.0/8", "192.168.1.0/30"], max_ips_per_cidr=1))
+        self.assertEqual(ips, ["10.0.0.0", "192.168.1.0"])
+
+    def test_global_limit_spans_cidrs(self):
+        ips = list(iter_ips(["192.168.1.0/31", "192.168.2.0/24"], max_ips=3))
+        self.assertEqual(ips, ["192.168.1.0", "192.168.1.1", "192.168.2.0"])
+
+    def test_invalid_cidr_skipped(self):
+        self.assertEqual(extract_ips(["not-a-cidr", "192.168.1.0/32"]), ["192.168.1.0"])
+
+    def test_count_matches_iteration(self):
+        cidrs = ["10.0.0.0/8", "192.168.1.0/24"]
+        self.assertEqual(count_ips(cidrs, max_ips=300, max_ips_per_cidr=200), 300)
+        self.assertEqual(count_ips(["10.0.0.0/8"]), 2 ** 24)
+
+    def test_overlapping_ranges_are_probed_once(self):
+        ips = list(iter_ips(["10.0.0.0/30", "10.0.0.2/31", "10.0.0.4/32", "10.0.0.1"]))
+        self.assertEqual(ips, ["10.0.0.0", "10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4"])
+
+class TestTargetSet(unittest.TestCase):
+    def test_merge_and_exclude(self):
+        targets = TargetSet(["10.0.0.0/16", "10.0.5.0/24", "10.1.0.0/24", "::1", "bad"],
+                            ["10.0.0.0/17", "10.0.128.0/24", "10.0.200.7", "10.1.0.255", "192.0.2.0/24"], log=False)
+        self.assertEqual(targets.duplicates, 256)
+        self.assertEqual(targets.excluded, 2 ** 15 + 256 + 1 + 1)
+        self.assertEqual(targets.size, 2 ** 16 + 256 + 1 - targets.excluded)
+        self.assertEqual(targets.size, count_ips(targets))
+        for ip in ("10.0.129.0", "10.0.255.255", "10.0.200.6", "10.1.0.254", "::1"):
+            self.assertIn(ip, targets)
+        for ip in ("10.0.5.1", "10.0.127.255", "10.0.128.255", "10.0.200.7", "10.1.0.255", "10.2.0.0", "::2", "9.0.0.0"):
+            self.assertNotIn(ip, targets)
+        self.assertEqual(list(iter_ips(targets, max_ips=3)), ["10.0.129.0", "10.0.129.1", "10.0.129.2"])
+
+    def test_ranges_keep_input_order(self):
+        targets = TargetSet(["192.168.0.0/31", "10.0.0.0/31", "192.168.0.1/32"])
+        self.assertEqual(list(iter_ips(targets)), ["192.168.0.0", "192.168.0.1", "10.0.0.0", "10.0.0.1"])
+
+    def test_per_cidr_limit_applies_before_merging(self):
+        targets = TargetSet(["10.0.0.0/24", "10.0.0.0/16"], ["10.0.0.1"], max_ips_per_cidr=4)
+        self.assertEqual(list(iter_ips(targets)), ["10.0.0.0", "10.0.0.2", "10.0.0.3"])
+        with self.assertRaises(ValueError):
+            count_ips(targets, max_ips_per_cidr=1)
+
+    def test_invalid_exclude_is_an_error(self):
+        with self.assertRaises(ValueError):
+            TargetSet(["10.0.0.0/24"], ["10.0.0.0/33"])
+
+    def test_shards_skip_excluded_addresses(self):
+        targets = TargetSet(["10.0.0.0/28"], ["10.0.0.4/30"])
+        shards = [list(iter_ips(targets, seed=3, shard=(i, 2))) for i in range(2)]
+        self.assertEqual(sorted(shards[0] + shards[1], key=lambda ip: int(ip.split(".")[-1])),
+                         [f"10.0.0.{i}" for i in range(16) if not 4 <= i < 8])
+        self.assertEqual(filter_shard(["10.0.0.5"] + shards[1], targets, seed=3, shard=(1, 2)), shards[1])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import patch
+from astra.network import CLOSED, FILTERED, OPEN, check_host, check_port
+from astra.timing import RTTEstimator, TimeoutPolicy
+
+class TestRTTEstimator(unittest.TestCase):
+    def test_first_sample(self):
+        estimator = RTTEstimator()
+        estimator.update(0.1)
+        self.assertAlmostEqual(estimator.srtt, 0.1)
+        self.assertAlmostEqual(estimator.rto(), 0.1 + 4 * 0.05)
+
+    def test_smoothing(self):
+        estimator = RTTEstimator()
+        estimator.update(0.1)
+        estimator.update(0.2)
+        self.assertAlmostEqual(estimator.srtt, 0.1 * 7 / 8 + 0.2 / 8)
+        self.assertAlmostEqual(estimator.rttvar, 0.05 * 3 / 4 + 0.1 / 4)
+
+class TestTimeoutPolicy(unittest.TestCase):
+    def test_unknown_host_uses_max_timeout(self):
+        self.assertEqual(TimeoutPolicy(2.0).timeout_for("10.0.0.1"), 2.0)
+
+    def test_timeout_clamped_and_backed_off(self):
+        policy = TimeoutPolicy(1.0, min_timeout=0.1)
+        policy.observe("10.0.0.1", 0.001)
+        self.assertAlmostEqual(policy.timeout_for("10.0.0.1"), 0.1)
+        self.assertAlmostEqual(policy.timeout_for("10.0.0.1", 1), 0.2)
+        self.assertAlmostEqual(policy.timeout_for("10.0.0.1", 5), 1.0)
+
+    def test_fixed_policy_ignores_samples(self):
+        policy = TimeoutPolicy(1.0, adaptive=False)
+        policy.observe("10.0.0.1", 0.001)
+        self.assertEqual(policy.timeout_for("10.0.0.1"), 1.0)
+
+    def test_survives_pickling(self):
+        import pickle
+        policy = pickle.loads(pickle.dumps(TimeoutPolicy(1.0)))
+        policy.observe("10.0.0.1", 0.01)
+        self.assertLess(policy.timeout_for("10.0.0.1"), 1.0)
+
+class TestAdaptiveProbes(unittest.TestCase):
+    @patch("astra.network.probe_port", return_value=(OPEN, 0.002))
+    def test_discovery_seeds_rtt(self, _):
+        policy = TimeoutPolicy(1.0, min_timeout=0.05)
+        self.assertTrue(check_host("10.0.0.1", 1.0, policy))
+        self.assertAlmostEqual(policy.timeout_for("10.0.0.1"), 0.05)
+
+    @patch("astra.network.probe_port", side_effect=[(FILTERED, 0.05), (OPEN, 0.002)])
+    def test_silent_port_is_retried(self, probe):
+        policy = TimeoutPolicy(1.0, min_timeout=0.05, retries=1)
+        policy.observe("10.0.0.1", 0.002)
+        self.assertTrue(check_port("10.0.0.1", 443, 1.0, policy))
+        self.assertEqual([c.args[2] for c in probe.call_args_list], [0.05, 0.1])
+        self.assertEqual((policy.retried, policy.silent), (1, 0))
+
+    @patch("astra.network.probe_port", return_value=(FILTERED, 0.05))
+    def test_wait_time_saved(self, _):
+        policy = TimeoutPolicy(1.0, min_timeout=0.05, retries=1)
+        policy.observe("10.0.0.1", 0.002)
+        self.assertFalse(check_port("10.0.0.1", 443, 1.0, policy))
+        self.assertEqual(policy.silent, 1)
+        self.assertAlmostEqual(policy.waited, 0.05 + 0.1)
+
+    @patch("astra.network.probe_port", return_value=(CLOSED, 0.3))
+    def test_closed_port_updates_rtt(self, _):
+        policy = TimeoutPolicy(2.0, min_timeout=0.05)
+        self.assertFalse(check_port("10.0.0.1", 443, 2.0, policy))
+        self.assertAlmostEqual(policy.timeout_for("10.0.0.1"), 0.3 + 4 * 0.15)
+
+if __name__ == "__main__":
+    unittest.main()